@@ -0,0 +1,109 @@
+'''
+Benchmarks for loading & handling large data files.
+
+    python benchmark.py memory --txns 100000
+    python benchmark.py profiles --txns 10000
+'''
+from datetime import date, timedelta
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import bricbooks as bb
+
+
+DEFAULT_NUM_TXNS = 100000
+
+
+def _create_data_file(file_name, num_txns):
+    storage = bb.SQLiteStorage(file_name)
+    checking = bb.Account(type_=bb.AccountType.ASSET, name='Checking')
+    storage.save_account(checking)
+    restaurants = bb.Account(type_=bb.AccountType.EXPENSE, name='Restaurants')
+    storage.save_account(restaurants)
+    payee = bb.Payee('Some restaurant')
+    storage.save_payee(payee)
+    start_date = date(2000, 1, 1)
+    txns = []
+    for i in range(num_txns):
+        amount = (i % 500) + 1
+        txns.append(bb.Transaction(txn_date=start_date + timedelta(days=i // 20),
+                splits=[{'account': checking, 'amount': -amount, 'status': 'C'}, {'account': restaurants, 'amount': amount, 'payee': payee}]))
+    storage.save_txns(txns)
+    storage._db_connection.close()
+    return checking.id
+
+
+def _traced_memory(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak, seconds
+
+
+def benchmark_memory(num_txns):
+    '''
+    Memory used by the transactions of a 100k txn ledger, with splits stored as Split objects vs plain dicts
+    (which is how splits were stored before the Split class).
+    '''
+    with tempfile.TemporaryDirectory() as tmp:
+        file_name = os.path.join(tmp, 'benchmark.sqlite3')
+        print(f'creating {num_txns} txns')
+        account_id = _create_data_file(file_name, num_txns)
+        storage = bb.SQLiteStorage(file_name)
+        txns, current, peak, seconds = _traced_memory(lambda: storage.get_transactions(account_id=account_id))
+        storage._db_connection.close()
+    print(f'loaded {len(txns)} txns in {seconds:.2f}s: {current / 2**20:.1f} MiB ({peak / 2**20:.1f} MiB peak)')
+    splits = [split for t in txns for split in t.splits]
+    split_objects_size = sum(sys.getsizeof(split) for split in splits)
+    dict_splits, dicts_size, _, _ = _traced_memory(lambda: [dict(split) for split in splits])
+    print(f'{len(splits)} splits as Split objects: {split_objects_size / 2**20:.1f} MiB')
+    print(f'{len(dict_splits)} splits as dicts: {dicts_size / 2**20:.1f} MiB')
+    print(f'{len(txns)} txns with dict splits: {(current - split_objects_size + dicts_size) / 2**20:.1f} MiB')
+
+
+def benchmark_profiles(num_txns):
+    '''
+    Save & load throughput under each connection profile. Txns are saved one at a time (one commit each, like
+    entering them in the GUI), then the ledger is loaded from a fresh connection.
+    '''
+    for profile in bb.SQLiteStorage.CONNECTION_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'benchmark.sqlite3')
+            storage = bb.SQLiteStorage(file_name)
+            storage.set_connection_profile(profile)
+            checking = bb.Account(type_=bb.AccountType.ASSET, name='Checking')
+            storage.save_account(checking)
+            restaurants = bb.Account(type_=bb.AccountType.EXPENSE, name='Restaurants')
+            storage.save_account(restaurants)
+            start_date = date(2000, 1, 1)
+            start = time.perf_counter()
+            for i in range(num_txns):
+                amount = (i % 500) + 1
+                storage.save_txn(bb.Transaction(txn_date=start_date + timedelta(days=i // 20),
+                        splits=[{'account': checking, 'amount': -amount}, {'account': restaurants, 'amount': amount}]))
+            save_seconds = time.perf_counter() - start
+            storage.close()
+            storage = bb.SQLiteStorage(file_name)
+            start = time.perf_counter()
+            txns = storage.get_transactions(account_id=checking.id)
+            load_seconds = time.perf_counter() - start
+            storage.close()
+        print(f'{profile}: saved {num_txns} txns in {save_seconds:.2f}s ({num_txns / save_seconds:.0f}/s), '
+              f'loaded {len(txns)} in {load_seconds:.2f}s ({len(txns) / load_seconds:.0f}/s)')
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('benchmark', choices=['memory', 'profiles'])
+    parser.add_argument('--txns', type=int, default=DEFAULT_NUM_TXNS, dest='num_txns')
+    args = parser.parse_args()
+    if args.benchmark == 'memory':
+        benchmark_memory(args.num_txns)
+    elif args.benchmark == 'profiles':
+        benchmark_profiles(args.num_txns)
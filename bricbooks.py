@@ -9,20 +9,27 @@ Architecture:
     Outer Layer - UI (GUI, console). Has an engine object, and handles displaying data to the user and sending user actions to the engine.
     No objects should use private/hidden members of other objects.
 '''
-from collections import namedtuple
+from collections import namedtuple, OrderedDict
+from collections.abc import MutableMapping
+from concurrent.futures import Future
 from contextlib import contextmanager
 import copy
 from datetime import datetime, date, timedelta
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from enum import Enum
 from fractions import Fraction
-from functools import partial
+from functools import partial, reduce
 import json
+import math
 import os
 from pathlib import Path
+import queue
 import sqlite3
 import subprocess
+import re
 import sys
+import threading
+import time
 import unicodedata
 try:
     import readline
@@ -409,7 +416,27 @@ def fraction_to_decimal(f):
     return Decimal(f.numerator) / Decimal(f.denominator)
 
 
+def amount_to_cents(amount):
+    '''amount must be a whole number of cents (as guaranteed by get_validated_amount)'''
+    if 100 % amount.denominator:
+        raise InvalidAmount(f'not a whole number of cents: {amount}')
+    return amount.numerator * (100 // amount.denominator)
+
+
+def cents_to_amount(cents):
+    return Fraction(cents, 100)
+
+
+def cents_display(cents):
+    sign = '-' if cents < 0 else ''
+    dollars, cents = divmod(abs(cents), 100)
+    return f'{sign}{dollars:,}.{cents:02d}'
+
+
 def amount_display(amount):
+    #whole cents (all amounts, & most balances) can be displayed without going through Decimal
+    if 100 % amount.denominator == 0:
+        return cents_display(amount.numerator * (100 // amount.denominator))
     return '{0:,.2f}'.format(fraction_to_decimal(amount))
 
 
@@ -420,20 +447,85 @@ def quantity_display(quantity):
 
 
 def check_txn_splits(splits):
-    total = Fraction(0)
+    total = 0
     for split in splits:
-        total += split['amount']
+        try:
+            total += amount_to_cents(split['amount'])
+        except InvalidAmount as e:
+            raise InvalidTransactionError('invalid split: %s' % e)
         if split.get('action'):
             if split['account'].type != AccountType.SECURITY:
                 raise InvalidTransactionError('actions can only be used with SECURITY accounts')
-    if total != Fraction(0):
+    if total != 0:
         amounts = []
         for split in splits:
             amounts.append(amount_display(split['amount']))
         raise InvalidTransactionError("splits don't balance: %s" % ', '.join(amounts))
 
 
+class Split(MutableMapping):
+    '''
+    One split of a transaction. Fields that aren't set are missing, like keys of a dict, and the dict-style
+    access that splits have always supported (split['amount'], 'payee' in split, split.get('status', ''), ...)
+    still works, as well as attribute access (split.amount).
+    '''
+    __slots__ = ('account', 'amount', 'quantity', 'status', 'payee', 'type', 'action', 'description', 'reconcile_date')
+
+    FIELDS = frozenset(__slots__)
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key):
+        if key not in Split.FIELDS:
+            raise KeyError(key)
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in Split.FIELDS:
+            raise InvalidTransactionError(f'invalid split field: {key}')
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        if key not in Split.FIELDS:
+            raise KeyError(key)
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in Split.FIELDS and hasattr(self, key)
+
+    def __iter__(self):
+        return (field for field in Split.__slots__ if hasattr(self, field))
+
+    def __len__(self):
+        return len([field for field in Split.__slots__ if hasattr(self, field)])
+
+    def get(self, key, default=None):
+        if key not in Split.FIELDS:
+            return default
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        return f'Split({dict(self)})'
+
+    def copy(self):
+        split = Split.__new__(Split)
+        for field in Split.__slots__:
+            if hasattr(self, field):
+                setattr(split, field, getattr(self, field))
+        return split
+
+
 def handle_txn_splits(splits):
+    '''validates the splits (updating them in place), & returns them as Split objects'''
+    txn_splits = []
     for split in splits:
         account = split['account']
         if not account:
@@ -459,11 +551,15 @@ def handle_txn_splits(splits):
                     raise InvalidTransactionError(f'invalid payee: {payee}')
             else:
                 split.pop('payee')
-    return splits
+        if isinstance(split, Split):
+            txn_splits.append(split)
+        else:
+            txn_splits.append(Split(**split))
+    return txn_splits
 
 
 class Transaction:
-    __slots__ = ('id', 'splits', 'txn_date', 'entry_date', 'description', 'alternate_id', 'balance')
+    __slots__ = ('id', '_splits', 'txn_date', 'entry_date', 'description', 'alternate_id', 'balance', '_splits_by_account_id')
 
     CLEARED = 'C'
     RECONCILED = 'R'
@@ -479,6 +575,16 @@ class Transaction:
         self.id = id_
         self.alternate_id = alternate_id
 
+    @property
+    def splits(self):
+        return self._splits
+
+    @splits.setter
+    def splits(self, splits):
+        self._splits = splits
+        #the lookup for get_split is rebuilt from the new splits when it's needed
+        self._splits_by_account_id = None
+
     def __str__(self):
         return '%s: %s' % (self.id, self.txn_date)
 
@@ -498,21 +604,43 @@ class Transaction:
         except Exception:
             raise InvalidTransactionError('invalid txn_date "%s"' % txn_date)
 
+    def get_split(self, account):
+        '''the split for account'''
+        try:
+            return self._splits_by_account_id[account.id]
+        except (TypeError, KeyError):
+            #not built yet, or the accounts have been saved (& gotten ids) since it was built
+            #  if an account has more than one split, the first one is used
+            self._splits_by_account_id = {}
+            for split in self.splits:
+                self._splits_by_account_id.setdefault(split.account.id, split)
+            return self._splits_by_account_id[account.id]
+
     def get_status(self, account):
-        for split in self.splits:
-            if split['account'] == account:
-                return split.get('status', '')
+        return self.get_split(account).get('status', '')
+
+    def copy(self):
+        '''a copy with its own splits (the accounts & payees are shared), so it can be changed without changing this txn'''
+        #this txn has already been validated, so the fields are copied as they are, instead of going through __init__
+        txn = Transaction.__new__(Transaction)
+        txn.id = self.id
+        txn.txn_date = self.txn_date
+        txn.entry_date = self.entry_date
+        txn.description = self.description
+        txn.alternate_id = self.alternate_id
+        if hasattr(self, 'balance'):
+            txn.balance = self.balance
+        txn.splits = [split.copy() for split in self.splits]
+        return txn
 
     def update_reconciled_state(self, account):
         #this updates the txn, instead of creating a new one - might want to change it
-        for split in self.splits:
-            if split['account'] == account:
-                cur_status = split.get('status', '')
-                if cur_status == Transaction.CLEARED:
-                    split.pop('status')
-                else:
-                    split['status'] = Transaction.CLEARED
-                return
+        split = self.get_split(account)
+        cur_status = split.get('status', '')
+        if cur_status == Transaction.CLEARED:
+            split.pop('status')
+        else:
+            split['status'] = Transaction.CLEARED
 
 
 def _transfer_account_display(splits, main_account):
@@ -526,8 +654,8 @@ def _transfer_account_display(splits, main_account):
 
 def get_display_strings_for_ledger(account, txn, date_format):
     '''txn can be either Transaction or ScheduledTransaction'''
-    split = [s for s in txn.splits if s['account'] == account][0]
-    amount = split['amount']
+    split = txn.get_split(account)
+    amount = split.amount
     if amount < Fraction(0):
         #make negative amount display as positive
         withdrawal = amount_display(amount * Fraction('-1'))
@@ -535,7 +663,7 @@ def get_display_strings_for_ledger(account, txn, date_format):
     else:
         withdrawal = ''
         deposit = amount_display(amount)
-    quantity = quantity_display(split['quantity'])
+    quantity = quantity_display(split.quantity)
     if 'payee' in split:
         payee = split['payee'].name
     else:
@@ -574,6 +702,8 @@ def get_display_strings_for_ledger(account, txn, date_format):
 
 
 LedgerBalances = namedtuple('LedgerBalances', ['current', 'current_cleared'])
+AccountBalances = namedtuple('AccountBalances', ['total', 'cleared', 'reconciled', 'last_txn_date'])
+Ledger = namedtuple('Ledger', ['txns', 'scheduled_txns', 'balances'])
 
 
 def splits_display(splits):
@@ -617,6 +747,13 @@ class ScheduledTransaction:
     def __repr__(self):
         return str(self)
 
+    def get_split(self, account):
+        '''the split for account'''
+        for split in self.splits:
+            if split.account.id == account.id:
+                return split
+        raise KeyError(account.id)
+
     def _check_date(self, dt):
         if dt:
             try:
@@ -887,9 +1024,68 @@ def sqlite_txn(cursor):
         cursor.execute('ROLLBACK')
         raise SQLiteStorageError(str(e)) from e
 
+
+class IdentityMap:
+    '''
+    Objects loaded from the DB, keyed by id, so each object is only built once
+    and the same instance is returned every time it's requested.
+    '''
+
+    def __init__(self):
+        self._objects = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, id_):
+        obj = self._objects.get(id_)
+        if obj is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return obj
+
+    def add(self, obj):
+        self._objects[obj.id] = obj
+        return obj
+
+    def remove(self, id_):
+        self._objects.pop(id_, None)
+
+    def clear(self):
+        self._objects.clear()
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._objects)}
+
+
 class SQLiteStorage:
 
-    SCHEMA_VERSION = 2
+    SCHEMA_VERSION = 4
+
+    #largest denominator that amounts/quantities are scaled to for summing in SQL
+    MAX_COMMON_DENOMINATOR = 10**9
+
+    #pragmas applied when the file is opened - the profile is stored per file in the preferences table
+    CONNECTION_PROFILE_PREFERENCE = 'connection-profile'
+    DEFAULT_CONNECTION_PROFILE = 'wal'
+    CONNECTION_PROFILES = {
+        #readers don't block the writer (or vice versa), so other processes can use the file while it's open
+        'wal': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL', #safe in WAL mode - a power loss can only lose the last commits
+            'busy_timeout': 5000,
+            'cache_size': -32000, #KiB
+            'mmap_size': 256 * 2**20,
+        },
+        #sqlite defaults, for files on network drives (where WAL doesn't work)
+        'rollback': {
+            'journal_mode': 'DELETE',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000,
+            'cache_size': -2000,
+            'mmap_size': 0,
+        },
+    }
 
     DB_INIT_STATEMENTS = [
         'CREATE TABLE commodity_types ('
@@ -1105,12 +1301,45 @@ class SQLiteStorage:
             'CREATE TRIGGER preferences_updated UPDATE ON preferences BEGIN UPDATE preferences SET updated = CURRENT_TIMESTAMP WHERE name = old.name; END;',
             "UPDATE misc SET value = 2 WHERE key = 'schema_version'",
         ],
+        2: [
+            'CREATE INDEX transaction_split_account_txn_index ON transaction_splits(account_id, transaction_id)',
+            'CREATE INDEX transaction_date_index ON transactions(date, id)',
+            'CREATE INDEX account_parent_id_index ON accounts(parent_id)',
+            "UPDATE misc SET value = 3 WHERE key = 'schema_version'",
+        ],
+        3: [
+            #balances are kept up to date whenever transactions are saved or deleted
+            #  (quantity for security accounts, amount for others)
+            'CREATE TABLE account_balances ('
+                'account_id INTEGER NOT NULL PRIMARY KEY,'
+                'total_numerator INTEGER NOT NULL,'
+                'total_denominator INTEGER NOT NULL,'
+                'cleared_numerator INTEGER NOT NULL,' #cleared or reconciled
+                'cleared_denominator INTEGER NOT NULL,'
+                'reconciled_numerator INTEGER NOT NULL,'
+                'reconciled_denominator INTEGER NOT NULL,'
+                'last_txn_date TEXT NULL,'
+                'updated TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,' #UTC
+                'FOREIGN KEY(account_id) REFERENCES accounts(id) ON DELETE CASCADE) STRICT',
+            lambda storage, cur: storage._rebuild_balances(cur),
+            "UPDATE misc SET value = 4 WHERE key = 'schema_version'",
+        ],
     }
 
     @staticmethod
-    def get_db_connection(conn_name):
+    def get_db_connection(conn_name, read_only=False, immutable=False):
         #conn_name is either ':memory:' or the name of the data file
-        conn = sqlite3.connect(conn_name, isolation_level=None)
+        if read_only:
+            #immutable tells sqlite the file can't change, so it doesn't take any locks - only for files
+            #  that no other process is writing to (eg. archived books)
+            uri = Path(conn_name).resolve().as_uri() + ('?mode=ro&immutable=1' if immutable else '?mode=ro')
+            conn = sqlite3.connect(uri, uri=True, isolation_level=None)
+        else:
+            conn = sqlite3.connect(conn_name, isolation_level=None)
+        #sqlite's lower() only handles ASCII characters
+        #deterministic lets sqlite use py_lower() in indexes & optimize it, but needs python 3.8+
+        kwargs = {'deterministic': True} if sys.version_info >= (3, 8) else {}
+        conn.create_function('py_lower', 1, lambda s: s.lower() if s else s, **kwargs)
         conn.execute('PRAGMA foreign_keys = ON;')
         result = conn.execute('PRAGMA foreign_keys').fetchall()
         if result[0][0] != 1:
@@ -1119,31 +1348,101 @@ class SQLiteStorage:
             print(msg)
         return conn
 
-    def __init__(self, conn_name):
+    def __init__(self, conn_name, read_only=False, immutable=False):
         if not conn_name:
             raise SQLiteStorageError('must pass in conn_name')
-        self._db_connection = SQLiteStorage.get_db_connection(conn_name)
+        if read_only and conn_name == ':memory:':
+            raise SQLiteStorageError("can't open :memory: read-only")
+        self._conn_name = conn_name
+        self.read_only = read_only
+        self._immutable = immutable
+        self._db_connection = SQLiteStorage.get_db_connection(conn_name, read_only=read_only, immutable=immutable)
+        #wait for other connections' locks while setting up & migrating - the rest of the profile is applied after that
+        busy_timeout = self.CONNECTION_PROFILES[self.DEFAULT_CONNECTION_PROFILE]['busy_timeout']
+        self._db_connection.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+        self._commodities = IdentityMap()
+        self._accounts = IdentityMap()
+        self._payees = IdentityMap()
         if not self._tables():
+            if read_only:
+                raise SQLiteStorageError(f'no bricbooks data in {conn_name}')
             self._setup_db()
         schema_version = self._db_connection.execute('SELECT value FROM misc WHERE key="schema_version"').fetchall()[0][0]
         if schema_version != SQLiteStorage.SCHEMA_VERSION:
-            if schema_version == 1:
-                log('Starting to migrate from version 1 to version 2')
-                try:
-                    cur = self._db_connection.cursor()
-                    with sqlite_txn(cur):
-                        for statement in self.MIGRATIONS[1]:
-                            cur.execute(statement)
-                except Exception as e:
-                    log(f'Error migrating to version 2 {e}')
-                    import tracback
-                    log(traceback.format_exc())
-                    raise SQLiteStorageError('Error migrating DB to version 2') from e
-                log('Migrated to version 2')
-            else:
+            if read_only or schema_version not in self.MIGRATIONS:
                 msg = f'ERROR: wrong schema version: {schema_version}'
                 log(msg)
                 raise SQLiteStorageError(msg)
+            while schema_version in self.MIGRATIONS:
+                self._migrate(schema_version)
+                schema_version += 1
+        self._apply_connection_profile(self.get_connection_profile())
+
+    def _apply_connection_profile(self, profile):
+        for pragma, value in self.CONNECTION_PROFILES[profile].items():
+            #a read-only connection can't change the journal mode of the file
+            if self.read_only and pragma == 'journal_mode':
+                continue
+            self._db_connection.execute(f'PRAGMA {pragma} = {value}')
+
+    def get_connection_profile(self):
+        profile = self.get_preference(self.CONNECTION_PROFILE_PREFERENCE) or self.DEFAULT_CONNECTION_PROFILE
+        if profile not in self.CONNECTION_PROFILES:
+            log(f'WARNING: invalid connection profile "{profile}" - using "{self.DEFAULT_CONNECTION_PROFILE}"')
+            return self.DEFAULT_CONNECTION_PROFILE
+        return profile
+
+    def set_connection_profile(self, profile):
+        if profile not in self.CONNECTION_PROFILES:
+            raise SQLiteStorageError(f'invalid connection profile: {profile}')
+        self.save_preference(self.CONNECTION_PROFILE_PREFERENCE, profile)
+        self._apply_connection_profile(profile)
+
+    def get_pragmas(self):
+        return {pragma: self._db_connection.execute(f'PRAGMA {pragma}').fetchone()[0]
+                for pragma in self.CONNECTION_PROFILES[self.DEFAULT_CONNECTION_PROFILE]}
+
+    def backup(self, dest_path, pages_per_step=-1, progress=None):
+        '''
+        Copy the DB to dest_path with the sqlite backup API, which is safe while the file is in use.
+        Copying pages_per_step pages at a time lets other connections write in between steps.
+        The copy uses its own connection, so it can run on another thread (except for in-memory DBs).
+        '''
+        if self._conn_name == ':memory:':
+            source = self._db_connection
+        else:
+            source = SQLiteStorage.get_db_connection(self._conn_name, read_only=self.read_only, immutable=self._immutable)
+        if progress:
+            backup_progress = lambda status, remaining, total: progress(total - remaining, total)
+        else:
+            backup_progress = None
+        dest = sqlite3.connect(dest_path)
+        try:
+            source.backup(dest, pages=pages_per_step, progress=backup_progress)
+        finally:
+            dest.close()
+            if source is not self._db_connection:
+                source.close()
+
+    def close(self):
+        if not self.read_only:
+            #let sqlite update the statistics the query planner uses, based on the queries run on this connection
+            self._db_connection.execute('PRAGMA optimize')
+        self._db_connection.close()
+
+    def _migrate(self, schema_version):
+        new_version = schema_version + 1
+        log(f'Starting to migrate from version {schema_version} to version {new_version}')
+        try:
+            cur = self._db_connection.cursor()
+            with sqlite_txn(cur):
+                self._run_migration(cur, self.MIGRATIONS[schema_version])
+        except Exception as e:
+            log(f'Error migrating to version {new_version} {e}')
+            import traceback
+            log(traceback.format_exc())
+            raise SQLiteStorageError(f'Error migrating DB to version {new_version}') from e
+        log(f'Migrated to version {new_version}')
 
     def _tables(self):
         results = self._db_connection.execute('SELECT name from sqlite_master WHERE type="table"').fetchall()
@@ -1161,23 +1460,55 @@ class SQLiteStorage:
 
         for schema, migrations in self.MIGRATIONS.items():
             with sqlite_txn(cur):
-                for statement in migrations:
-                    cur.execute(statement)
+                self._run_migration(cur, migrations)
+
+    def _run_migration(self, cur, statements):
+        #a migration is a list of SQL statements, and functions for anything that can't be done in SQL
+        for statement in statements:
+            if callable(statement):
+                statement(self, cur)
+            else:
+                cur.execute(statement)
+
+    def cache_info(self):
+        return {
+            'commodities': self._commodities.info(),
+            'accounts': self._accounts.info(),
+            'payees': self._payees.info(),
+        }
+
+    def clear_caches(self):
+        self._commodities.clear()
+        self._accounts.clear()
+        self._payees.clear()
+
+    def get_data_version(self):
+        #changes whenever another connection commits a change to the DB (but not for this connection's changes)
+        return self._db_connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def _commodity_from_db_record(self, record):
+        commodity = self._commodities.get(record[0])
+        if commodity:
+            return commodity
+        return self._commodities.add(Commodity(id_=record[0], type_=CommodityType(record[1]), code=record[2], name=record[3]))
 
     def get_commodity(self, id_=None, code=None):
         if id_:
+            commodity = self._commodities.get(id_)
+            if commodity:
+                return commodity
             record = self._db_connection.execute('SELECT id, type, code, name FROM commodities WHERE id = ?', (id_,)).fetchone()
         elif code:
             record = self._db_connection.execute('SELECT id, type, code, name FROM commodities WHERE code = ?', (code,)).fetchone()
         else:
             raise Exception('get_commodity: must pass in id_ or code')
-        return Commodity(id_=record[0], type_=CommodityType(record[1]), code=record[2], name=record[3])
+        return self._commodity_from_db_record(record)
 
     def get_commodities(self):
         currencies = []
         records = self._db_connection.execute('SELECT id, type, code, name FROM commodities').fetchall()
         for r in records:
-            currencies.append(Commodity(id_=r[0], type_=CommodityType(r[1]), code=r[2], name=r[3]))
+            currencies.append(self._commodity_from_db_record(r))
         return currencies
 
     def save_commodity(self, commodity):
@@ -1186,11 +1517,17 @@ class SQLiteStorage:
             cur.execute('INSERT INTO commodities(type, code, name) VALUES(?, ?, ?)',
                         (commodity.type.value, normalize(commodity.code), normalize(commodity.name)))
             commodity.id = cur.lastrowid
+        #accounts hold references to their commodity, so drop them as well
+        self._commodities.clear()
+        self._accounts.clear()
 
     def get_account(self, id_=None, number=None, name=None):
         fields = ['id', 'type', 'commodity_id', 'number', 'name', 'parent_id', 'alternate_id', 'description', 'closed', 'other_data']
         fields_str = ','.join(fields)
         if id_:
+            account = self._accounts.get(id_)
+            if account:
+                return account
             account_info = self._db_connection.execute(f'SELECT {fields_str} FROM accounts WHERE id = ?', (id_,)).fetchone()
             if not account_info:
                 raise Exception(f'no account with id "{id_}"')
@@ -1204,10 +1541,18 @@ class SQLiteStorage:
                 raise Exception(f'no account with name "{name}"')
         else:
             raise Exception('get_account: must pass in id_ or number or name')
+        if not id_:
+            account = self._accounts.get(account_info[0])
+            if account:
+                return account
         commodity = self.get_commodity(account_info[2])
         parent = None
         if account_info[5]:
             parent = self.get_account(account_info[5])
+        return self._accounts.add(self._account_from_db_record(account_info, commodity=commodity, parent=parent))
+
+    @staticmethod
+    def _account_from_db_record(account_info, commodity, parent):
         alternate_id = account_info[6]
         description = account_info[7]
         if account_info[8] == 1:
@@ -1288,6 +1633,8 @@ class SQLiteStorage:
                 cur.execute(f'UPDATE accounts SET {field_names_s} WHERE id = ?', field_values)
                 if cur.rowcount < 1:
                     raise Exception('no account with id %s to update' % account.id)
+                #the type determines whether the balance is the amount or the quantity
+                self._rebuild_balances(cur, account_ids=[account.id])
             else:
                 if 'commodity_id' not in field_names:
                     field_names.append('commodity_id')
@@ -1296,6 +1643,8 @@ class SQLiteStorage:
                 field_names_q = ','.join(['?' for _ in field_names])
                 cur.execute(f'INSERT INTO accounts({field_names_s}) VALUES({field_names_q})', field_values)
                 account.id = cur.lastrowid
+        #child accounts hold references to their parent, so drop all the cached accounts
+        self._accounts.clear()
 
     def bookmark_account(self, account_id):
         cur = self._db_connection.cursor()
@@ -1310,6 +1659,9 @@ class SQLiteStorage:
     def get_payee(self, id_=None, name=None):
         '''return None if object can't be found for whatever reason'''
         if id_:
+            payee = self._payees.get(id_)
+            if payee:
+                return payee
             info = self._db_connection.execute('SELECT id, name, notes FROM payees WHERE id = ?', (id_,)).fetchone()
             if not info:
                 return None
@@ -1319,17 +1671,19 @@ class SQLiteStorage:
                 return None
         else:
             return None
-        return Payee(
-                id_=info[0],
-                name=info[1],
-                notes=info[2]
-            )
+        return self._payee_from_db_record(info)
+
+    def _payee_from_db_record(self, record):
+        payee = self._payees.get(record[0])
+        if payee:
+            return payee
+        return self._payees.add(Payee(id_=record[0], name=record[1], notes=record[2]))
 
     def get_payees(self):
         results = self._db_connection.execute('SELECT id, name, notes FROM payees').fetchall()
         payees = []
         for r in results:
-            payees.append(Payee(id_=r[0], name=r[1], notes=r[2]))
+            payees.append(self._payee_from_db_record(r))
         return payees
 
     def save_payee(self, payee):
@@ -1344,36 +1698,45 @@ class SQLiteStorage:
             else:
                 cur.execute('INSERT INTO payees(name, notes) VALUES(?, ?)', field_values)
                 payee.id = cur.lastrowid
+        self._payees.remove(payee.id)
 
-    def _get_account_children(self, account, child_level):
-        children = []
-        query = 'SELECT id FROM accounts WHERE closed = ? AND parent_id = ? ORDER BY number, name'
-        db_records = self._db_connection.execute(query, (0, account.id)).fetchall()
-        for r in db_records:
-            account = self.get_account(r[0])
-            account.child_level = child_level
-            children.append(account)
-            children.extend(self._get_account_children(account, child_level=child_level+1))
-        return children
-
-    def _get_accounts_by_type(self, type_):
-        query = 'SELECT id FROM accounts WHERE type = ? AND closed = ? AND parent_id IS NULL ORDER BY number, name'
-        db_records = self._db_connection.execute(query, (type_.value, 0)).fetchall()
-        accounts = []
-        for r in db_records:
-            account = self.get_account(r[0])
-            accounts.append(account)
-            accounts.extend(self._get_account_children(account, child_level=1))
-        return accounts
-
-    def get_accounts(self, type_=None):
-        if type_:
-            return self._get_accounts_by_type(type_)
-        else:
-            accounts = []
-            for type_ in [AccountType.ASSET, AccountType.SECURITY, AccountType.LIABILITY, AccountType.INCOME, AccountType.EXPENSE, AccountType.EQUITY]:
-                accounts.extend(self._get_accounts_by_type(type_))
-            return accounts
+    def get_accounts(self, types=None):
+        '''
+        Returns the open accounts as a tree: the top-level accounts of each type (in the order of types),
+        each followed by its children (with child_level set), siblings ordered by number and name.
+        '''
+        if not types:
+            types = [AccountType.ASSET, AccountType.SECURITY, AccountType.LIABILITY, AccountType.INCOME, AccountType.EXPENSE, AccountType.EQUITY]
+        #sort_path is the position of the type, followed by the position of each account among its siblings
+        query = (
+            'WITH RECURSIVE ranked_accounts AS ('
+                'SELECT id, type, parent_id, closed, ROW_NUMBER() OVER (PARTITION BY parent_id ORDER BY number, name) AS sibling_rank FROM accounts), '
+            'tree(id, child_level, sort_path) AS ('
+                "SELECT ranked_accounts.id, 0, printf('%04d.%08d', types.key, ranked_accounts.sibling_rank) "
+                    'FROM ranked_accounts INNER JOIN json_each(?) AS types ON ranked_accounts.type = types.value '
+                    'WHERE ranked_accounts.parent_id IS NULL AND ranked_accounts.closed = 0 '
+                "UNION ALL SELECT ranked_accounts.id, tree.child_level + 1, tree.sort_path || printf('.%08d', ranked_accounts.sibling_rank) "
+                    'FROM ranked_accounts INNER JOIN tree ON ranked_accounts.parent_id = tree.id '
+                    'WHERE ranked_accounts.closed = 0) '
+            'SELECT accounts.id, accounts.type, accounts.commodity_id, accounts.number, accounts.name, accounts.parent_id, accounts.alternate_id, '
+                'accounts.description, accounts.closed, accounts.other_data, commodities.type, commodities.code, commodities.name, tree.child_level '
+            'FROM tree INNER JOIN accounts ON tree.id = accounts.id INNER JOIN commodities ON accounts.commodity_id = commodities.id '
+            'ORDER BY tree.sort_path'
+        )
+        records = self._db_connection.execute(query, (json.dumps([t.value for t in types]),)).fetchall()
+        accounts = {}
+        for r in records:
+            #parents come before their children
+            account = self._accounts.get(r[0])
+            if not account:
+                commodity = self._commodity_from_db_record((r[2], r[10], r[11], r[12]))
+                parent = None
+                if r[5]:
+                    parent = accounts[r[5]]
+                account = self._accounts.add(self._account_from_db_record(r, commodity=commodity, parent=parent))
+            account.child_level = r[13]
+            accounts[account.id] = account
+        return list(accounts.values())
 
     def get_bookmarked_accounts(self):
         query = 'SELECT account_id FROM bookmarked_accounts ORDER BY created'
@@ -1393,51 +1756,238 @@ class SQLiteStorage:
                     if r[0]:
                         cur.execute('UPDATE accounts SET parent_id = null WHERE id = ?', (r[0],))
             cur.execute('DELETE FROM accounts where id = ?', (account_id,))
+        self._accounts.clear()
+
+    def _get_accounts_by_ids(self, account_ids):
+        '''load accounts, with their commodities and all their parent accounts, in one query'''
+        accounts = {}
+        missing_account_ids = set()
+        for account_id in account_ids:
+            account = self._accounts.get(account_id)
+            if account:
+                accounts[account_id] = account
+            else:
+                missing_account_ids.add(account_id)
+        if not missing_account_ids:
+            return accounts
+        query = (
+            'WITH RECURSIVE account_ids(id) AS ('
+                'SELECT value FROM json_each(?) '
+                'UNION SELECT accounts.parent_id FROM accounts INNER JOIN account_ids ON accounts.id = account_ids.id WHERE accounts.parent_id IS NOT NULL) '
+            'SELECT accounts.id, accounts.type, accounts.commodity_id, accounts.number, accounts.name, accounts.parent_id, accounts.alternate_id, '
+                'accounts.description, accounts.closed, accounts.other_data, commodities.type, commodities.code, commodities.name '
+            'FROM accounts INNER JOIN commodities ON accounts.commodity_id = commodities.id '
+            'WHERE accounts.id IN (SELECT id FROM account_ids)'
+        )
+        records = {r[0]: r for r in self._db_connection.execute(query, (json.dumps(list(missing_account_ids)),)).fetchall()}
+
+        def _build_account(account_id):
+            if account_id not in accounts:
+                account = None
+                if account_id not in missing_account_ids: #a parent of one of the missing accounts
+                    account = self._accounts.get(account_id)
+                if not account:
+                    r = records[account_id]
+                    commodity = self._commodity_from_db_record((r[2], r[10], r[11], r[12]))
+                    parent = None
+                    if r[5]:
+                        parent = _build_account(r[5])
+                    account = self._accounts.add(self._account_from_db_record(r, commodity=commodity, parent=parent))
+                accounts[account_id] = account
+            return accounts[account_id]
+
+        for account_id in records:
+            _build_account(account_id)
+        return accounts
+
+    def _get_payees_by_ids(self, payee_ids):
+        payees = {}
+        missing_payee_ids = set()
+        for payee_id in payee_ids:
+            payee = self._payees.get(payee_id)
+            if payee:
+                payees[payee_id] = payee
+            else:
+                missing_payee_ids.add(payee_id)
+        if missing_payee_ids:
+            records = self._db_connection.execute('SELECT id, name, notes FROM payees WHERE id IN (SELECT value FROM json_each(?))', (json.dumps(list(missing_payee_ids)),)).fetchall()
+            for r in records:
+                payees[r[0]] = self._payee_from_db_record(r)
+        return payees
 
-    def _txn_from_db_record(self, db_info=None):
+    def _txn_from_db_record(self, db_info=None, split_records=None, accounts=None, payees=None):
         if not db_info:
             raise InvalidTransactionError('no db_info to construct transaction')
         id_, commodity_id, txn_date, description, alternate_id, entry_date = db_info
         txn_date = get_date(txn_date)
-        cur = self._db_connection.cursor()
         splits = []
-        split_records = cur.execute('SELECT account_id, type, value_numerator, value_denominator, quantity_numerator, quantity_denominator, reconciled_state, action, payee_id, description FROM transaction_splits WHERE transaction_id = ?', (id_,))
-        if split_records:
-            for split_record in split_records:
-                account_id = split_record[0]
-                account = self.get_account(account_id)
-                type_ = split_record[1]
-                amount = Fraction(split_record[2], split_record[3])
-                split = {'account': account, 'amount': amount, 'type': type_}
-                if split_record[4]:
-                    quantity = Fraction(split_record[4], split_record[5])
-                    split['quantity'] = quantity
-                if split_record[6]:
-                    split['status'] = split_record[6]
-                split['action'] = split_record[7]
-                if split_record[8]:
-                    split['payee'] = self.get_payee(id_=split_record[8])
-                if split_record[9]:
-                    split['description'] = split_record[9]
-                splits.append(split)
+        for split_record in split_records or []:
+            account = accounts[split_record[0]]
+            type_ = split_record[1]
+            amount = Fraction(split_record[2], split_record[3])
+            split = {'account': account, 'amount': amount, 'type': type_}
+            if split_record[4]:
+                quantity = Fraction(split_record[4], split_record[5])
+                split['quantity'] = quantity
+            if split_record[6]:
+                split['status'] = split_record[6]
+            split['action'] = split_record[7]
+            if split_record[8]:
+                split['payee'] = payees.get(split_record[8])
+            if split_record[9]:
+                split['description'] = split_record[9]
+            splits.append(split)
         return Transaction(splits=splits, txn_date=txn_date, description=description,
                            id_=id_, alternate_id=alternate_id, entry_date=entry_date)
 
-    def get_txn(self, txn_id):
+    def _get_txns(self, txn_ids_query, params):
+        '''
+        Load all the transactions whose ids are returned by txn_ids_query, using a fixed number
+        of queries (txns, splits, accounts, payees) no matter how many transactions there are.
+        '''
         cur = self._db_connection.cursor()
-        cur.execute('SELECT id,commodity_id,date,description,alternate_id,entry_date FROM transactions WHERE id = ?', (txn_id,))
-        db_info = cur.fetchone()
-        return self._txn_from_db_record(db_info=db_info)
+        txn_records = cur.execute(f'SELECT id,commodity_id,date,description,alternate_id,entry_date FROM transactions WHERE id IN ({txn_ids_query}) ORDER BY date, id', params).fetchall()
+        split_records = cur.execute('SELECT transaction_id, account_id, type, value_numerator, value_denominator, quantity_numerator, quantity_denominator, reconciled_state, action, payee_id, description '
+                f'FROM transaction_splits WHERE transaction_id IN ({txn_ids_query}) ORDER BY transaction_id, id', params).fetchall()
+        accounts = self._get_accounts_by_ids({r[1] for r in split_records})
+        payees = self._get_payees_by_ids({r[9] for r in split_records if r[9]})
+        txn_split_records = {}
+        for r in split_records:
+            txn_split_records.setdefault(r[0], []).append(r[1:])
+        return [self._txn_from_db_record(db_info=r, split_records=txn_split_records.get(r[0]), accounts=accounts, payees=payees) for r in txn_records]
 
-    def get_transactions(self, account_id):
-        txns = []
-        cur = self._db_connection.cursor()
-        db_txn_id_records = cur.execute('SELECT DISTINCT transaction_id FROM transaction_splits WHERE account_id = ?', (account_id,)).fetchall()
-        txn_ids = [r[0] for r in db_txn_id_records]
-        for txn_id in txn_ids:
-            txn = self.get_txn(txn_id)
-            txns.append(txn)
-        return txns
+    def get_txn(self, txn_id):
+        txns = self._get_txns('?', (txn_id,))
+        if not txns:
+            raise InvalidTransactionError(f'no transaction with id "{txn_id}"')
+        return txns[0]
+
+    def get_transactions(self, account_id, filter_account_id=None, status=None, query=None, start_date=None, end_date=None):
+        '''
+        Get the transactions in an account, optionally only the ones that also have a split in filter_account_id,
+        the ones where the account split has the given status, the ones where a payee name or the description
+        contains query (case-insensitive), or the ones between start_date and end_date (inclusive).
+        '''
+        txn_ids_query = 'SELECT transaction_splits.transaction_id FROM transaction_splits'
+        where = ['transaction_splits.account_id = ?']
+        params = [account_id]
+        if start_date or end_date or query:
+            txn_ids_query += ' INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id'
+        if filter_account_id:
+            where.append('transaction_splits.transaction_id IN (SELECT transaction_id FROM transaction_splits WHERE account_id = ?)')
+            params.append(filter_account_id)
+        if status:
+            where.append('transaction_splits.reconciled_state = ?')
+            params.append(status)
+        if start_date:
+            where.append('transactions.date >= ?')
+            params.append(str(start_date))
+        if end_date:
+            where.append('transactions.date <= ?')
+            params.append(str(end_date))
+        if query:
+            query = normalize(query).lower()
+            where.append('(instr(py_lower(transactions.description), ?) > 0 OR transaction_splits.transaction_id IN '
+                    '(SELECT transaction_splits.transaction_id FROM transaction_splits INNER JOIN payees ON transaction_splits.payee_id = payees.id '
+                    'WHERE instr(py_lower(payees.name), ?) > 0))')
+            params.extend([query, query])
+        txn_ids_query += ' WHERE ' + ' AND '.join(where)
+        return self._get_txns(txn_ids_query, params)
+
+    def get_transactions_page(self, account_id, limit, before=None):
+        '''
+        Get the newest limit transactions in an account that come before before=(date, id) (or the newest
+        transactions, if before isn't passed). Returns (txns, more_txns) - txns is sorted oldest to newest.
+        '''
+        where = 'transaction_splits.account_id = ?'
+        params = [account_id]
+        if before:
+            where += ' AND (transactions.date, transactions.id) < (?, ?)'
+            params.extend([str(before[0]), before[1]])
+        params.append(limit + 1)
+        records = self._db_connection.execute('SELECT transactions.id FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                f'WHERE {where} ORDER BY transactions.date DESC, transactions.id DESC LIMIT ?', params).fetchall()
+        txn_ids = [r[0] for r in records]
+        more_txns = len(txn_ids) > limit
+        txns = self._get_txns('SELECT value FROM json_each(?)', (json.dumps(txn_ids[:limit]),))
+        return txns, more_txns
+
+    @staticmethod
+    def _balance_columns(balance_field):
+        if balance_field == 'quantity':
+            return ('COALESCE(transaction_splits.quantity_numerator, transaction_splits.value_numerator)',
+                    'COALESCE(transaction_splits.quantity_denominator, transaction_splits.value_denominator)')
+        return 'transaction_splits.value_numerator', 'transaction_splits.value_denominator'
+
+    def get_running_balances(self, account_id, balance_field='amount'):
+        '''
+        Get the running balance, and the running cleared balance (cleared or reconciled splits), of an account
+        after each of its transactions, in (date, id) order. Returns {txn_id: (balance, cleared_balance)}.
+        The sums are done with window functions in SQL: the splits are scaled to integers over a common
+        denominator, so the arithmetic is exact.
+        '''
+        numerator, denominator = self._balance_columns(balance_field)
+        cleared_statuses = (Transaction.CLEARED, Transaction.RECONCILED)
+        denominators = [r[0] for r in self._db_connection.execute(f'SELECT DISTINCT {denominator} FROM transaction_splits WHERE account_id = ?', (account_id,)).fetchall()]
+        #math.lcm() is python 3.9+
+        common_denominator = reduce(lambda a, b: a * b // math.gcd(a, b), denominators, 1)
+        if common_denominator <= self.MAX_COMMON_DENOMINATOR:
+            scaled = f'{numerator} * (? / {denominator})'
+            query = (
+                f'SELECT transactions.id, SUM({scaled}) OVER txns_window, '
+                    f'SUM(CASE WHEN transaction_splits.reconciled_state IN (?, ?) THEN {scaled} ELSE 0 END) OVER txns_window '
+                'FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'WHERE transaction_splits.account_id = ? '
+                'WINDOW txns_window AS (ORDER BY transactions.date, transactions.id ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)'
+            )
+            params = (common_denominator, *cleared_statuses, common_denominator, account_id)
+            try:
+                records = self._db_connection.execute(query, params).fetchall()
+            except sqlite3.OperationalError: #the SUM overflowed
+                records = None
+            #sqlite turns a scaled value that overflows into a REAL, instead of raising an error
+            if records is not None and all(isinstance(r[1], int) and isinstance(r[2], int) for r in records):
+                return {r[0]: (Fraction(r[1], common_denominator), Fraction(r[2], common_denominator)) for r in records}
+        #the scaled values wouldn't fit in sqlite's 64-bit integers, so add up the Fractions here
+        records = self._db_connection.execute(f'SELECT transactions.id, {numerator}, {denominator}, transaction_splits.reconciled_state '
+                'FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'WHERE transaction_splits.account_id = ? ORDER BY transactions.date, transactions.id', (account_id,)).fetchall()
+        balances = {}
+        balance = Fraction(0)
+        cleared_balance = Fraction(0)
+        for r in records:
+            amount = Fraction(r[1], r[2])
+            balance += amount
+            if r[3] in cleared_statuses:
+                cleared_balance += amount
+            balances[r[0]] = (balance, cleared_balance)
+        return balances
+
+    def get_balance(self, account_id, balance_field='amount', before=None, end_date=None, statuses=None):
+        '''
+        Total of the amounts (or quantities) of an account's splits - optionally only for transactions that come before
+        before=(date, id), that are dated on or before end_date, or whose account split has one of the statuses.
+        The sum is done in SQL for each denominator, so the result is exact.
+        '''
+        numerator, denominator = self._balance_columns(balance_field)
+        where = ['transaction_splits.account_id = ?']
+        params = [account_id]
+        if before:
+            where.append('(transactions.date, transactions.id) < (?, ?)')
+            params.extend([str(before[0]), before[1]])
+        if end_date:
+            where.append('transactions.date <= ?')
+            params.append(str(end_date))
+        if statuses:
+            where.append('transaction_splits.reconciled_state IN (SELECT value FROM json_each(?))')
+            params.append(json.dumps(statuses))
+        where_s = ' AND '.join(where)
+        records = self._db_connection.execute(f'SELECT SUM({numerator}), {denominator} FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                f'WHERE {where_s} GROUP BY {denominator}', params).fetchall()
+        balance = Fraction(0)
+        for r in records:
+            balance += Fraction(r[0], r[1])
+        return balance
 
     def save_txn(self, txn):
         check_txn_splits(txn.splits)
@@ -1452,76 +2002,264 @@ class SQLiteStorage:
                         split['payee'].id = db_payee.id
                     else:
                         self.save_payee(split['payee'])
-        field_names = ['date', 'description']
-        field_values = [txn.txn_date.strftime('%Y-%m-%d'), normalize(txn.description or '')]
-        if txn.alternate_id is not None:
-            field_names.append('alternate_id')
-            field_values.append(normalize(txn.alternate_id))
-        if txn.entry_date:
-            field_names.append('entry_date')
-            field_values.append(txn.entry_date.strftime('%Y-%m-%d'))
+        txn_fields = self._txn_db_fields(txn)
         cur = self._db_connection.cursor()
         with sqlite_txn(cur):
-            if txn.id:
+            old_split_balances = self._get_split_balances(cur, [txn.id]) if txn.id else []
+            txn_id = self._write_txn(cur, txn, txn_fields)
+            self._update_balances(cur, old_split_balances, self._get_split_balances(cur, [txn_id]))
+        txn.id = txn_id
+
+    @staticmethod
+    def _split_db_values(split, payee_id):
+        amount = split['amount']
+        quantity = split['quantity']
+        status = split.get('status', '')
+        if 'reconcile_date' in split:
+            reconcile_date = str(split['reconcile_date'])
+        else:
+            reconcile_date = None
+        type_ = normalize(split.get('type', ''))
+        description = normalize(split.get('description', ''))
+        return [amount.numerator, amount.denominator, quantity.numerator, quantity.denominator, status, reconcile_date, type_, description, payee_id]
+
+    @staticmethod
+    def _txn_db_fields(txn):
+        fields = {
+            'date': txn.txn_date.strftime('%Y-%m-%d'),
+            'description': normalize(txn.description or ''),
+        }
+        if txn.alternate_id is not None:
+            fields['alternate_id'] = normalize(txn.alternate_id)
+        if txn.entry_date:
+            fields['entry_date'] = txn.entry_date.strftime('%Y-%m-%d')
+        return fields
+
+    def _write_txn(self, cur, txn, txn_fields, payee_ids=None):
+        '''write txn & its splits - must be called inside a sqlite_txn
+        payee_ids maps normalized names to ids, for new payees that don't have their ids set yet'''
+        field_names = list(txn_fields.keys())
+        field_values = list(txn_fields.values())
+        if txn.id:
+            field_names_s = ', '.join([f'{name} = ?' for name in field_names])
+            field_values.append(txn.id)
+            cur.execute(f'UPDATE transactions SET {field_names_s} WHERE id = ?', field_values)
+            if cur.rowcount < 1:
+                raise Exception('no txn with id %s to update' % txn.id)
+            txn_id = txn.id
+        else:
+            field_names.append('commodity_id')
+            field_values.append(1)
+            field_names_s = ','.join(field_names)
+            field_names_q = ','.join(['?' for _ in field_names])
+            cur.execute(f'INSERT INTO transactions({field_names_s}) VALUES({field_names_q})', field_values)
+            txn_id = cur.lastrowid
+        #update transaction splits
+        splits_db_info = cur.execute('SELECT account_id FROM transaction_splits WHERE transaction_id = ?', (txn_id,)).fetchall()
+        old_txn_split_account_ids = [r[0] for r in splits_db_info]
+        new_txn_split_account_ids = [split['account'].id for split in txn.splits]
+        #this could result in losing data if there was data in the splits that wasn't exposed in the GUI...
+        #   eg. post_date, reconcile_date aren't exposed in the GUI
+        split_account_ids_to_delete = set(old_txn_split_account_ids) - set(new_txn_split_account_ids)
+        for account_id in split_account_ids_to_delete:
+            cur.execute('DELETE FROM transaction_splits WHERE transaction_id = ? AND account_id = ?', (txn_id, account_id))
+        for split in txn.splits:
+            if 'payee' in split:
+                payee = split['payee']
+                payee_id = payee.id or (payee_ids or {}).get(normalize(payee.name))
+            else:
+                payee_id = None
+            field_names = ['value_numerator', 'value_denominator', 'quantity_numerator', 'quantity_denominator', 'reconciled_state', 'reconcile_date', 'type', 'description', 'payee_id']
+            field_values = self._split_db_values(split, payee_id)
+            action = split.get('action')
+            if action is not None:
+                field_names.append('action')
+                field_values.append(action)
+            account = split['account']
+            field_values.extend([txn_id, account.id]) #add txn id and account id for insert and update
+            if account.id in old_txn_split_account_ids:
                 field_names_s = ', '.join([f'{name} = ?' for name in field_names])
-                field_values.append(txn.id)
-                cur.execute(f'UPDATE transactions SET {field_names_s} WHERE id = ?', field_values)
-                if cur.rowcount < 1:
-                    raise Exception('no txn with id %s to update' % txn.id)
-                txn_id = txn.id
+                cur.execute(f'UPDATE transaction_splits SET {field_names_s} WHERE transaction_id = ? AND account_id = ?', field_values)
             else:
-                field_names.append('commodity_id')
-                field_values.append(1)
+                field_names.extend(['transaction_id', 'account_id'])
                 field_names_s = ','.join(field_names)
                 field_names_q = ','.join(['?' for _ in field_names])
-                cur.execute(f'INSERT INTO transactions({field_names_s}) VALUES({field_names_q})', field_values)
-                txn_id = cur.lastrowid
-            #update transaction splits
-            splits_db_info = cur.execute('SELECT account_id FROM transaction_splits WHERE transaction_id = ?', (txn_id,)).fetchall()
-            old_txn_split_account_ids = [r[0] for r in splits_db_info]
-            new_txn_split_account_ids = [split['account'].id for split in txn.splits]
-            #this could result in losing data if there was data in the splits that wasn't exposed in the GUI...
-            #   eg. post_date, reconcile_date aren't exposed in the GUI
-            split_account_ids_to_delete = set(old_txn_split_account_ids) - set(new_txn_split_account_ids)
-            for account_id in split_account_ids_to_delete:
-                cur.execute('DELETE FROM transaction_splits WHERE transaction_id = ? AND account_id = ?', (txn_id, account_id))
+                cur.execute(f'INSERT INTO transaction_splits({field_names_s}) VALUES({field_names_q})', field_values)
+        return txn_id
+
+    def save_txns(self, txns):
+        '''
+        Save many transactions in one DB transaction: either they're all saved, or (on any error) none
+        of them are. New transactions are written with executemany. Returns the list of transaction ids.
+        '''
+        txns = list(txns)
+        txns_fields = [self._txn_db_fields(txn) for txn in txns]
+        new_payees = {}
+        for txn in txns:
+            check_txn_splits(txn.splits)
             for split in txn.splits:
-                if 'payee' in split:
-                    payee_id = split['payee'].id
-                else:
-                    payee_id = None
-                amount = split['amount']
-                quantity = split['quantity']
-                status = split.get('status', '')
-                if 'reconcile_date' in split:
-                    reconcile_date = str(split['reconcile_date'])
-                else:
-                    reconcile_date = None
-                type_ = normalize(split.get('type', ''))
-                description = normalize(split.get('description', ''))
-                field_names = ['value_numerator', 'value_denominator', 'quantity_numerator', 'quantity_denominator', 'reconciled_state', 'reconcile_date', 'type', 'description', 'payee_id']
-                field_values = [amount.numerator, amount.denominator, quantity.numerator, quantity.denominator, status, reconcile_date, type_, description, payee_id]
-                action = split.get('action')
-                if action is not None:
-                    field_names.append('action')
-                    field_values.append(action)
-                account = split['account']
-                field_values.extend([txn_id, account.id]) #add txn id and account id for insert and update
-                if account.id in old_txn_split_account_ids:
-                    field_names_s = ', '.join([f'{name} = ?' for name in field_names])
-                    cur.execute(f'UPDATE transaction_splits SET {field_names_s} WHERE transaction_id = ? AND account_id = ?', field_values)
-                else:
-                    field_names.extend(['transaction_id', 'account_id'])
-                    field_names_s = ','.join(field_names)
-                    field_names_q = ','.join(['?' for _ in field_names])
-                    cur.execute(f'INSERT INTO transaction_splits({field_names_s}) VALUES({field_names_q})', field_values)
+                if not split['account'].id:
+                    raise InvalidTransactionError(f'account {split["account"]} must be saved before saving transactions in bulk')
+                if 'payee' in split and not split['payee'].id:
+                    new_payees.setdefault(normalize(split['payee'].name), []).append(split['payee'])
+        new_txns = [txn for txn in txns if not txn.id]
+        payee_ids = {}
+        cur = self._db_connection.cursor()
+        with sqlite_txn(cur):
+            old_split_balances = self._get_split_balances(cur, [txn.id for txn in txns if txn.id])
+            if new_payees:
+                records = cur.execute('SELECT id, name FROM payees WHERE name IN (SELECT value FROM json_each(?))', (json.dumps(list(new_payees)),)).fetchall()
+                payee_ids = {r[1]: r[0] for r in records}
+                next_payee_id = cur.execute('SELECT COALESCE(MAX(id), 0) FROM payees').fetchone()[0] + 1
+                payee_records = []
+                for name, payees in new_payees.items():
+                    if name not in payee_ids:
+                        payee_ids[name] = next_payee_id
+                        payee_records.append((next_payee_id, name, normalize(payees[0].notes)))
+                        next_payee_id += 1
+                cur.executemany('INSERT INTO payees(id, name, notes) VALUES(?, ?, ?)', payee_records)
+            for txn, txn_fields in zip(txns, txns_fields):
+                if txn.id:
+                    self._write_txn(cur, txn, txn_fields, payee_ids)
+            next_txn_id = cur.execute('SELECT COALESCE(MAX(id), 0) FROM transactions').fetchone()[0] + 1
+            new_txn_ids = list(range(next_txn_id, next_txn_id + len(new_txns)))
+            new_txns_fields = [txn_fields for txn, txn_fields in zip(txns, txns_fields) if not txn.id]
+            txn_records = []
+            split_records = []
+            for txn_id, txn, txn_fields in zip(new_txn_ids, new_txns, new_txns_fields):
+                txn_records.append((txn_id, txn_fields['date'], txn_fields['description'], txn_fields.get('alternate_id', ''), txn_fields.get('entry_date')))
+                for split in txn.splits:
+                    if 'payee' in split:
+                        payee = split['payee']
+                        payee_id = payee.id or payee_ids[normalize(payee.name)]
+                    else:
+                        payee_id = None
+                    split_records.append(self._split_db_values(split, payee_id) + [split.get('action') or '', txn_id, split['account'].id])
+            cur.executemany('INSERT INTO transactions(id, commodity_id, date, description, alternate_id, entry_date) '
+                            'VALUES(?, 1, ?, ?, ?, COALESCE(?, date(\'now\', \'localtime\')))', txn_records)
+            cur.executemany('INSERT INTO transaction_splits(value_numerator, value_denominator, quantity_numerator, quantity_denominator, reconciled_state, reconcile_date, type, description, payee_id, action, transaction_id, account_id) '
+                            'VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', split_records)
+            new_split_balances = self._get_split_balances(cur, [txn.id for txn in txns if txn.id] + new_txn_ids)
+            self._update_balances(cur, old_split_balances, new_split_balances)
+        #only update the objects after everything has been committed
+        for name, payees in new_payees.items():
+            for payee in payees:
+                payee.id = payee_ids[name]
+        for txn_id, txn in zip(new_txn_ids, new_txns):
             txn.id = txn_id
+        return [txn.id for txn in txns]
 
     def delete_txn(self, txn_id):
         cur = self._db_connection.cursor()
         with sqlite_txn(cur):
+            old_split_balances = self._get_split_balances(cur, [txn_id])
             cur.execute('DELETE FROM transaction_splits WHERE transaction_id = ?', (txn_id,))
             cur.execute('DELETE FROM transactions WHERE id = ?', (txn_id,))
+            self._update_balances(cur, old_split_balances, [])
+
+    #the balance of a security account is its quantity - for other accounts, it's the amount
+    SPLIT_BALANCE_COLUMNS = (
+        "CASE WHEN accounts.type = 'security' THEN COALESCE(transaction_splits.quantity_numerator, transaction_splits.value_numerator) ELSE transaction_splits.value_numerator END",
+        "CASE WHEN accounts.type = 'security' THEN COALESCE(transaction_splits.quantity_denominator, transaction_splits.value_denominator) ELSE transaction_splits.value_denominator END",
+    )
+
+    def _get_split_balances(self, cur, txn_ids):
+        '''returns (account_id, numerator, denominator, status, txn_date) for each split of the txns'''
+        if not txn_ids:
+            return []
+        numerator, denominator = self.SPLIT_BALANCE_COLUMNS
+        return cur.execute(f'SELECT transaction_splits.account_id, {numerator}, {denominator}, transaction_splits.reconciled_state, transactions.date '
+                'FROM transaction_splits '
+                'INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'INNER JOIN accounts ON transaction_splits.account_id = accounts.id '
+                'WHERE transaction_splits.transaction_id IN (SELECT value FROM json_each(?))', (json.dumps(txn_ids),)).fetchall()
+
+    def _update_balances(self, cur, old_split_balances, new_split_balances):
+        '''
+        Apply the changes from old split values to new split values to the account_balances table.
+        Must be called inside a sqlite_txn.
+        '''
+        changes = {}
+        for sign, split_balances in [(-1, old_split_balances), (1, new_split_balances)]:
+            for account_id, numerator, denominator, status, txn_date in split_balances:
+                change = changes.setdefault(account_id, {'total': Fraction(0), 'cleared': Fraction(0), 'reconciled': Fraction(0), 'old_dates': [], 'new_dates': []})
+                amount = sign * Fraction(numerator, denominator)
+                change['total'] += amount
+                if status in [Transaction.CLEARED, Transaction.RECONCILED]:
+                    change['cleared'] += amount
+                if status == Transaction.RECONCILED:
+                    change['reconciled'] += amount
+                change['old_dates' if sign < 0 else 'new_dates'].append(txn_date)
+        records = []
+        for account_id, change in changes.items():
+            record = cur.execute('SELECT total_numerator, total_denominator, cleared_numerator, cleared_denominator, reconciled_numerator, reconciled_denominator, last_txn_date '
+                    'FROM account_balances WHERE account_id = ?', (account_id,)).fetchone()
+            if record:
+                total = Fraction(record[0], record[1]) + change['total']
+                cleared = Fraction(record[2], record[3]) + change['cleared']
+                reconciled = Fraction(record[4], record[5]) + change['reconciled']
+                last_txn_date = record[6]
+            else:
+                total = change['total']
+                cleared = change['cleared']
+                reconciled = change['reconciled']
+                last_txn_date = None
+            if last_txn_date and any([d >= last_txn_date for d in change['old_dates']]):
+                #the latest txn may have been changed or deleted
+                last_txn_date = cur.execute('SELECT MAX(transactions.date) FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                        'WHERE transaction_splits.account_id = ?', (account_id,)).fetchone()[0]
+            else:
+                last_txn_date = max([d for d in change['new_dates'] + [last_txn_date] if d], default=None)
+            records.append((account_id, total.numerator, total.denominator, cleared.numerator, cleared.denominator,
+                            reconciled.numerator, reconciled.denominator, last_txn_date))
+        cur.executemany('INSERT INTO account_balances(account_id, total_numerator, total_denominator, cleared_numerator, cleared_denominator, reconciled_numerator, reconciled_denominator, last_txn_date) '
+                        'VALUES(?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(account_id) DO UPDATE SET '
+                        'total_numerator = excluded.total_numerator, total_denominator = excluded.total_denominator, '
+                        'cleared_numerator = excluded.cleared_numerator, cleared_denominator = excluded.cleared_denominator, '
+                        'reconciled_numerator = excluded.reconciled_numerator, reconciled_denominator = excluded.reconciled_denominator, '
+                        'last_txn_date = excluded.last_txn_date, updated = CURRENT_TIMESTAMP', records)
+
+    def _rebuild_balances(self, cur, account_ids=None):
+        numerator, denominator = self.SPLIT_BALANCE_COLUMNS
+        query = (f'SELECT transaction_splits.account_id, SUM({numerator}), {denominator}, transaction_splits.reconciled_state, MAX(transactions.date) '
+                'FROM transaction_splits '
+                'INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'INNER JOIN accounts ON transaction_splits.account_id = accounts.id')
+        if account_ids is None:
+            cur.execute('DELETE FROM account_balances')
+            params = ()
+        else:
+            cur.execute('DELETE FROM account_balances WHERE account_id IN (SELECT value FROM json_each(?))', (json.dumps(account_ids),))
+            query += ' WHERE transaction_splits.account_id IN (SELECT value FROM json_each(?))'
+            params = (json.dumps(account_ids),)
+        query += ' GROUP BY transaction_splits.account_id, 3, transaction_splits.reconciled_state'
+        self._update_balances(cur, [], cur.execute(query, params).fetchall())
+
+    def rebuild_balances(self):
+        '''
+        Recalculate the account_balances table from all the transactions (eg. if it has drifted).
+        '''
+        cur = self._db_connection.cursor()
+        with sqlite_txn(cur):
+            self._rebuild_balances(cur)
+
+    def get_account_balances(self, account_ids=None):
+        '''
+        Returns {account_id: AccountBalances} from the account_balances table. Accounts without
+        any transactions aren't included.
+        '''
+        query = ('SELECT account_id, total_numerator, total_denominator, cleared_numerator, cleared_denominator, reconciled_numerator, reconciled_denominator, last_txn_date '
+                 'FROM account_balances')
+        params = ()
+        if account_ids is not None:
+            query += ' WHERE account_id IN (SELECT value FROM json_each(?))'
+            params = (json.dumps(account_ids),)
+        balances = {}
+        for r in self._db_connection.execute(query, params).fetchall():
+            last_txn_date = get_date(r[7]) if r[7] else None
+            balances[r[0]] = AccountBalances(total=Fraction(r[1], r[2]), cleared=Fraction(r[3], r[4]),
+                    reconciled=Fraction(r[5], r[6]), last_txn_date=last_txn_date)
+        return balances
 
     def save_budget(self, budget):
         cur = self._db_connection.cursor()
@@ -1573,48 +2311,79 @@ class SQLiteStorage:
                         cur.execute('INSERT INTO budget_values(budget_id, account_id, amount_numerator, amount_denominator, carryover_numerator, carryover_denominator, notes) VALUES (?, ?, ?, ?, ?, ?, ?)', values)
 
     def get_budget(self, id_):
+        return self._get_budget(id_, self.get_accounts(types=[AccountType.EXPENSE, AccountType.INCOME]))
+
+    def _get_budget(self, id_, income_and_expense_accounts):
         cur = self._db_connection.cursor()
         records = cur.execute('SELECT start_date, end_date FROM budgets WHERE id = ?', (id_,)).fetchall()
         start_date = get_date(records[0][0])
         end_date = get_date(records[0][1])
+        #spent (positive splits) & income (negative splits) for all the accounts - summed per denominator, so the sums stay exact
+        spent_income = {}
+        txn_splits_records = cur.execute(
+                'SELECT transaction_splits.account_id, transaction_splits.value_denominator, '
+                    'SUM(CASE WHEN transaction_splits.value_numerator > 0 THEN transaction_splits.value_numerator ELSE 0 END), '
+                    'SUM(CASE WHEN transaction_splits.value_numerator < 0 THEN -transaction_splits.value_numerator ELSE 0 END) '
+                'FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'WHERE transactions.date > ? AND transactions.date < ? '
+                'GROUP BY transaction_splits.account_id, transaction_splits.value_denominator', (str(start_date), str(end_date))).fetchall()
+        for account_id, denominator, spent, income in txn_splits_records:
+            account_spent, account_income = spent_income.get(account_id, (Fraction(0), Fraction(0)))
+            spent_income[account_id] = (account_spent + Fraction(spent, denominator), account_income + Fraction(income, denominator))
+        budget_records = cur.execute('SELECT account_id, amount_numerator, amount_denominator, carryover_numerator, carryover_denominator, notes FROM budget_values WHERE budget_id = ?', (id_,)).fetchall()
+        budget_values = {r[0]: r for r in budget_records}
         account_budget_info = {}
         all_income_spending_info = {}
-        income_and_expense_accounts = []
-        income_and_expense_accounts.extend(self.get_accounts(type_=AccountType.EXPENSE))
-        income_and_expense_accounts.extend(self.get_accounts(type_=AccountType.INCOME))
         for account in income_and_expense_accounts:
+            spent, income = spent_income.get(account.id, (Fraction(0), Fraction(0)))
+            all_income_spending_info[account] = {'spent': spent, 'income': income}
             account_budget_info[account] = {}
-            all_income_spending_info[account] = {}
-            #get spent & income values for each expense account
-            spent = Fraction(0)
-            income = Fraction(0)
-            txn_splits_records = self._db_connection.execute('SELECT transaction_splits.value_numerator, transaction_splits.value_denominator FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id WHERE transaction_splits.account_id = ? AND transactions.date > ? AND transactions.date < ?', (account.id, str(start_date), str(end_date))).fetchall()
-            for record in txn_splits_records:
-                amt = Fraction(record[0], record[1])
-                if amt < Fraction(0):
-                    income += amt * Fraction(-1)
-                else:
-                    spent += amt
-            all_income_spending_info[account]['spent'] = spent
-            all_income_spending_info[account]['income'] = income
-            budget_records = cur.execute('SELECT amount_numerator, amount_denominator, carryover_numerator, carryover_denominator, notes FROM budget_values WHERE budget_id = ? AND account_id = ?', (id_, account.id)).fetchall()
-            if budget_records:
-                r = budget_records[0]
-                account_budget_info[account]['amount'] = Fraction(r[0], r[1])
-                account_budget_info[account]['carryover'] = Fraction(r[2] or 0, r[3] or 1)
-                account_budget_info[account]['notes'] = r[4]
-            else:
-                account_budget_info[account] = {}
+            if account.id in budget_values:
+                r = budget_values[account.id]
+                account_budget_info[account]['amount'] = Fraction(r[1], r[2])
+                account_budget_info[account]['carryover'] = Fraction(r[3] or 0, r[4] or 1)
+                account_budget_info[account]['notes'] = r[5]
         return Budget(id_=id_, start_date=start_date, end_date=end_date, account_budget_info=account_budget_info,
                 income_spending_info=all_income_spending_info)
 
+    def get_monthly_income_spending(self, start_date, end_date):
+        '''
+        Returns {account_id: {'YYYY-MM': {'spent': xxx, 'income': xxx}}} for the income & expense accounts,
+        for the txns between start_date and end_date - the bounds are exclusive, like get_budget, so the totals match.
+        '''
+        records = self._db_connection.execute(
+                "SELECT transaction_splits.account_id, strftime('%Y-%m', transactions.date), transaction_splits.value_denominator, "
+                    'SUM(CASE WHEN transaction_splits.value_numerator > 0 THEN transaction_splits.value_numerator ELSE 0 END), '
+                    'SUM(CASE WHEN transaction_splits.value_numerator < 0 THEN -transaction_splits.value_numerator ELSE 0 END) '
+                'FROM transaction_splits '
+                'INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id '
+                'INNER JOIN accounts ON transaction_splits.account_id = accounts.id '
+                'WHERE transactions.date > ? AND transactions.date < ? AND accounts.type IN (?, ?) '
+                'GROUP BY transaction_splits.account_id, 2, transaction_splits.value_denominator',
+                (str(start_date), str(end_date), AccountType.INCOME.value, AccountType.EXPENSE.value)).fetchall()
+        income_spending = {}
+        for account_id, month, denominator, spent, income in records:
+            info = income_spending.setdefault(account_id, {}).setdefault(month, {'spent': Fraction(0), 'income': Fraction(0)})
+            info['spent'] += Fraction(spent, denominator)
+            info['income'] += Fraction(income, denominator)
+        return income_spending
+
+    def get_budget_summaries(self):
+        '''
+        Returns Budget objects with only id, name, and dates (no budget values or income/spending info) - use
+        get_budget to load a whole budget.
+        '''
+        records = self._db_connection.execute('SELECT id, name, start_date, end_date FROM budgets ORDER BY start_date DESC').fetchall()
+        return [Budget(id_=r[0], name=r[1], start_date=r[2], end_date=r[3]) for r in records]
+
     def get_budgets(self):
         budgets = []
         cur = self._db_connection.cursor()
         budget_records = cur.execute('SELECT id FROM budgets ORDER BY start_date DESC').fetchall()
+        income_and_expense_accounts = self.get_accounts(types=[AccountType.EXPENSE, AccountType.INCOME])
         for budget_record in budget_records:
             budget_id = int(budget_record[0])
-            budgets.append(self.get_budget(budget_id))
+            budgets.append(self._get_budget(budget_id, income_and_expense_accounts))
         return budgets
 
     def save_scheduled_transaction(self, scheduled_txn):
@@ -1735,19 +2504,122 @@ class SQLiteStorage:
 
 ### ENGINE ###
 
+class LRUCache:
+    '''
+    Keeps the most recently used max_size objects, keyed by id.
+    '''
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._objects = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, id_):
+        obj = self._objects.get(id_)
+        if obj is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._objects.move_to_end(id_)
+        return obj
+
+    def add(self, obj):
+        self._objects[obj.id] = obj
+        self._objects.move_to_end(obj.id)
+        while len(self._objects) > self.max_size:
+            self._objects.popitem(last=False)
+            self.evictions += 1
+        return obj
+
+    def remove(self, id_):
+        self._objects.pop(id_, None)
+
+    def clear(self):
+        self._objects.clear()
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': len(self._objects), 'max_size': self.max_size}
+
+
 class Engine:
 
-    def __init__(self, file_name):
+    DEFAULT_TXN_CACHE_SIZE = 1000
+    DEFAULT_BACKUP_PAGES_PER_STEP = 1000
+
+    def __init__(self, file_name, txn_cache_size=DEFAULT_TXN_CACHE_SIZE, read_only=False, immutable=False):
+        self._file_name = file_name
         try:
-            self._storage = SQLiteStorage(file_name)
+            self._storage = SQLiteStorage(file_name, read_only=read_only, immutable=immutable)
         except sqlite3.DatabaseError as e:
             raise InvalidStorageFile(str(e))
+        #transactions fetched by id (eg. for editing), so they're not reloaded every time
+        self._txn_cache = LRUCache(max_size=txn_cache_size)
+        self._data_version = self._storage.get_data_version()
+        #reports & exports only read data, so they use a separate read-only connection (opened when it's
+        #  first needed) - a long report doesn't hold up saves. An in-memory DB can't be shared, and a read-only
+        #  engine doesn't need another connection.
+        if read_only or file_name == ':memory:':
+            self._report_storage = self._storage
+        else:
+            self._report_storage = None
+        self._report_data_version = None
+
+    @property
+    def read_only(self):
+        return self._storage.read_only
+
+    def _get_report_storage(self):
+        if self._report_storage is None:
+            self._report_storage = SQLiteStorage(self._file_name, read_only=True)
+            self._report_data_version = self._report_storage.get_data_version()
+        elif self._report_storage is not self._storage:
+            #drop the cached accounts/payees if anything has been saved since the last report
+            data_version = self._report_storage.get_data_version()
+            if data_version != self._report_data_version:
+                self._report_data_version = data_version
+                self._report_storage.clear_caches()
+        return self._report_storage
+
+    def close(self):
+        if self._report_storage and self._report_storage is not self._storage:
+            self._report_storage.close()
+        self._storage.close()
+
+    def backup(self, dest_path, pages_per_step=DEFAULT_BACKUP_PAGES_PER_STEP, progress=None):
+        '''progress is called with (pages copied, total pages) after each step'''
+        self._storage.backup(dest_path, pages_per_step=pages_per_step, progress=progress)
+
+    def get_connection_profile(self):
+        return self._storage.get_connection_profile()
+
+    def set_connection_profile(self, profile):
+        self._storage.set_connection_profile(profile)
+
+    def has_external_changes(self):
+        '''
+        Check whether another process (eg. an import, or a script) has written to the file since the
+        last check. If so, the cached objects are dropped so everything is reloaded from the DB. This
+        is cheap enough to poll: PRAGMA data_version doesn't read any data.
+        '''
+        data_version = self._storage.get_data_version()
+        if data_version == self._data_version:
+            return False
+        self._data_version = data_version
+        self._txn_cache.clear()
+        self._storage.clear_caches()
+        return True
+
+    def cache_info(self):
+        return {'transactions': self._txn_cache.info(), **self._storage.cache_info()}
 
     def get_commodity(self, id_=None, code=None):
         return self._storage.get_commodity(id_=id_, code=code)
 
     def save_commodity(self, c):
         self._storage.save_commodity(c)
+        self._txn_cache.clear()
 
     def get_currencies(self):
         commodities = self._storage.get_commodities()
@@ -1757,13 +2629,7 @@ class Engine:
         return self._storage.get_account(id_=id_, number=number, name=name)
 
     def get_accounts(self, types=None):
-        if types:
-            accounts = []
-            for type_ in types:
-                accounts.extend(self._storage.get_accounts(type_=type_))
-            return accounts
-        else:
-            return self._storage.get_accounts()
+        return self._storage.get_accounts(types=types)
 
     def get_bookmarked_accounts(self):
         return self._storage.get_bookmarked_accounts()
@@ -1785,66 +2651,131 @@ class Engine:
                 commodity = None
             account = Account(id_=id_, type_=type_, commodity=commodity, number=number, name=name, parent=parent)
         self._storage.save_account(account)
+        #cached txns have references to the old account objects
+        self._txn_cache.clear()
         return account
 
     def delete_account(self, account_id):
         self._storage.delete_account(account_id)
+        self._txn_cache.clear()
 
     @staticmethod
     def sort_txns(txns, key='date'):
         return sorted(txns, key=lambda t: t.txn_date)
 
     @staticmethod
-    def add_balance_to_txns(txns, account, balance_field='amount'):
+    def add_balance_to_txns(txns, account, balance_field='amount', starting_balance=0):
         #txns must be sorted in chronological order (not reversed) already
         txns_with_balance = []
-        balance = Fraction(0)
+        if balance_field == 'amount':
+            balance = amount_to_cents(Fraction(starting_balance))
+            for t in txns:
+                balance += amount_to_cents(t.get_split(account).amount)
+                t.balance = cents_to_amount(balance)
+                txns_with_balance.append(t)
+            return txns_with_balance
+        #quantities can be any fraction
+        balance = Fraction(starting_balance)
         for t in txns:
-            split = [s for s in t.splits if s['account'] == account][0]
+            split = t.get_split(account)
             balance = balance + split[balance_field]
             t.balance = balance
             txns_with_balance.append(t)
         return txns_with_balance
 
     def get_transaction(self, id_):
-        return self._storage.get_txn(id_)
-
-    def get_transactions(self, account, filter_account=None, query=None, status=None, sort='date'):
-        results = self._storage.get_transactions(account_id=account.id)
-        if filter_account:
-            results = [t for t in results if filter_account in [s['account'] for s in t.splits]]
-        if status:
-            results = [t for t in results if [s for s in t.splits if s['account'] == account][0].get('status') == status]
-        if query:
-            query = query.lower()
-            results = [t for t in results
-                    if (
-                        [s for s in t.splits if 'payee' in s and query in s['payee'].name.lower()] or
-                        (t.description and query in t.description.lower())
-                    )
-                ]
+        #callers get a copy, so changing it (eg. toggling a split's status) doesn't change the cached txn unless it's saved
+        txn = self._txn_cache.get(id_)
+        if not txn:
+            txn = self._txn_cache.add(self._storage.get_txn(id_))
+        return txn.copy()
+
+    def get_transactions(self, account, filter_account=None, query=None, status=None, start_date=None, end_date=None, sort='date'):
+        filter_account_id = filter_account.id if filter_account else None
+        results = self._storage.get_transactions(account_id=account.id, filter_account_id=filter_account_id, status=status,
+                query=query, start_date=start_date, end_date=end_date)
         sorted_results = Engine.sort_txns(results, key='date')
         #add balance if we have all the txns for a specific account, without limiting by another account, or a query, or a status, ...
-        if not any([filter_account, query, status]):
+        if not any([filter_account, query, status, start_date, end_date]):
             balance_field = 'amount'
             if account.type == AccountType.SECURITY:
                 balance_field = 'quantity'
-            sorted_results = Engine.add_balance_to_txns(sorted_results, account=account, balance_field=balance_field)
+            balances = self._storage.get_running_balances(account.id, balance_field=balance_field)
+            for t in sorted_results:
+                t.balance = balances[t.id][0]
         return sorted_results
 
+    def get_transactions_page(self, account, limit, before=None):
+        '''
+        Get one page of an account's transactions, newest first, with the running balance for each one.
+        Pass before=(date, id) of the last (oldest) transaction on a page to get the next page of older transactions.
+        Returns (txns, more_txns).
+        '''
+        txns, more_txns = self._storage.get_transactions_page(account.id, limit=limit, before=before)
+        if txns:
+            balance_field = 'amount'
+            if account.type == AccountType.SECURITY:
+                balance_field = 'quantity'
+            starting_balance = self._storage.get_balance(account.id, balance_field=balance_field, before=(txns[0].txn_date, txns[0].id))
+            txns = Engine.add_balance_to_txns(txns, account=account, balance_field=balance_field, starting_balance=starting_balance)
+        return list(reversed(txns)), more_txns
+
+    def get_balance(self, account, before=None):
+        '''The account's balance (total quantity, for a security), from the txns that come before before=(date, id) if it's passed.'''
+        balance_field = 'amount'
+        if account.type == AccountType.SECURITY:
+            balance_field = 'quantity'
+        return self._storage.get_balance(account.id, balance_field=balance_field, before=before)
+
+    def get_ledger(self, account, status=None, filter_account=None, query=None, start_date=None, end_date=None, limit=None):
+        '''
+        Get everything a ledger display shows for an account, in one call (so it can be loaded in the background):
+        the txns, newest first (only the newest limit txns, if limit is passed and there are no filters), and
+        the scheduled txns that are due & the current balances (None for filtered txns).
+        '''
+        if any([status, filter_account, query, start_date, end_date]):
+            txns = self.get_transactions(account=account, status=status, filter_account=filter_account, query=query,
+                    start_date=start_date, end_date=end_date)
+            return Ledger(txns=list(reversed(txns)), scheduled_txns=[], balances=None)
+        if limit:
+            txns, _ = self.get_transactions_page(account, limit=limit)
+        else:
+            txns = list(reversed(self.get_transactions(account=account)))
+        return Ledger(
+                txns=txns,
+                scheduled_txns=self.get_scheduled_transactions_due(accounts=[account]),
+                balances=self.get_current_balances_for_display(account=account),
+            )
+
     def get_current_balances_for_display(self, account, sorted_txns=None):
-        if not sorted_txns:
-            sorted_txns = self.get_transactions(account=account)
         balance_field = 'amount'
         if account.type == AccountType.SECURITY:
             balance_field = 'quantity'
+        if not sorted_txns:
+            today = date.today()
+            balances = self._storage.get_account_balances([account.id]).get(account.id)
+            if not balances:
+                return LedgerBalances(current=amount_display(Fraction(0)), current_cleared=amount_display(Fraction(0)))
+            if not balances.last_txn_date or balances.last_txn_date <= today:
+                #no future txns, so the stored totals are the current balances
+                return LedgerBalances(
+                        current=amount_display(balances.total),
+                        current_cleared=amount_display(balances.cleared),
+                    )
+            current = self._storage.get_balance(account.id, balance_field=balance_field, end_date=today)
+            current_cleared = self._storage.get_balance(account.id, balance_field=balance_field, end_date=today,
+                    statuses=[Transaction.CLEARED, Transaction.RECONCILED])
+            return LedgerBalances(
+                    current=amount_display(current),
+                    current_cleared=amount_display(current_cleared),
+                )
         current = Fraction(0)
         current_cleared = Fraction(0)
         today = date.today()
         for t in sorted_txns:
             if t.txn_date <= today:
                 current = t.balance
-                split = [s for s in t.splits if s['account'] == account][0]
+                split = t.get_split(account)
                 if split.get('status') in [Transaction.CLEARED, Transaction.RECONCILED]:
                     current_cleared = current_cleared + split[balance_field]
         return LedgerBalances(
@@ -1853,10 +2784,41 @@ class Engine:
             )
 
     def save_transaction(self, transaction):
+        self._txn_cache.remove(transaction.id)
         self._storage.save_txn(transaction)
 
+    def save_transactions(self, transactions):
+        transactions = list(transactions)
+        for t in transactions:
+            self._txn_cache.remove(t.id)
+        return self._storage.save_txns(transactions)
+
     def delete_transaction(self, transaction_id):
         self._storage.delete_txn(transaction_id)
+        self._txn_cache.remove(transaction_id)
+
+    def get_account_balances(self):
+        return self._storage.get_account_balances()
+
+    def get_current_account_balances(self):
+        '''
+        {account_id: balance} as of today (leaving out future txns, like get_current_balances_for_display), for the
+        accounts that have txns - a security account's balance is its total quantity
+        '''
+        today = date.today()
+        balances = {}
+        for account_id, account_balances in self._storage.get_account_balances().items():
+            if account_balances.last_txn_date and account_balances.last_txn_date > today:
+                balance_field = 'amount'
+                if self.get_account(id_=account_id).type == AccountType.SECURITY:
+                    balance_field = 'quantity'
+                balances[account_id] = self._storage.get_balance(account_id, balance_field=balance_field, end_date=today)
+            else:
+                balances[account_id] = account_balances.total
+        return balances
+
+    def rebuild_balances(self):
+        self._storage.rebuild_balances()
 
     def get_payee(self, id_=None, name=None):
         return self._storage.get_payee(id_=id_, name=name)
@@ -1865,6 +2827,7 @@ class Engine:
         return sorted(self._storage.get_payees(), key=lambda p: p.name)
 
     def save_payee(self, payee):
+        self._txn_cache.clear()
         return self._storage.save_payee(payee)
 
     def get_scheduled_transaction(self, id_):
@@ -1902,6 +2865,52 @@ class Engine:
     def get_budgets(self):
         return self._storage.get_budgets()
 
+    def get_budget_summaries(self):
+        return self._storage.get_budget_summaries()
+
+    def get_budget_monthly_matrix(self, budget):
+        '''
+        Returns the budget & actual amounts for each account, for each month of the budget period:
+        { 'months': ['2018-01', '2018-02', ...],
+          'income': [
+                {'account': ..., 'budget': {'2018-01': xxx, ...}, 'actual': {'2018-01': xxx, ...}},
+            ],
+          'expense': [...] }
+        The budgeted amount is pro-rated by the number of days of each month in the budget period.
+        Actual is spent minus income for expense accounts, and income minus spent for income accounts.
+        '''
+        months = []
+        month_days = {}
+        month_start = date(budget.start_date.year, budget.start_date.month, 1)
+        while month_start <= budget.end_date:
+            if month_start.month == 12:
+                next_month_start = date(month_start.year + 1, 1, 1)
+            else:
+                next_month_start = date(month_start.year, month_start.month + 1, 1)
+            month = month_start.strftime('%Y-%m')
+            months.append(month)
+            month_days[month] = (min(next_month_start, budget.end_date + timedelta(days=1)) - max(month_start, budget.start_date)).days
+            month_start = next_month_start
+        total_days = (budget.end_date - budget.start_date).days + 1
+        income_spending = self._get_report_storage().get_monthly_income_spending(budget.start_date, budget.end_date)
+        matrix = {'months': months, 'income': [], 'expense': []}
+        for account, info in budget.get_budget_data().items():
+            amount = info.get('amount', Fraction(0))
+            account_income_spending = income_spending.get(account.id, {})
+            row = {'account': account, 'budget': {}, 'actual': {}}
+            for month in months:
+                row['budget'][month] = amount * month_days[month] / total_days
+                month_info = account_income_spending.get(month, {'spent': Fraction(0), 'income': Fraction(0)})
+                if account.type == AccountType.EXPENSE:
+                    row['actual'][month] = month_info['spent'] - month_info['income']
+                else:
+                    row['actual'][month] = month_info['income'] - month_info['spent']
+            if account.type == AccountType.EXPENSE:
+                matrix['expense'].append(row)
+            else:
+                matrix['income'].append(row)
+        return matrix
+
     def save_budget(self, budget):
         return self._storage.save_budget(budget)
 
@@ -1919,7 +2928,8 @@ class Engine:
             os.mkdir(directory)
         export_dir = os.path.join(directory, export_dir)
         os.mkdir(export_dir)
-        accounts = self.get_accounts()
+        storage = self._get_report_storage()
+        accounts = storage.get_accounts()
         accounts_file = os.path.join(export_dir, 'accounts.tsv')
         with open(accounts_file, 'wb') as f:
             f.write('type\tnumber\tname\n'.encode('utf8'))
@@ -1930,7 +2940,7 @@ class Engine:
         for acc in accounts:
             if acc.type != AccountType.ASSET:
                 continue
-            txns = self.get_transactions(account=acc)
+            txns = Engine.sort_txns(storage.get_transactions(account_id=acc.id), key='date')
             acc_file = os.path.join(export_dir, f'acc_{to_ascii(acc.name.lower())}.tsv')
             with open(acc_file, 'wb') as f:
                 f.write('date\ttype\tdescription\tamount\ttransfer_account\n'.encode('utf8'))
@@ -1939,13 +2949,13 @@ class Engine:
                         transfer_account = [str(s['account']) for s in txn.splits if s['account'] != acc][0]
                     else:
                         transfer_account = 'multiple'
-                    split = [s for s in txn.splits if s['account'] == acc][0]
+                    split = txn.get_split(acc)
                     data = [str(txn.txn_date), txn.description or '',
                             amount_display(split['amount']), transfer_account]
                     line = self._create_export_line(data)
                     f.write(f'{line}\n'.encode('utf8'))
 
-        for budget in self.get_budgets():
+        for budget in storage.get_budget_summaries():
             file_name = os.path.join(export_dir, f'budget_{budget.start_date}_{budget.end_date}.tsv')
             with open(file_name, 'wb') as f:
                 f.write('account\n'.encode('utf8'))
@@ -1953,47 +2963,147 @@ class Engine:
     def get_income_expense_report(self):
         report = {'heading': 'Income/Expense Report'}
         year_totals = {}
-        income_accounts = self.get_accounts(types=[AccountType.INCOME])
-        expense_accounts = self.get_accounts(types=[AccountType.EXPENSE])
-        income = {'total': Fraction(0), 'accounts': {}}
-        expense = {'total': Fraction(0), 'accounts': {}}
+        storage = self._get_report_storage()
+        income_accounts = storage.get_accounts(types=[AccountType.INCOME])
+        expense_accounts = storage.get_accounts(types=[AccountType.EXPENSE])
+        #totals are added up in cents, and converted to Fractions at the end
+        income = {'total': 0, 'accounts': {}}
+        expense = {'total': 0, 'accounts': {}}
         for a in income_accounts:
-            txns = self.get_transactions(account=a)
+            txns = storage.get_transactions(account_id=a.id)
             if txns:
-                income['accounts'][a] = {'total': Fraction(0)}
+                income['accounts'][a] = {'total': 0}
                 for t in txns:
                     year = t.txn_date.year
                     if year not in year_totals:
                         year_totals[year] = {'income': 0, 'expense': 0}
                     if year not in income['accounts'][a]:
-                        income['accounts'][a][year] = Fraction(0)
-                    split = [s for s in t.splits if s['account'] == a][0]
-                    amount = split['amount'] * -1 # incomes are listed as negative amounts
+                        income['accounts'][a][year] = 0
+                    amount = amount_to_cents(t.get_split(a).amount) * -1 # incomes are listed as negative amounts
                     year_totals[year]['income'] += amount
                     income['total'] += amount
                     income['accounts'][a]['total'] += amount
                     income['accounts'][a][year] += amount
         for a in expense_accounts:
-            txns = self.get_transactions(account=a)
+            txns = storage.get_transactions(account_id=a.id)
             if txns:
-                expense['accounts'][a] = {'total': Fraction(0)}
+                expense['accounts'][a] = {'total': 0}
                 for t in txns:
                     year = t.txn_date.year
                     if year not in year_totals:
                         year_totals[year] = {'income': 0, 'expense': 0}
                     if year not in expense['accounts'][a]:
-                        expense['accounts'][a][year] = Fraction(0)
-                    split = [s for s in t.splits if s['account'] == a][0]
-                    year_totals[year]['expense'] += split['amount']
-                    expense['total'] += split['amount']
-                    expense['accounts'][a]['total'] += split['amount']
-                    expense['accounts'][a][year] += split['amount']
+                        expense['accounts'][a][year] = 0
+                    amount = amount_to_cents(t.get_split(a).amount)
+                    year_totals[year]['expense'] += amount
+                    expense['total'] += amount
+                    expense['accounts'][a]['total'] += amount
+                    expense['accounts'][a][year] += amount
+        for totals in [income, expense]:
+            totals['total'] = cents_to_amount(totals['total'])
+            for account_totals in totals['accounts'].values():
+                for key, cents in account_totals.items():
+                    account_totals[key] = cents_to_amount(cents)
+        for totals in year_totals.values():
+            for key, cents in totals.items():
+                totals[key] = cents_to_amount(cents)
         report['income'] = income
         report['expense'] = expense
         report['year_totals'] = year_totals
         return report
 
 
+class EngineExecutor:
+    '''
+    Runs Engine methods on worker threads, so slow loads don't block a GUI. sqlite connections can't be
+    shared between threads, so each worker has its own Engine: one writer thread runs the calls that change
+    data, in the order they were submitted, and a small pool of read-only threads runs the get_* calls.
+    Each call returns a concurrent.futures.Future.
+    With writer=False there's no writer thread (eg. when the caller does its own writes on another
+    connection), and only get_* calls can be submitted.
+    '''
+
+    DEFAULT_NUM_READERS = 2
+
+    def __init__(self, file_name, num_readers=DEFAULT_NUM_READERS, writer=True):
+        if file_name == ':memory:':
+            raise SQLiteStorageError("can't share :memory: between threads")
+        self._write_queue = queue.Queue() if writer else None
+        self._read_queue = queue.Queue()
+        self._threads = []
+        self._shut_down = False
+        #start the writer first, so the DB is set up before the readers open it
+        try:
+            if writer:
+                self._start_worker(self._write_queue, file_name, read_only=False)
+            for _ in range(num_readers):
+                self._start_worker(self._read_queue, file_name, read_only=True)
+        except Exception:
+            self.shutdown()
+            raise
+
+    def _start_worker(self, tasks, file_name, read_only):
+        started = Future()
+        thread = threading.Thread(target=self._run_worker, args=(tasks, file_name, read_only, started), daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        started.result() #raises any error opening the file
+
+    def _run_worker(self, tasks, file_name, read_only, started):
+        try:
+            engine = Engine(file_name, read_only=read_only)
+        except Exception as e:
+            started.set_exception(e)
+            return
+        started.set_result(None)
+        try:
+            while True:
+                task = tasks.get()
+                if task is None:
+                    return
+                future, method, args, kwargs = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    #another worker (or process) may have written since this engine's last call
+                    engine.has_external_changes()
+                    result = getattr(engine, method)(*args, **kwargs)
+                except Exception as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            engine.close()
+
+    def submit(self, method, *args, **kwargs):
+        '''
+        Call the Engine method with the given name on a worker thread, eg.
+            executor.submit('get_transactions', account=account).result()
+        '''
+        if self._shut_down:
+            raise RuntimeError('EngineExecutor has been shut down')
+        future = Future()
+        if method.startswith('get_'):
+            self._read_queue.put((future, method, args, kwargs))
+        elif self._write_queue:
+            self._write_queue.put((future, method, args, kwargs))
+        else:
+            raise RuntimeError(f'EngineExecutor has no writer to run {method}')
+        return future
+
+    def shutdown(self):
+        '''Finish the calls that have been submitted, and close the worker threads' connections.'''
+        self._shut_down = True
+        num_readers = len(self._threads)
+        if self._write_queue:
+            self._write_queue.put(None)
+            num_readers -= 1
+        for _ in range(num_readers):
+            self._read_queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+
 ### IMPORT ###
 kmymoney_action_mapping = {
     'Buy': 'share-buy',
@@ -2006,262 +3116,315 @@ kmymoney_action_mapping = {
     'Interest': '',
 }
 
-def import_kmymoney(kmy_file, engine):
+def _iter_kmymoney_file(kmy_file, tags, sections=None):
+    '''
+    Stream the gzipped kmymoney XML file, yielding each element in one of the top-level sections
+    (eg. the TRANSACTION elements in TRANSACTIONS) whose tag is in tags, once it's fully parsed. Every
+    element in a section is cleared and removed from the tree after it's been handled, so memory use
+    stays bounded no matter how big the file is. The tags of the top-level sections are added to sections.
+    '''
     import gzip
     from xml.etree import ElementTree as ET
-    print(f'{datetime.now()} uncompressing & parsing file...')
+    kmy_file.seek(0)
     uncompressed_file = gzip.GzipFile(fileobj=kmy_file)
-    root = ET.parse(uncompressed_file).getroot()
-    #migrate currencies
-    #need to keep track of kmymoney currency id mapping to our commodity id
-    print(f'{datetime.now()} migrating commodities (currencies & securities)...')
-    commodity_mapping_info = {}
-    currencies = root.find('CURRENCIES')
-    for currency in currencies.iter('CURRENCY'):
-        currency_id = currency.attrib['id']
-        if currency_id == 'USD': #USD is added automatically when storage is initialized
-            commodity_mapping_info['USD'] = engine.get_commodity(code='USD').id
+    parents = []
+    for event, el in ET.iterparse(uncompressed_file, events=('start', 'end')):
+        if event == 'start':
+            parents.append(el)
+            if len(parents) == 2 and sections is not None:
+                sections.append(el.tag)
             continue
-        commodity = Commodity(type_=CommodityType.CURRENCY, code=currency_id, name=currency.attrib['name'])
-        try:
-            engine.save_commodity(commodity)
-            commodity_mapping_info[currency_id] = commodity.id
-        except Exception as e:
-            print(f'{datetime.now()} error migrating currency: {e}\n  {currency.attrib}')
-    securities = root.find('SECURITIES')
-    for security in securities.iter('SECURITY'):
-        security_id = security.attrib['id']
-        commodity = Commodity(type_=CommodityType.SECURITY, code=security_id, name=currency.attrib['name'])
-        try:
-            engine.save_commodity(commodity)
-            commodity_mapping_info[security_id] = commodity.id
-        except Exception as e:
-            print(f'{datetime.now()} error migrating security: {e}\n  {security.attrib}')
-    #migrate accounts
-    #need to keep track of kmymoney account id mapping to our account id
-    print(f'{datetime.now()} migrating accounts...')
-    account_mapping_info = {}
-    accounts = root.find('ACCOUNTS')
-    for account in accounts.iter('ACCOUNT'):
-        type_ = AccountType.ASSET # default
-        kmy_type = None
-        commodity = None
-        parent_account = None
-        name = None
-        alternate_id = None
-        description = None
-        for key, value in account.attrib.items():
-            if key == 'id':
-                alternate_id = value
-            elif key == 'type':
-                kmy_type = value
-                if value in ['4', '5', '10']:
-                    type_ = AccountType.LIABILITY
-                elif value in ['13']:
-                    type_ = AccountType.EXPENSE
-                elif value in ['12']:
-                    type_ = AccountType.INCOME
-                elif value in ['16']:
-                    type_ = AccountType.EQUITY
-                elif value in ['15']:
-                    type_ = AccountType.SECURITY
-            elif key == 'currency':
-                currency_id = commodity_mapping_info[value]
-                commodity = engine.get_commodity(id_=currency_id)
-            elif key == 'parentaccount':
-                if value:
-                    parent_account = engine.get_account(account_mapping_info[value])
-            elif key == 'name':
-                name = value
-            elif key == 'description':
-                description = value
-            elif key in ['opened', 'lastmodified', 'institution', 'number']: # ignore these attributes
+        parents.pop()
+        if len(parents) == 2: #an element inside a section
+            if el.tag in tags:
+                yield el
+            el.clear()
+            parents[-1].remove(el)
+
+
+def _import_kmymoney_account(account, engine, commodity_mapping_info, account_mapping_info):
+    type_ = AccountType.ASSET # default
+    kmy_type = None
+    commodity = None
+    parent_account = None
+    name = None
+    alternate_id = None
+    description = None
+    for key, value in account.attrib.items():
+        if key == 'id':
+            alternate_id = value
+        elif key == 'type':
+            kmy_type = value
+            if value in ['4', '5', '10']:
+                type_ = AccountType.LIABILITY
+            elif value in ['13']:
+                type_ = AccountType.EXPENSE
+            elif value in ['12']:
+                type_ = AccountType.INCOME
+            elif value in ['16']:
+                type_ = AccountType.EQUITY
+            elif value in ['15']:
+                type_ = AccountType.SECURITY
+        elif key == 'currency':
+            commodity = commodity_mapping_info[value]
+        elif key == 'parentaccount':
+            if value:
+                parent_account = account_mapping_info[value]
+        elif key == 'name':
+            name = value
+        elif key == 'description':
+            description = value
+        elif key in ['opened', 'lastmodified', 'institution', 'number']: # ignore these attributes
+            pass
+        else:
+            if value:
+                raise DataImportError(f'unhandled account attribute: {key} => {value}')
+    closed = False
+    other_data = {}
+    key_value_pairs = account.find('KEYVALUEPAIRS')
+    if key_value_pairs is not None:
+        for pair in key_value_pairs.iter('PAIR'):
+            key = pair.attrib.get('key', '')
+            value = pair.attrib.get('value')
+            if key.startswith('ir-'):
+                other_data['interest-rate-percent'] = Fraction(value)
+            elif key == 'fixed-interest' and value == 'yes':
+                other_data['fixed-interest'] = True
+            elif key == 'term':
+                other_data['term'] = f'{value}m'
+            elif key == 'mm-closed':
+                if value == 'yes':
+                    closed = True
+            elif key in ['OpeningBalanceAccount', 'lastNumberUsed', 'compoundingFrequency', 'final-payment', 'priceMode',
+                         'interest-calculation', 'loan-amount', 'periodic-payment', 'schedule', 'IBAN']: # ignore these
                 pass
             else:
                 if value:
-                    raise DataImportError(f'unhandled account attribute: {key} => {value}')
-        closed = False
-        other_data = {}
-        key_value_pairs = account.find('KEYVALUEPAIRS')
-        if key_value_pairs is not None:
-            for pair in key_value_pairs.iter('PAIR'):
-                key = pair.attrib.get('key', '')
-                value = pair.attrib.get('value')
-                if key.startswith('ir-'):
-                    other_data['interest-rate-percent'] = Fraction(value)
-                elif key == 'fixed-interest' and value == 'yes':
-                    other_data['fixed-interest'] = True
-                elif key == 'term':
-                    other_data['term'] = f'{value}m'
-                elif key == 'mm-closed':
-                    if value == 'yes':
-                        closed = True
-                elif key in ['OpeningBalanceAccount', 'lastNumberUsed', 'compoundingFrequency', 'final-payment', 'priceMode',
-                             'interest-calculation', 'loan-amount', 'periodic-payment', 'schedule', 'IBAN']: # ignore these
-                    pass
-                else:
-                    if value:
-                        raise DataImportError(f'unhandled account key/value: {key} => {value}')
-        acc_obj = Account(
-                    type_=type_,
-                    commodity=commodity,
-                    name=account.attrib['name'],
-                    parent=parent_account,
-                    alternate_id=alternate_id,
-                    description=description,
-                    closed=closed,
-                    other_data=other_data,
-                )
-        engine.save_account(acc_obj)
-        account_mapping_info[account.attrib['id']] = acc_obj.id
-    #migrate payees
-    print(f'{datetime.now()} migrating payees...')
-    payee_mapping_info = {}
-    payees = root.find('PAYEES')
-    for payee in payees.iter('PAYEE'):
-        payee_obj = Payee(name=payee.attrib['name'])
-        engine.save_payee(payee_obj)
-        payee_mapping_info[payee.attrib['id']] = payee_obj.id
-    #migrate transactions
-    #   Dates: kmymoney uses the "postdate" attribute for the main txn date - there's no separate date
-    #       for when when the split clears the account.
-    print(f'{datetime.now()} migrating transactions...')
-    transactions = root.find('TRANSACTIONS')
-    for transaction in transactions.iter('TRANSACTION'):
-        has_income_or_expense = False
-        payee_ids = []
-        descriptions = []
-        splits = []
-        txn_id = transaction.attrib['id']
-        entry_date = transaction.attrib['entrydate']
-        try:
-            splits_el = transaction.find('SPLITS')
-            for split_el in splits_el.iter('SPLIT'):
-                split = {}
-                account_orig_id = split_el.attrib['account']
-                account = engine.get_account(account_mapping_info[account_orig_id])
-                split['account'] = account
-                if account.type in [AccountType.INCOME, AccountType.EXPENSE]:
-                    has_income_or_expense = True
-                amount = split_el.attrib['value']
-                quantity = split_el.attrib['shares']
-                for key, value in split_el.attrib.items():
-                    if key == 'account':
-                        pass # already handled
-                    elif key == 'value':
-                        split['amount'] = value
-                    elif key == 'shares':
-                        split['quantity'] = value
-                    elif key == 'reconcileflag':
-                        #reconcileflag: '2'=Reconciled, '1'=Cleared, '0'=nothing
-                        if value == '2':
-                            split['status'] = Transaction.RECONCILED
-                        elif value == '1':
-                            split['status'] = Transaction.CLEARED
-                        elif value == '0':
-                            pass
-                        else:
-                            raise DataImportError(f'unhandled reconcileflag value: {value}')
-                    elif key == 'reconciledate':
-                        if value:
-                            split['reconcile_date'] = get_date(value)
-                    elif key == 'payee':
-                        if value:
-                            payee_ids.append(value)
-                            split['payee'] = engine.get_payee(id_=payee_mapping_info[value])
-                    elif key == 'number':
-                        split['type'] = value
-                    elif key == 'memo':
-                        descriptions.append(value)
-                        split['description'] = value
-                    elif key == 'action':
-                        if not value:
-                            pass
-                        elif value in kmymoney_action_mapping:
-                            split['action'] = kmymoney_action_mapping[value]
-                        else:
-                            raise DataImportError(f'unhandled action "{value}"')
-                    elif key == 'price':
-                        # we probably don't care about the price
-                        if value != '1/1':
-                            price = Fraction(value)
-                            diff = price - Fraction(amount)/Fraction(quantity)
-                            # if the price is similar to amount/quantity, we'll ignore it
-                            if abs(diff) > Fraction(1/10):
-                                raise DataImportError(f'unhandled price {price} for txn {txn_id}; amount {amount}; quantity {quantity} (diff {diff})')
-                    else:
-                        if key == 'id':
-                            pass
-                        else:
-                            if value:
-                                raise DataImportError(f'unhandled txn attribute: {key} = {value}')
-                splits.append(split)
-            if has_income_or_expense and len(payee_ids) > 1 and len(set(payee_ids)) == 1:
-                for s in splits:
-                    if s['account'].type not in [AccountType.INCOME, AccountType.EXPENSE]:
-                        s.pop('payee', None)
-            if transaction.attrib.get('memo'):
-                description = transaction.attrib['memo']
-            elif len(descriptions) > 1 and len(set(descriptions)) == 1:
-                description = descriptions[0]
-                for s in splits:
-                    s.pop('description', None)
-            else:
-                description = None
-            engine.save_transaction(
-                    Transaction(
-                        splits=splits,
-                        txn_date=transaction.attrib['postdate'],
-                        description=description,
-                        alternate_id=txn_id,
-                        entry_date=entry_date or None,
-                    )
-                )
-        except RuntimeError as e:
-            print(f'{datetime.now()} error migrating transaction: {e}\n  account: {account}\n  {transaction.attrib}')
-    scheduled = root.find('SCHEDULES')
-    for scheduled_txn in scheduled.iter('SCHEDULED_TX'):
-        name = scheduled_txn.attrib.get('name')
-        frequency = scheduled_txn.attrib.get('occurence')
-        if frequency == '4':
-            frequency = ScheduledTransactionFrequency.WEEKLY
-        elif frequency == '32':
-            frequency = ScheduledTransactionFrequency.MONTHLY
-        elif frequency == '18':
-            frequency = ScheduledTransactionFrequency.SEMI_MONTHLY
-        elif frequency == '4096':
-            frequency = ScheduledTransactionFrequency.QUARTERLY
-        elif frequency == '16384':
-            frequency = ScheduledTransactionFrequency.YEARLY
-        else:
-            print(f'unhandled scheduled txn frequency value: {value}')
-            continue
-        occurence_multiplier = scheduled_txn.attrib.get('occurenceMultiplier')
-        if occurence_multiplier != '1':
-            print(f'unhandled scheduled txn occurenceMultiplier: {value}')
-            continue
-        splits = []
-        splits_el = scheduled_txn.find('TRANSACTION').find('SPLITS')
+                    raise DataImportError(f'unhandled account key/value: {key} => {value}')
+    acc_obj = Account(
+                type_=type_,
+                commodity=commodity,
+                name=account.attrib['name'],
+                parent=parent_account,
+                alternate_id=alternate_id,
+                description=description,
+                closed=closed,
+                other_data=other_data,
+            )
+    engine.save_account(acc_obj)
+    account_mapping_info[account.attrib['id']] = acc_obj
+
+
+def _import_kmymoney_transaction(transaction, account_mapping_info, payee_mapping_info):
+    '''returns the validated Transaction, or None if it can't be migrated'''
+    has_income_or_expense = False
+    payee_ids = []
+    descriptions = []
+    splits = []
+    txn_id = transaction.attrib['id']
+    entry_date = transaction.attrib['entrydate']
+    account = None
+    try:
+        splits_el = transaction.find('SPLITS')
         for split_el in splits_el.iter('SPLIT'):
             split = {}
+            account_orig_id = split_el.attrib['account']
+            account = account_mapping_info[account_orig_id]
+            split['account'] = account
+            if account.type in [AccountType.INCOME, AccountType.EXPENSE]:
+                has_income_or_expense = True
+            amount = split_el.attrib['value']
+            quantity = split_el.attrib['shares']
             for key, value in split_el.attrib.items():
                 if key == 'account':
-                    account_orig_id = split_el.attrib['account']
-                    account = engine.get_account(account_mapping_info[account_orig_id])
-                    split['account'] = account
-                split['amount'] = 0
-            if split:
-                splits.append(split)
-        engine.save_scheduled_transaction(
-                ScheduledTransaction(
-                    name=name,
-                    frequency=frequency,
-                    splits=splits,
-                )
+                    pass # already handled
+                elif key == 'value':
+                    split['amount'] = value
+                elif key == 'shares':
+                    split['quantity'] = value
+                elif key == 'reconcileflag':
+                    #reconcileflag: '2'=Reconciled, '1'=Cleared, '0'=nothing
+                    if value == '2':
+                        split['status'] = Transaction.RECONCILED
+                    elif value == '1':
+                        split['status'] = Transaction.CLEARED
+                    elif value == '0':
+                        pass
+                    else:
+                        raise DataImportError(f'unhandled reconcileflag value: {value}')
+                elif key == 'reconciledate':
+                    if value:
+                        split['reconcile_date'] = get_date(value)
+                elif key == 'payee':
+                    if value:
+                        payee_ids.append(value)
+                        split['payee'] = payee_mapping_info[value]
+                elif key == 'number':
+                    split['type'] = value
+                elif key == 'memo':
+                    descriptions.append(value)
+                    split['description'] = value
+                elif key == 'action':
+                    if not value:
+                        pass
+                    elif value in kmymoney_action_mapping:
+                        split['action'] = kmymoney_action_mapping[value]
+                    else:
+                        raise DataImportError(f'unhandled action "{value}"')
+                elif key == 'price':
+                    # we probably don't care about the price
+                    if value != '1/1':
+                        price = Fraction(value)
+                        diff = price - Fraction(amount)/Fraction(quantity)
+                        # if the price is similar to amount/quantity, we'll ignore it
+                        if abs(diff) > Fraction(1/10):
+                            raise DataImportError(f'unhandled price {price} for txn {txn_id}; amount {amount}; quantity {quantity} (diff {diff})')
+                else:
+                    if key == 'id':
+                        pass
+                    else:
+                        if value:
+                            raise DataImportError(f'unhandled txn attribute: {key} = {value}')
+            splits.append(split)
+        if has_income_or_expense and len(payee_ids) > 1 and len(set(payee_ids)) == 1:
+            for s in splits:
+                if s['account'].type not in [AccountType.INCOME, AccountType.EXPENSE]:
+                    s.pop('payee', None)
+        if transaction.attrib.get('memo'):
+            description = transaction.attrib['memo']
+        elif len(descriptions) > 1 and len(set(descriptions)) == 1:
+            description = descriptions[0]
+            for s in splits:
+                s.pop('description', None)
+        else:
+            description = None
+        txn = Transaction(
+                splits=splits,
+                txn_date=transaction.attrib['postdate'],
+                description=description,
+                alternate_id=txn_id,
+                entry_date=entry_date or None,
+            )
+        check_txn_splits(txn.splits)
+        return txn
+    except RuntimeError as e:
+        print(f'{datetime.now()} error migrating transaction: {e}\n  account: {account}\n  {transaction.attrib}')
+
+
+def _save_kmymoney_transactions(engine, txns):
+    try:
+        engine.save_transactions(txns)
+    except SQLiteStorageError:
+        #nothing in the batch was saved - save the txns one at a time, so only the bad ones are lost
+        for txn in txns:
+            try:
+                engine.save_transaction(txn)
+            except RuntimeError as e:
+                print(f'{datetime.now()} error migrating transaction: {e}\n  {txn.alternate_id}')
+
+
+def _import_kmymoney_scheduled_txn(scheduled_txn, engine, account_mapping_info):
+    name = scheduled_txn.attrib.get('name')
+    frequency = scheduled_txn.attrib.get('occurence')
+    if frequency == '4':
+        frequency = ScheduledTransactionFrequency.WEEKLY
+    elif frequency == '32':
+        frequency = ScheduledTransactionFrequency.MONTHLY
+    elif frequency == '18':
+        frequency = ScheduledTransactionFrequency.SEMI_MONTHLY
+    elif frequency == '4096':
+        frequency = ScheduledTransactionFrequency.QUARTERLY
+    elif frequency == '16384':
+        frequency = ScheduledTransactionFrequency.YEARLY
+    else:
+        print(f'unhandled scheduled txn frequency value: {frequency}')
+        return
+    occurence_multiplier = scheduled_txn.attrib.get('occurenceMultiplier')
+    if occurence_multiplier != '1':
+        print(f'unhandled scheduled txn occurenceMultiplier: {occurence_multiplier}')
+        return
+    splits = []
+    splits_el = scheduled_txn.find('TRANSACTION').find('SPLITS')
+    for split_el in splits_el.iter('SPLIT'):
+        split = {}
+        for key, value in split_el.attrib.items():
+            if key == 'account':
+                account_orig_id = split_el.attrib['account']
+                split['account'] = account_mapping_info[account_orig_id]
+            split['amount'] = 0
+        if split:
+            splits.append(split)
+    engine.save_scheduled_transaction(
+            ScheduledTransaction(
+                name=name,
+                frequency=frequency,
+                splits=splits,
             )
-    for top_level_el in root:
-        if top_level_el.tag not in ['CURRENCIES', 'SECURITIES', 'ACCOUNTS', 'PAYEES', 'TRANSACTIONS', 'SCHEDULES']:
-            print(f"{datetime.now()} didn't migrate {top_level_el.tag} data")
+        )
+
+
+def import_kmymoney(kmy_file, engine, batch_size=5000):
+    #The file is streamed twice, so the whole XML tree is never in memory: commodities are at the
+    #   end of the file, but accounts (at the beginning) need them, so the first pass only
+    #   migrates the commodities, and the second pass migrates everything else.
+    #migrate currencies
+    #need to keep track of kmymoney currency id mapping to our commodity id
+    print(f'{datetime.now()} migrating commodities (currencies & securities)...')
+    commodity_mapping_info = {}
+    sections = []
+    for commodity_el in _iter_kmymoney_file(kmy_file, tags=['CURRENCY', 'SECURITY'], sections=sections):
+        commodity_id = commodity_el.attrib['id']
+        if commodity_el.tag == 'CURRENCY':
+            if commodity_id == 'USD': #USD is added automatically when storage is initialized
+                commodity_mapping_info['USD'] = engine.get_commodity(code='USD')
+                continue
+            type_ = CommodityType.CURRENCY
+        else:
+            type_ = CommodityType.SECURITY
+        commodity = Commodity(type_=type_, code=commodity_id, name=commodity_el.attrib['name'])
+        try:
+            engine.save_commodity(commodity)
+            commodity_mapping_info[commodity_id] = commodity
+        except Exception as e:
+            print(f'{datetime.now()} error migrating {type_.value}: {e}\n  {commodity_el.attrib}')
+    #migrate accounts, payees, transactions & scheduled transactions
+    #need to keep track of kmymoney account & payee id mappings to our (saved) objects
+    #   Dates: kmymoney uses the "postdate" attribute for the main txn date - there's no separate date
+    #       for when when the split clears the account.
+    #   Transactions are saved in batches of batch_size, each batch in one DB transaction.
+    print(f'{datetime.now()} migrating accounts, payees, transactions & scheduled transactions...')
+    account_mapping_info = {}
+    payee_mapping_info = {}
+    txns = []
+    num_txns = 0
+    start_time = time.perf_counter()
+    for el in _iter_kmymoney_file(kmy_file, tags=['ACCOUNT', 'PAYEE', 'TRANSACTION', 'SCHEDULED_TX']):
+        if el.tag == 'ACCOUNT':
+            _import_kmymoney_account(el, engine, commodity_mapping_info, account_mapping_info)
+        elif el.tag == 'PAYEE':
+            payee_obj = Payee(name=el.attrib['name'])
+            engine.save_payee(payee_obj)
+            payee_mapping_info[el.attrib['id']] = payee_obj
+        elif el.tag == 'TRANSACTION':
+            txn = _import_kmymoney_transaction(el, account_mapping_info, payee_mapping_info)
+            if txn:
+                txns.append(txn)
+            if len(txns) >= batch_size:
+                _save_kmymoney_transactions(engine, txns)
+                num_txns += len(txns)
+                txns = []
+                elapsed = time.perf_counter() - start_time
+                print(f'{datetime.now()} migrated {num_txns} transactions ({num_txns / elapsed:.0f} txns/sec)')
+        elif el.tag == 'SCHEDULED_TX':
+            _import_kmymoney_scheduled_txn(el, engine, account_mapping_info)
+    if txns:
+        _save_kmymoney_transactions(engine, txns)
+        num_txns += len(txns)
+    elapsed = time.perf_counter() - start_time
+    print(f'{datetime.now()} migrated {num_txns} transactions in {elapsed:.1f} seconds ({num_txns / elapsed:.0f} txns/sec)')
+    for section in sections:
+        if section not in ['CURRENCIES', 'SECURITIES', 'ACCOUNTS', 'PAYEES', 'TRANSACTIONS', 'SCHEDULES']:
+            print(f"{datetime.now()} didn't migrate {section} data")
 
 
 ### CLI/GUI ###
@@ -2287,8 +3450,8 @@ class CLI:
 
     NUM_TXNS_IN_PAGE = 50
 
-    def __init__(self, file_name, print_file=None):
-        self._engine = Engine(file_name)
+    def __init__(self, file_name, print_file=None, read_only=False):
+        self._engine = Engine(file_name, read_only=read_only, immutable=read_only)
         self.print = partial(print, file=print_file)
 
     def input(self, prompt='', prefill=None):
@@ -2302,6 +3465,10 @@ class CLI:
             if (prefill is not None) and readline:
                 readline.set_startup_hook()
 
+    def _rebuild_balances(self):
+        self._engine.rebuild_balances()
+        self.print('Rebuilt account balances')
+
     def _list_accounts(self):
         self.print(self.ACCOUNT_LIST_HEADER)
         for a in self._engine.get_accounts():
@@ -2351,6 +3518,8 @@ class CLI:
         account = self._engine.get_account(id_=int(user_input_parts[0]))
         status = None
         filter_account = None
+        start_date = None
+        end_date = None
         if len(user_input_parts) > 1:
             for clause in user_input_parts[1:]:
                 if clause.startswith('status:'):
@@ -2359,11 +3528,25 @@ class CLI:
                     if filter_account:
                         raise Exception('only search for one account at a time')
                     filter_account = self._engine.get_account(id_=int(clause.replace('acc:', '')))
+                elif clause.startswith('start:') or clause.startswith('end:'):
+                    name, value = clause.split(':', 1)
+                    try:
+                        filter_date = get_date(value)
+                    except ValueError:
+                        self.print(f'Invalid {name} date: "{value}"')
+                        return
+                    if name == 'start':
+                        start_date = filter_date
+                    else:
+                        end_date = filter_date
 
-        txns = self._engine.get_transactions(account=account, status=status, filter_account=filter_account)
-
-        if not (len(user_input_parts) > 1):
-            ledger_balances = self._engine.get_current_balances_for_display(account=account, sorted_txns=txns)
+        is_filtered = len(user_input_parts) > 1
+        if is_filtered:
+            txns = self._engine.get_transactions(account=account, status=status, filter_account=filter_account,
+                    start_date=start_date, end_date=end_date)
+            reversed_txns = list(reversed(txns))
+        else:
+            ledger_balances = self._engine.get_current_balances_for_display(account=account)
             summary_line = f'{account.name} (Current balance: {ledger_balances.current}; Cleared: {ledger_balances.current_cleared})'
             self.print(summary_line)
             scheduled_txns_due = self._engine.get_scheduled_transactions_due(accounts=[account])
@@ -2371,11 +3554,17 @@ class CLI:
                 self.print('Scheduled Transactions due:')
                 for st in scheduled_txns_due:
                     self.print(f'{st.id} {st.name} {st.next_due_date}')
-        reversed_txns = list(reversed(txns))
         self.print(self.TXN_LIST_HEADER)
         page_index = 1
+        #(date, id) of the last txn on the previous page, for getting each page of the unfiltered ledger
+        page_before_keys = {1: None}
         while True:
-            paged_txns, more_txns = pager(reversed_txns, num_txns_in_page=num_txns_in_page, page=page_index)
+            if is_filtered:
+                paged_txns, more_txns = pager(reversed_txns, num_txns_in_page=num_txns_in_page, page=page_index)
+            else:
+                paged_txns, more_txns = self._engine.get_transactions_page(account, limit=num_txns_in_page, before=page_before_keys[page_index])
+                if paged_txns:
+                    page_before_keys[page_index+1] = (paged_txns[-1].txn_date, paged_txns[-1].id)
             for t in paged_txns:
                 tds = get_display_strings_for_ledger(account, t, self._engine.get_date_display_format())
                 self.print(' {7:<4} | {0:<6} | {1:<30} | {2:<30} | {3:30} | {4:<10} | {5:<10} | {6:<10}'.format(
@@ -2564,7 +3753,7 @@ class CLI:
         self._get_and_save_scheduled_txn(scheduled_txn=scheduled_txn)
 
     def _list_budgets(self):
-        for b in self._engine.get_budgets():
+        for b in self._engine.get_budget_summaries():
             self.print(b)
 
     def _display_budget(self):
@@ -2594,6 +3783,12 @@ class CLI:
             self.print(info)
         for info in budget_report['expense']:
             self.print(info)
+        matrix = self._engine.get_budget_monthly_matrix(budget)
+        self.print('Monthly (actual / budget):')
+        self.print(' {0:<20} |'.format('account') + ''.join([' {0:>19} |'.format(month) for month in matrix['months']]))
+        for row in matrix['income'] + matrix['expense']:
+            cells = [f'{amount_display(row["actual"][month])} / {amount_display(row["budget"][month])}' for month in matrix['months']]
+            self.print(' {0:<20} |'.format(str(row['account'])[:20]) + ''.join([' {0:>19} |'.format(cell) for cell in cells]))
 
     def _create_budget(self):
         self.print('Create Budget:')
@@ -2715,6 +3910,7 @@ class CLI:
             'bc': {'description': 'create budget', 'function': self._create_budget},
             'be': {'description': 'edit budget', 'function': self._edit_budget},
             'r': {'description': 'reports', 'function': self._display_reports},
+            'rb': {'description': 'rebuild account balances', 'function': self._rebuild_balances},
         }
         self.print(f'*** {TITLE} ***')
         self._print_help(info)
@@ -2726,6 +3922,8 @@ class CLI:
             import traceback
             self.print(traceback.format_exc())
             sys.exit(1)
+        finally:
+            self._engine.close()
 
 
 class Combobox:
@@ -2837,6 +4035,128 @@ class Combobox:
         self._combo.event_generate(*args, **kwargs)
 
 
+class VirtualTreeview:
+    '''
+    A ttk.Treeview that only has items for the rows that are showing. get_row(index) returns (iid, values, tags)
+    for a row, and is only called for the rows scrolled into view - scrolling replaces the items, so the number
+    of Treeview items stays the same no matter how many rows there are. The arrow & page keys move the focused
+    row, scrolling when it would move out of view.
+    '''
+
+    DEFAULT_VISIBLE_ROWS = 30
+    WHEEL_SCROLL_ROWS = 3
+
+    def __init__(self, master, columns, get_row):
+        self.tree = ttk.Treeview(master=master, columns=columns, show='headings', height=self.DEFAULT_VISIBLE_ROWS)
+        self.scrollbar = ttk.Scrollbar(master, orient=tk.VERTICAL, command=self.yview)
+        self._get_row = get_row
+        self.num_rows = 0
+        self.offset = 0
+        self.visible_rows = self.DEFAULT_VISIBLE_ROWS
+        self.tree.bind('<MouseWheel>', self._mouse_wheel)
+        self.tree.bind('<Button-4>', self._scroll_up)
+        self.tree.bind('<Button-5>', self._scroll_down)
+        self.tree.bind('<Configure>', self._fit_rows)
+        self.tree.bind('<Up>', partial(self._move_focus, -1))
+        self.tree.bind('<Down>', partial(self._move_focus, 1))
+        self.tree.bind('<Prior>', self._page_up)
+        self.tree.bind('<Next>', self._page_down)
+
+    def set_num_rows(self, num_rows):
+        self.num_rows = num_rows
+        self.refresh()
+
+    def refresh(self):
+        '''Recreate the items for the rows that are showing (eg. after the data for the rows has changed).'''
+        self.offset = max(0, min(self.offset, self.num_rows - self.visible_rows))
+        #keep the selection & focus on the rows that are still showing
+        selection = self.tree.selection()
+        focus = self.tree.focus()
+        self.tree.delete(*self.tree.get_children())
+        end = min(self.offset + self.visible_rows, self.num_rows)
+        for index in range(self.offset, end):
+            iid, values, tags = self._get_row(index)
+            self.tree.insert('', tk.END, iid=iid, values=values, tags=tags)
+        selection = [iid for iid in selection if self.tree.exists(iid)]
+        if selection:
+            self.tree.selection_set(selection)
+        if focus and self.tree.exists(focus):
+            self.tree.focus(focus)
+        if self.num_rows:
+            self.scrollbar.set(self.offset / self.num_rows, end / self.num_rows)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, self.num_rows - self.visible_rows))
+        if offset != self.offset:
+            self.offset = offset
+            self.refresh()
+
+    def yview(self, *args):
+        #called by the scrollbar, with ('moveto', fraction) or ('scroll', number, 'units'/'pages')
+        if args[0] == tk.MOVETO:
+            self.scroll_to(round(float(args[1]) * self.num_rows))
+        elif args[0] == tk.SCROLL:
+            rows = int(args[1])
+            if args[2] == tk.PAGES:
+                rows *= self.visible_rows
+            self.scroll_to(self.offset + rows)
+
+    def _mouse_wheel(self, event):
+        #Windows & macOS - event.delta is positive for scrolling up
+        if event.delta > 0:
+            return self._scroll_up(event)
+        return self._scroll_down(event)
+
+    def _scroll_up(self, event):
+        self.scroll_to(self.offset - self.WHEEL_SCROLL_ROWS)
+        return 'break'
+
+    def _scroll_down(self, event):
+        self.scroll_to(self.offset + self.WHEEL_SCROLL_ROWS)
+        return 'break'
+
+    def _move_focus(self, rows, event=None):
+        #move the focus (& selection) rows rows from the focused row, scrolling it into view
+        children = self.tree.get_children()
+        if not children:
+            return 'break'
+        focus = self.tree.focus()
+        index = self.offset
+        if focus in children:
+            index += children.index(focus)
+        index = max(0, min(index + rows, self.num_rows - 1))
+        if index < self.offset:
+            self.scroll_to(index)
+        elif index >= self.offset + self.visible_rows:
+            self.scroll_to(index - self.visible_rows + 1)
+        iid = self.tree.get_children()[index - self.offset]
+        self.tree.focus(iid)
+        self.tree.selection_set(iid)
+        return 'break'
+
+    def _page_up(self, event):
+        return self._move_focus(-self.visible_rows)
+
+    def _page_down(self, event):
+        return self._move_focus(self.visible_rows)
+
+    def _fit_rows(self, event):
+        #show as many rows as fit in the space the Treeview has been given
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if not bbox:
+            return
+        _, heading_height, _, row_height = bbox
+        visible_rows = max(1, (event.height - heading_height) // row_height)
+        if visible_rows != self.visible_rows:
+            self.visible_rows = visible_rows
+            self.refresh()
+
+
 class ErrorForm:
 
     def __init__(self, msg):
@@ -2936,19 +4256,31 @@ class AccountsDisplay:
         if self.income_tree:
             self.income_tree.destroy()
 
-        columns = ('name')
+        columns = ('name', 'balance')
 
         self.assets_tree = ttk.Treeview(master=self.frame, columns=columns, show='headings')
         self.assets_tree.heading('name', text='Assets/Liabilities')
+        self.assets_tree.heading('balance', text='Balance')
+        self.assets_tree.column('balance', anchor=tk.E)
         self.income_tree = ttk.Treeview(master=self.frame, columns=columns, show='headings')
         self.income_tree.heading('name', text='Income/Expense')
+        self.income_tree.heading('balance', text='Balance')
+        self.income_tree.column('balance', anchor=tk.E)
+
+        balances = self._engine.get_current_account_balances()
 
         accounts = self._engine.get_accounts(types=[AccountType.ASSET, AccountType.SECURITY, AccountType.LIABILITY, AccountType.EQUITY])
         for account in accounts:
             name = str(account)
             if account.child_level:
                 name = ' -  ' * account.child_level + name
-            values = (name,)
+            balance = ''
+            if account.id in balances:
+                if account.type == AccountType.SECURITY:
+                    balance = quantity_display(balances[account.id])
+                else:
+                    balance = amount_display(balances[account.id])
+            values = (name, balance)
             self.assets_tree.insert(parent='', index=tk.END, iid=account.id, values=values)
 
         assets_scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.assets_tree.yview)
@@ -2963,7 +4295,10 @@ class AccountsDisplay:
             name = str(account)
             if account.child_level:
                 name = ' -  ' * account.child_level + name
-            values = (name,)
+            balance = ''
+            if account.id in balances:
+                balance = amount_display(balances[account.id])
+            values = (name, balance)
             self.income_tree.insert(parent='', index=tk.END, iid=account.id, values=values)
 
         income_scrollbar = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=self.income_tree.yview)
@@ -2973,6 +4308,9 @@ class AccountsDisplay:
         self.income_tree.grid(row=1, column=2, sticky=(tk.N, tk.W, tk.S, tk.E))
         income_scrollbar.grid(row=1, column=3, sticky=(tk.N, tk.S))
 
+    def refresh(self):
+        self._show_accounts()
+
     def get_widget(self):
         self.frame = ttk.Frame(master=self._master)
         self.frame.columnconfigure(0, weight=1)
@@ -2980,6 +4318,8 @@ class AccountsDisplay:
         self.frame.rowconfigure(1, weight=1)
 
         self.add_button = ttk.Button(master=self.frame, text='New Account', command=self._open_new_account_form)
+        if self._engine.read_only:
+            self.add_button['state'] = tk.DISABLED
         self.add_button.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S))
 
         self._show_accounts()
@@ -2993,6 +4333,8 @@ class AccountsDisplay:
         widget.grid()
 
     def _item_selected(self, event, tree=None):
+        if self._engine.read_only:
+            return
         row_id = tree.identify_row(event.y)
         if not row_id:
             return
@@ -3010,7 +4352,8 @@ class SplitsForm:
     def __init__(self, master, splits, accounts, payees, default_account=None):
         self._has_security_account = False
         if splits:
-            self._splits = copy.deepcopy(splits)
+            #the form keeps its widgets in each split, so it needs dicts
+            self._splits = [dict(split) for split in copy.deepcopy(splits)]
             if any([split['account'] for split in self._splits if 'account' in split and split['account'].type == AccountType.SECURITY]):
                 self._has_security_account = True
             self.mode = 'advanced'
@@ -3323,11 +4666,26 @@ class TransactionForm:
 
 class LedgerDisplay:
 
-    def __init__(self, master, accounts, engine):
+    NUM_TXNS_IN_PAGE = 100
+    LOAD_POLL_MS = 20
+
+    def __init__(self, master, accounts, engine, executor=None):
         self._master = master
         self._accounts = accounts
         self._bookmarked_accounts = engine.get_bookmarked_accounts()
         self._engine = engine
+        #if there's an executor, the txns are loaded in the background
+        self._executor = executor
+        #incremented for each load, so the callbacks for an old load (eg. before switching accounts) can stop
+        self._load_id = 0
+        self._load_future = None
+        #the rows of the ledger (the Transaction objects from get_ledger) - only the ones scrolled into view are in
+        #  the Treeview, & their display strings are made when they're scrolled into view
+        self._scheduled_txns = []
+        self._txns = []
+        #whether self._txns has all the account's txns, or only a page of the newest ones
+        self._all_txns_loaded = True
+        self._date_format = engine.get_date_display_format()
         if self._bookmarked_accounts:
             self._account = self._bookmarked_accounts[0]
         else:
@@ -3339,27 +4697,31 @@ class LedgerDisplay:
         self.txns_are_filtered = False
         self.show_all_txns = False
 
-    def _get_txns(self):
+    def _get_ledger_args(self):
         filter_account = self.filter_account_combo.current_value()
 
-        status, filter_text = self._get_status_and_filter_text()
+        status, filter_text, start_date, end_date = self._get_filters()
 
-        if any([status, filter_text, filter_account]):
-            self.txns_are_filtered = True
-        else:
-            self.txns_are_filtered = False
+        self.txns_are_filtered = any([status, filter_text, filter_account, start_date, end_date])
+        limit = None
+        if not self.txns_are_filtered and not self.show_all_txns:
+            limit = self.NUM_TXNS_IN_PAGE
+        return {'account': self._account, 'status': status, 'filter_account': filter_account, 'query': filter_text,
+                'start_date': start_date, 'end_date': end_date, 'limit': limit}
 
-        return self._engine.get_transactions(account=self._account, status=status, filter_account=filter_account, query=filter_text)
+    @property
+    def loading(self):
+        return self._load_future is not None
 
-    def set_cleared_and_balance(self, sorted_txns=None):
+    def refresh(self):
+        self._show_transactions()
+
+    def set_cleared_and_balance(self):
         if self.txns_are_filtered:
             self.balance_var.set('')
             self.cleared_var.set('')
         else:
-            if sorted_txns is None:
-                sorted_txns = self._get_txns()
-
-            balances = self._engine.get_current_balances_for_display(account=self._account, sorted_txns=sorted_txns)
+            balances = self._engine.get_current_balances_for_display(account=self._account)
             self.balance_var.set(f'Current Balance: {balances.current}')
             self.cleared_var.set(f'Cleared: {balances.current_cleared}')
 
@@ -3371,7 +4733,6 @@ class LedgerDisplay:
         self.txns_widget.columnconfigure(0, weight=1)
         self.txns_widget.rowconfigure(0, weight=1)
 
-        account = self._account
         columns = {
             'date': {'text': 'Date'},
             'payee': {'text': 'Payee'},
@@ -3395,49 +4756,95 @@ class LedgerDisplay:
                 'transfer account': {'text': 'Transfer Account'},
             }
 
-        self.txns_tree = ttk.Treeview(master=self.txns_widget, columns=tuple(columns.keys()), show='headings')
+        self.txns_view = VirtualTreeview(master=self.txns_widget, columns=tuple(columns.keys()), get_row=self._get_row)
+        self.txns_tree = self.txns_view.tree
         self.txns_tree.tag_configure('scheduled', background='gray')
         for column_name, column_info in columns.items():
             self.txns_tree.heading(column_name, text=column_info['text'])
             self.txns_tree.column(column_name, width=100, anchor='center')
 
-        sorted_txns = self._get_txns()
+        self._load_transactions()
 
-        date_format = self._engine.get_date_display_format()
+        self.txns_tree.bind('<Button-1>', self._item_selected)
+        self.txns_tree.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S, tk.E))
+        self.txns_view.scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
 
-        if not self.txns_are_filtered:
-            for st in self._engine.get_scheduled_transactions_due(accounts=[account]):
-                tds = get_display_strings_for_ledger(account, st, date_format)
-                values = (tds['txn_date'], tds['payee'], tds['description'], tds.get('status', ''),
-                          tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
-                iid = f'st{st.id}'
-                self.txns_tree.insert('', tk.END, iid=iid, values=values, tags='scheduled')
+        self.txns_widget.grid(row=1, column=0, columnspan=7, sticky=(tk.N, tk.W, tk.S, tk.E))
 
-        self.set_cleared_and_balance(sorted_txns=sorted_txns)
+    def _cancel_load(self, event=None):
+        #stop any load that's still running (eg. for the previous account)
+        self._load_id += 1
+        if self._load_future:
+            self._load_future.cancel()
+            self._load_future = None
 
-        reversed_txns = list(reversed(sorted_txns))
-        if self.show_all_txns:
-            txns = reversed_txns
+    def _load_transactions(self):
+        self._cancel_load()
+        try:
+            ledger_args = self._get_ledger_args()
+        except InvalidLedgerError as e:
+            show_error(msg=str(e))
+            return
+        if self._executor:
+            self._load_future = self._executor.submit('get_ledger', **ledger_args)
+            self.progress_bar.grid()
+            self.progress_bar.start()
+            self.frame.after(self.LOAD_POLL_MS, self._check_load, self._load_id)
         else:
-            txns = reversed_txns[:100]
-        for txn in txns:
-            tds = get_display_strings_for_ledger(account, txn, date_format)
-            if self._account.type == AccountType.SECURITY:
-                values = (tds['txn_date'], tds['payee'], tds['description'], tds['status'], tds['quantity'],
-                          tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
-            else:
-                values = (tds['txn_date'], tds['payee'], tds['description'], tds['status'],
-                          tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
-            self.txns_tree.insert('', tk.END, iid=txn.id, values=values)
+            self._show_ledger_data(self._engine.get_ledger(**ledger_args))
 
-        scrollbar = ttk.Scrollbar(self.txns_widget, orient=tk.VERTICAL, command=self.txns_tree)
-        self.txns_tree.configure(yscrollcommand=scrollbar.set)
+    def _check_load(self, load_id):
+        if load_id != self._load_id:
+            return
+        if not self._load_future.done():
+            self.frame.after(self.LOAD_POLL_MS, self._check_load, load_id)
+            return
+        future = self._load_future
+        self._load_future = None
+        self.progress_bar.stop()
+        self.progress_bar.grid_remove()
+        try:
+            ledger = future.result()
+        except Exception as e:
+            log(f'ERROR: loading ledger: {e}')
+            show_error(msg=str(e))
+            return
+        self._show_ledger_data(ledger)
 
-        self.txns_tree.bind('<Button-1>', self._item_selected)
-        self.txns_tree.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S, tk.E))
-        scrollbar.grid(row=0, column=1, sticky=(tk.N, tk.S))
+    def _show_ledger_data(self, ledger):
+        if ledger.balances:
+            self.balance_var.set(f'Current Balance: {ledger.balances.current}')
+            self.cleared_var.set(f'Cleared: {ledger.balances.current_cleared}')
+        else:
+            self.balance_var.set('')
+            self.cleared_var.set('')
 
-        self.txns_widget.grid(row=1, column=0, columnspan=7, sticky=(tk.N, tk.W, tk.S, tk.E))
+        self._scheduled_txns = ledger.scheduled_txns
+        if self.show_all_txns:
+            self._txns = ledger.txns
+        else:
+            self._txns = ledger.txns[:self.NUM_TXNS_IN_PAGE]
+        self._all_txns_loaded = self.show_all_txns or len(ledger.txns) < self.NUM_TXNS_IN_PAGE
+        self.txns_view.set_num_rows(len(self._scheduled_txns) + len(self._txns))
+
+    def _get_row(self, index):
+        #the display strings are only generated for the rows that are scrolled into view
+        account = self._account
+        if index < len(self._scheduled_txns):
+            st = self._scheduled_txns[index]
+            tds = get_display_strings_for_ledger(account, st, self._date_format)
+            values = (tds['txn_date'], tds['payee'], tds['description'], tds.get('status', ''),
+                      tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
+            return f'st{st.id}', values, ('scheduled',)
+        txn = self._txns[index - len(self._scheduled_txns)]
+        tds = get_display_strings_for_ledger(account, txn, self._date_format)
+        if account.type == AccountType.SECURITY:
+            values = (tds['txn_date'], tds['payee'], tds['description'], tds['status'], tds['quantity'],
+                      tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
+        else:
+            values = (tds['txn_date'], tds['payee'], tds['description'], tds['status'],
+                      tds['withdrawal'], tds['deposit'], tds.get('balance', ''), tds['transfer_account'])
+        return txn.id, values, ()
 
     def get_widget(self):
         self.frame = ttk.Frame(master=self._master)
@@ -3462,6 +4869,9 @@ class LedgerDisplay:
         else:
             bookmark_text = 'Bookmark Account'
         self.bookmark_button = ttk.Button(master=self.frame, text=bookmark_text, command=self._toggle_bookmark)
+        if self._engine.read_only:
+            self.add_button['state'] = tk.DISABLED
+            self.bookmark_button['state'] = tk.DISABLED
 
         self.filter_entry = ttk.Entry(master=self.frame, textvariable=self.filter_var)
         all_accounts_text = 'All Transfer Accounts'
@@ -3484,6 +4894,11 @@ class LedgerDisplay:
         self.show_all_button = ttk.Button(master=balances_frame, text='Show All', command=self._show_all_txns)
         self.show_all_button.grid(row=0, column=2)
 
+        self.progress_bar = ttk.Progressbar(master=self.frame, mode='indeterminate', length=200)
+        self.progress_bar.grid(row=2, column=0, sticky=(tk.W,), padx=2)
+        self.progress_bar.grid_remove()
+        self.frame.bind('<Destroy>', self._cancel_load)
+
         self.account_select_combo.get_widget().grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S), padx=2)
         self.add_button.grid(row=0, column=1, sticky=(tk.N, tk.W, tk.S), padx=2)
         self.bookmark_button.grid(row=0, column=2, sticky=(tk.N, tk.W, tk.S), padx=2)
@@ -3517,6 +4932,8 @@ class LedgerDisplay:
             self.bookmark_button.configure(text='Remove Bookmark')
 
     def _item_selected(self, event):
+        if self._engine.read_only:
+            return
         row = self.txns_tree.identify_row(event.y)
         txn_id = row
         if isinstance(txn_id, str) and txn_id.startswith('st'):
@@ -3543,6 +4960,13 @@ class LedgerDisplay:
                 self._engine.save_transaction(transaction)
                 status = transaction.get_status(self._account)
                 self.txns_tree.set(row, column=col, value=status)
+                #the row is regenerated from self._txns when it's scrolled back into view
+                for index, txn in enumerate(self._txns):
+                    if txn.id == txn_id:
+                        if hasattr(txn, 'balance'):
+                            transaction.balance = txn.balance
+                        self._txns[index] = transaction
+                        break
                 self.set_cleared_and_balance()
                 return 'break'  # So that default event handler doesn't run
             else:
@@ -3555,33 +4979,121 @@ class LedgerDisplay:
                 widget.grid()
 
     def _save(self, transaction):
+        old_txn = None
+        if transaction.id:
+            old_txn = self._engine.get_transaction(transaction.id)
         self._engine.save_transaction(transaction)
-        self._show_transactions()
+        self._update_rows(old_txn=old_txn, new_txn=transaction)
 
     def _delete(self, transaction_id):
+        old_txn = self._engine.get_transaction(transaction_id)
         self._engine.delete_transaction(transaction_id=transaction_id)
-        self._show_transactions()
+        self._update_rows(old_txn=old_txn)
 
     def _enter_scheduled_transaction(self, scheduled_transaction, transaction):
         self._engine.enter_scheduled_transaction(scheduled_transaction, transaction)
-        self._show_transactions()
+        self._scheduled_txns = self._engine.get_scheduled_transactions_due(accounts=[self._account])
+        self._update_rows(new_txn=transaction)
 
     def _skip_scheduled_transaction(self, scheduled_transaction_id):
         self._engine.skip_scheduled_transaction(scheduled_transaction_id)
-        self._show_transactions()
+        self._scheduled_txns = self._engine.get_scheduled_transactions_due(accounts=[self._account])
+        self._update_rows()
+
+    def _find_row(self, key):
+        #index of the first txn row that isn't newer than key=(date, id) - the rows are sorted newest first
+        low, high = 0, len(self._txns)
+        while low < high:
+            middle = (low + high) // 2
+            txn = self._txns[middle]
+            if (txn.txn_date, txn.id) > key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
 
-    def _get_status_and_filter_text(self):
+    def _update_rows(self, old_txn=None, new_txn=None):
+        '''
+        Update the rows after a txn has been saved or deleted, instead of reloading the whole ledger: the txn's
+        old row is removed and its new row inserted in order, and the balances are only recalculated for the
+        rows on or after the earliest of the txn's old & new dates.
+        '''
+        if self.txns_are_filtered or self.loading:
+            #the filters decide which txns are shown (& filtered txns don't have balances), so just reload
+            self._show_transactions()
+            return
+        account = self._account
+        #the txns that were or are in this account - the balances after them change, even if they're not showing
+        changed_keys = []
+        if old_txn and any(split.account == account for split in old_txn.splits):
+            key = (old_txn.txn_date, old_txn.id)
+            changed_keys.append(key)
+            index = self._find_row(key)
+            if index < len(self._txns) and self._txns[index].id == old_txn.id:
+                del self._txns[index]
+        if new_txn and any(split.account == account for split in new_txn.splits):
+            key = (new_txn.txn_date, new_txn.id)
+            changed_keys.append(key)
+            index = self._find_row(key)
+            #a txn older than the whole page of txns that's showing belongs on another page
+            if index < len(self._txns) or self._all_txns_loaded:
+                self._txns.insert(index, new_txn)
+                if not self.show_all_txns and len(self._txns) > self.NUM_TXNS_IN_PAGE:
+                    del self._txns[self.NUM_TXNS_IN_PAGE:]
+                    self._all_txns_loaded = False
+        if not self._all_txns_loaded and len(self._txns) < self.NUM_TXNS_IN_PAGE:
+            #a row was removed from the page, so fill it back up with the next older txns (with their balances)
+            before = None
+            if self._txns:
+                before = (self._txns[-1].txn_date, self._txns[-1].id)
+            older_txns, more_txns = self._engine.get_transactions_page(account, limit=self.NUM_TXNS_IN_PAGE - len(self._txns), before=before)
+            self._txns.extend(older_txns)
+            self._all_txns_loaded = not more_txns
+        if changed_keys:
+            earliest_key = min(changed_keys)
+            end = self._find_row(earliest_key)
+            if end < len(self._txns) and (self._txns[end].txn_date, self._txns[end].id) == earliest_key:
+                end += 1
+            if end:
+                balance_field = 'amount'
+                if account.type == AccountType.SECURITY:
+                    balance_field = 'quantity'
+                if end < len(self._txns):
+                    starting_balance = self._txns[end].balance
+                elif self._all_txns_loaded:
+                    starting_balance = 0
+                else:
+                    oldest_txn = self._txns[end - 1]
+                    starting_balance = self._engine.get_balance(account, before=(oldest_txn.txn_date, oldest_txn.id))
+                Engine.add_balance_to_txns(reversed(self._txns[:end]), account=account, balance_field=balance_field,
+                        starting_balance=starting_balance)
+        self.txns_view.set_num_rows(len(self._scheduled_txns) + len(self._txns))
+        self.set_cleared_and_balance()
+
+    def _get_filters(self):
         filter_entry_value = self.filter_var.get().strip()
         filter_parts = filter_entry_value.split()
         filter_text = ''
         status = ''
+        start_date = None
+        end_date = None
         for fp in filter_parts:
             if fp.startswith('status:'):
                 status = fp.replace('status:', '')
+            elif fp.startswith('start:') or fp.startswith('end:'):
+                name, value = fp.split(':', 1)
+                try:
+                    filter_date = get_date(value)
+                except ValueError:
+                    raise InvalidLedgerError(f'invalid {name} date "{value}"')
+                if name == 'start':
+                    start_date = filter_date
+                else:
+                    end_date = filter_date
             else:
                 filter_text += f' {fp}'
         status = status or None
-        return status, filter_text.strip()
+        return status, filter_text.strip(), start_date, end_date
 
     def _filter_transactions(self):
         self._show_transactions()
@@ -3677,11 +5189,12 @@ class BudgetDisplay:
     def __init__(self, master, engine, current_budget):
         self._master = master
         self._engine = engine
-        if not current_budget:
-            budgets = self._engine.get_budgets()
-            if budgets:
-                current_budget = budgets[0]
+        self._budget_summaries = self._engine.get_budget_summaries()
+        if not current_budget and self._budget_summaries:
+            #only the budget that's displayed is fully loaded
+            current_budget = self._engine.get_budget(id_=self._budget_summaries[0].id)
         self._current_budget = current_budget
+        self._show_monthly = False
         self.tree = None
 
     def get_widget(self):
@@ -3690,24 +5203,59 @@ class BudgetDisplay:
         self.frame.rowconfigure(1, weight=1)
 
         budget_choices = {}
-        budgets = self._engine.get_budgets()
-        for budget in budgets:
+        for budget in self._budget_summaries:
             budget_choices[budget.display(show_id=False)] = budget
         self.budget_select_combo = Combobox(master=self.frame, choices=budget_choices, selected=self._current_budget)
         self.budget_select_combo.bind('<<ComboboxSelected>>', self._update_budget)
         self.budget_select_combo.get_widget().grid(row=0, column=0, sticky=(tk.W,))
 
         self.add_button = ttk.Button(master=self.frame, text='New Budget', command=partial(self._open_form, budget=None))
+        if self._engine.read_only:
+            self.add_button['state'] = tk.DISABLED
         self.add_button.grid(row=0, column=1, sticky=(tk.W,))
 
+        self.monthly_button = ttk.Button(master=self.frame, text='Monthly', command=self._toggle_monthly)
+        self.monthly_button.grid(row=0, column=3, sticky=(tk.E,))
+
         self._display_budget()
 
         return self.frame
 
+    def refresh(self):
+        if self._current_budget:
+            self._current_budget = self._engine.get_budget(id_=self._current_budget.id)
+        self._display_budget()
+
+    def _toggle_monthly(self):
+        self._show_monthly = not self._show_monthly
+        if self._show_monthly:
+            self.monthly_button['text'] = 'Totals'
+        else:
+            self.monthly_button['text'] = 'Monthly'
+        self._display_budget()
+
+    def _display_monthly_budget(self):
+        matrix = self._engine.get_budget_monthly_matrix(self._current_budget)
+        columns = ['account'] + matrix['months']
+        self.tree = ttk.Treeview(master=self.frame, columns=columns, show='headings')
+        self.tree.heading('account', text='Account')
+        self.tree.column('account', width=150, anchor='w')
+        for month in matrix['months']:
+            self.tree.heading(month, text=month)
+            self.tree.column(month, width=130, anchor='e')
+        for row in matrix['income'] + matrix['expense']:
+            values = [str(row['account'])] + [f'{amount_display(row["actual"][month])} / {amount_display(row["budget"][month])}' for month in matrix['months']]
+            self.tree.insert('', tk.END, values=values)
+        self.tree.grid(row=1, column=0, columnspan=4, sticky=(tk.N, tk.S, tk.W, tk.E))
+
     def _display_budget(self):
         if self.tree:
             self.tree.destroy()
 
+        if self._show_monthly and self._current_budget:
+            self._display_monthly_budget()
+            return
+
         columns = ('account', 'amount', 'income', 'carryover', 'total budget', 'spent', 'remaining', 'remaining percent', 'current status')
 
         report_data = []
@@ -3719,6 +5267,8 @@ class BudgetDisplay:
                 report_data.append(info)
 
             self.edit_button = ttk.Button(master=self.frame, text='Edit Budget', command=partial(self._open_form, budget=self._current_budget))
+            if self._engine.read_only:
+                self.edit_button['state'] = tk.DISABLED
             self.edit_button.grid(row=0, column=2, sticky=(tk.W,))
 
 
@@ -3746,10 +5296,10 @@ class BudgetDisplay:
             values = row.get('name', ''), row.get('amount', ''), row.get('income', ''), row.get('carryover', ''), row.get('total_budget', ''), row.get('spent', ''), row.get('remaining', ''), row.get('remaining_percent', ''), row.get('current_status', '')
             self.tree.insert('', tk.END, values=values)
 
-        self.tree.grid(row=1, column=0, columnspan=3, sticky=(tk.N, tk.S, tk.W, tk.E))
+        self.tree.grid(row=1, column=0, columnspan=4, sticky=(tk.N, tk.S, tk.W, tk.E))
 
     def _update_budget(self, event):
-        self._current_budget = self.budget_select_combo.current_value()
+        self._current_budget = self._engine.get_budget(id_=self.budget_select_combo.current_value().id)
         self._display_budget()
 
     def _open_form(self, budget):
@@ -3888,6 +5438,9 @@ class ScheduledTransactionsDisplay:
         self.scheduled_txns_frame = None
         self.tree = None
 
+    def refresh(self):
+        self._show_scheduled_transactions()
+
     def _show_scheduled_transactions(self):
         if self.scheduled_txns_frame:
             self.scheduled_txns_frame.destroy()
@@ -3938,6 +5491,8 @@ class ScheduledTransactionsDisplay:
         self.frame.rowconfigure(1, weight=1)
 
         self.add_button = ttk.Button(master=self.frame, text='New Scheduled Transaction', command=self._open_new_form)
+        if self._engine.read_only:
+            self.add_button['state'] = tk.DISABLED
         self.add_button.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S))
 
         self._show_scheduled_transactions()
@@ -3951,6 +5506,8 @@ class ScheduledTransactionsDisplay:
         widget.grid()
 
     def _item_selected(self, event):
+        if self._engine.read_only:
+            return
         row_id = self.tree.identify_row(event.y)
         if not row_id:
             return
@@ -4050,9 +5607,18 @@ class ReportsDisplay:
 
 class GUI_TK:
 
-    def __init__(self, file_name):
+    #how often to check whether another process has changed the file
+    EXTERNAL_CHANGES_POLL_MS = 2000
+    BACKUP_POLL_MS = 100
+
+    def __init__(self, file_name, read_only=False):
+        self._read_only = read_only
         self.root = tk.Tk()
-        self.root.title(TITLE)
+        if read_only:
+            #the edit controls are disabled
+            self.root.title(f'{TITLE} (read-only)')
+        else:
+            self.root.title(TITLE)
 
         w, h = self.root.winfo_screenwidth(), self.root.winfo_screenheight()
         self.root.geometry("%dx%d+0+0" % (w, h))
@@ -4068,6 +5634,10 @@ class GUI_TK:
         self.content_frame.grid(row=0, column=0, sticky=(tk.N, tk.W, tk.S, tk.E))
 
         self.main_frame = None
+        self._engine = None
+        self._executor = None
+        self._display = None
+        self._external_changes_poll = None
 
         self._show_splash()
         if file_name:
@@ -4109,9 +5679,25 @@ class GUI_TK:
         if file_name:
             self._load_db(file_name=file_name, save_recently_used=True)
 
+    def close(self):
+        if self._external_changes_poll:
+            self.root.after_cancel(self._external_changes_poll)
+            self._external_changes_poll = None
+        if self._executor:
+            self._executor.shutdown()
+            self._executor = None
+        if self._engine:
+            self._engine.close()
+            self._engine = None
+
     def _load_db(self, file_name, save_recently_used=False):
+        self.close()
         try:
-            self._engine = Engine(file_name)
+            self._engine = Engine(file_name, read_only=self._read_only, immutable=self._read_only)
+            #load big ledgers in the background (an in-memory DB can't be shared with other threads)
+            #self._engine does all the writes, so the executor only gets readers
+            if file_name != ':memory:' and not self._read_only:
+                self._executor = EngineExecutor(file_name, writer=False)
             if save_recently_used:
                 Config.save_recently_used_file(file_name)
         except InvalidStorageFile as e:
@@ -4129,6 +5715,20 @@ class GUI_TK:
         else:
             self._show_accounts()
 
+        self._external_changes_poll = self.root.after(self.EXTERNAL_CHANGES_POLL_MS, self._check_external_changes)
+
+    def _check_external_changes(self):
+        if self._engine.has_external_changes():
+            if self._display == 'accounts':
+                self.accounts_display.refresh()
+            elif self._display == 'ledger':
+                self.ledger_display.refresh()
+            elif self._display == 'budget':
+                self.budget_display.refresh()
+            elif self._display == 'scheduled_transactions':
+                self.scheduled_transactions_display.refresh()
+        self._external_changes_poll = self.root.after(self.EXTERNAL_CHANGES_POLL_MS, self._check_external_changes)
+
     def _init_action_buttons_frame(self, master):
         frame = ttk.Frame(master=master)
         self.accounts_button = ttk.Button(master=frame, text='Accounts', command=self._show_accounts)
@@ -4141,9 +5741,52 @@ class GUI_TK:
         self.scheduled_transactions_button.grid(row=0, column=3, sticky=(tk.N, tk.W, tk.S), padx=2, pady=2)
         self.reports_button = ttk.Button(master=frame, text='Reports', command=self._show_reports)
         self.reports_button.grid(row=0, column=4, sticky=(tk.N, tk.W, tk.S), padx=2, pady=2)
+        self.backup_button = ttk.Button(master=frame, text='Backup...', command=self._backup)
+        self.backup_button.grid(row=0, column=5, sticky=(tk.N, tk.W, tk.S), padx=2, pady=2)
         return frame
 
+    def _backup(self):
+        from tkinter import filedialog as fd
+        dest_path = fd.asksaveasfilename(title='Backup file')
+        if dest_path:
+            self._start_backup(dest_path)
+
+    def _start_backup(self, dest_path):
+        #the backup runs on a worker thread, which only sets self._backup_status - the Tk widgets
+        #  are updated from the main thread in _check_backup
+        self._backup_status = {'copied': 0, 'total': 0, 'done': False, 'error': None}
+
+        def update_progress(copied, total):
+            self._backup_status['copied'] = copied
+            self._backup_status['total'] = total
+
+        def backup():
+            try:
+                self._engine.backup(dest_path, progress=update_progress)
+            except Exception as e:
+                self._backup_status['error'] = e
+            self._backup_status['done'] = True
+
+        self.backup_button['state'] = tk.DISABLED
+        self._backup_thread = threading.Thread(target=backup, daemon=True)
+        self._backup_thread.start()
+        self.root.after(self.BACKUP_POLL_MS, self._check_backup)
+
+    def _check_backup(self):
+        status = self._backup_status
+        if not status['done']:
+            if status['total']:
+                self.backup_button['text'] = f'Backup {int(status["copied"] * 100 / status["total"])}%'
+            self.root.after(self.BACKUP_POLL_MS, self._check_backup)
+            return
+        self.backup_button['text'] = 'Backup...'
+        self.backup_button['state'] = tk.NORMAL
+        if status['error']:
+            log(f'ERROR: backup failed: {status["error"]}')
+            show_error(msg=f'Backup failed: {status["error"]}')
+
     def _update_action_buttons(self, display):
+        self._display = display
         self.accounts_button['state'] = tk.NORMAL
         self.ledger_button['state'] = tk.NORMAL
         self.budget_button['state'] = tk.NORMAL
@@ -4177,7 +5820,7 @@ class GUI_TK:
         if self.main_frame:
             self.main_frame.destroy()
         self._update_action_buttons(display='ledger')
-        self.ledger_display = LedgerDisplay(master=self.content_frame, accounts=accounts, engine=self._engine)
+        self.ledger_display = LedgerDisplay(master=self.content_frame, accounts=accounts, engine=self._engine, executor=self._executor)
         self.main_frame = self.ledger_display.get_widget()
         self.main_frame.grid(row=1, column=0, sticky=(tk.N, tk.W, tk.S, tk.E))
 
@@ -4219,12 +5862,48 @@ def import_file(file_to_import):
         print(f'invalid import file {file_to_import} - must end with .kmy')
 
 
+DEFAULT_BACKUPS_TO_KEEP = 10
+
+
+def backup_file(file_name, backup_dir, keep=DEFAULT_BACKUPS_TO_KEEP):
+    '''
+    Back up file_name to a timestamped file in backup_dir, and remove all but the newest keep backups.
+    '''
+    if keep < 1:
+        raise ValueError(f'must keep at least 1 backup (keep={keep})')
+    path = Path(file_name)
+    backup_dir = Path(backup_dir)
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    dest_path = backup_dir / f'{path.stem}-{datetime.now():%Y%m%d%H%M%S}{path.suffix}'
+    engine = Engine(file_name)
+    try:
+        engine.backup(dest_path)
+    finally:
+        engine.close()
+    backup_name_re = re.compile(re.escape(path.stem) + r'-\d{14}' + re.escape(path.suffix))
+    backups = sorted(p for p in backup_dir.iterdir() if backup_name_re.fullmatch(p.name))
+    for old_backup in backups[:len(backups) - keep]:
+        old_backup.unlink()
+    return dest_path
+
+
 def parse_args():
     import argparse
+
+    def backups_to_keep(value):
+        keep = int(value)
+        if keep < 1:
+            raise argparse.ArgumentTypeError('must keep at least 1 backup')
+        return keep
+
     parser = argparse.ArgumentParser()
     parser.add_argument('-f', '--file_name', dest='file_name')
     parser.add_argument('--cli', dest='cli', action='store_true')
     parser.add_argument('-i', '--import', dest='file_to_import')
+    parser.add_argument('--backup', dest='backup_dir', help='back up the file to this directory (eg. from cron)')
+    parser.add_argument('--keep', dest='backups_to_keep', type=backups_to_keep, default=DEFAULT_BACKUPS_TO_KEEP, help='number of backups to keep')
+    parser.add_argument('--read-only', dest='read_only', action='store_true',
+            help="open the file read-only, without locking it (only for files that aren't open anywhere else, eg. archived books)")
     parser.add_argument('-v', dest='version', action='store_true')
     args = parser.parse_args()
     return args
@@ -4244,6 +5923,16 @@ if __name__ == '__main__':
     if args.file_name and not os.path.exists(args.file_name):
         raise Exception('no such file: "%s"' % args.file_name)
 
+    if args.backup_dir:
+        if not args.file_name:
+            msg = 'file name argument required for backup'
+            log(f'ERROR: {msg}')
+            print(msg)
+            sys.exit(1)
+        dest_path = backup_file(args.file_name, args.backup_dir, keep=args.backups_to_keep)
+        print(f'backed up {args.file_name} to {dest_path}')
+        sys.exit(0)
+
     if args.cli:
         if not args.file_name:
             msg = 'file name argument required for CLI mode'
@@ -4251,7 +5940,7 @@ if __name__ == '__main__':
             print(msg)
             sys.exit(1)
         try:
-            CLI(args.file_name).run()
+            CLI(args.file_name, read_only=args.read_only).run()
             sys.exit(0)
         except Exception:
             import traceback
@@ -4259,8 +5948,9 @@ if __name__ == '__main__':
             raise
 
     if tk:
-        app = GUI_TK(args.file_name)
+        app = GUI_TK(args.file_name, read_only=args.read_only)
         app.root.mainloop()
+        app.close()
     else:
         msg = "tkinter missing - please make sure it's installed"
         log(f'ERROR: {msg}')
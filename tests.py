@@ -5,6 +5,7 @@ from fractions import Fraction
 import io
 import json
 import os
+import random
 import shutil
 import sqlite3
 import tempfile
@@ -91,6 +92,59 @@ class TestUtils(unittest.TestCase):
         self.assertEqual(new_date, date(2019, 2, 28))
 
 
+class TestCents(unittest.TestCase):
+    '''the integer-cents paths must give exactly the same results as the Fraction/Decimal paths'''
+
+    def setUp(self):
+        self.random = random.Random(12345)
+
+    def random_amounts(self, count):
+        amounts = [Fraction(0), Fraction(1, 100), Fraction(-1, 100), Fraction(1, 2), Fraction(-1, 4), Fraction(10**15 + 1, 100)]
+        for i in range(count):
+            cents = self.random.randint(-10**9, 10**9)
+            amounts.append(bb.get_validated_amount(Fraction(cents, 100)))
+        return amounts
+
+    def test_amount_display(self):
+        for amount in self.random_amounts(2000):
+            self.assertEqual(bb.amount_display(amount), '{0:,.2f}'.format(bb.fraction_to_decimal(amount)))
+            self.assertEqual(bb.cents_to_amount(bb.amount_to_cents(amount)), amount)
+        #non-cent values still go through Decimal
+        self.assertEqual(bb.amount_display(Fraction(1, 3)), '0.33')
+        self.assertEqual(bb.amount_display(Fraction(-2000001, 3)), '-666,667.00')
+        with self.assertRaises(bb.InvalidAmount):
+            bb.amount_to_cents(Fraction(1, 3))
+
+    def test_check_txn_splits(self):
+        checking = get_test_account()
+        savings = get_test_account(name='Savings')
+        for i in range(500):
+            amounts = self.random_amounts(self.random.randint(1, 5))[6:]
+            if self.random.random() < 0.5:
+                amounts.append(-sum(amounts))
+            splits = bb.handle_txn_splits([{'account': self.random.choice([checking, savings]), 'amount': a} for a in amounts])
+            balanced = (sum([s['amount'] for s in splits], Fraction(0)) == 0)
+            if balanced:
+                bb.check_txn_splits(splits)
+            else:
+                with self.assertRaises(bb.InvalidTransactionError):
+                    bb.check_txn_splits(splits)
+
+    def test_add_balance_to_txns(self):
+        checking = get_test_account(id_=1)
+        savings = get_test_account(id_=2, name='Savings')
+        txns = []
+        for amount in self.random_amounts(1000)[6:]:
+            txns.append(bb.Transaction(txn_date=date(2018, 1, 1), splits=[{'account': checking, 'amount': amount}, {'account': savings, 'amount': -amount}]))
+        starting_balance = Fraction('-12.34')
+        bb.Engine.add_balance_to_txns(txns, account=checking, starting_balance=starting_balance)
+        balance = starting_balance
+        for t in txns:
+            balance += t.splits[0]['amount']
+            self.assertEqual(t.balance, balance)
+            self.assertEqual(type(t.balance), Fraction)
+
+
 class TestAccount(unittest.TestCase):
 
     def test_init(self):
@@ -173,6 +227,48 @@ class TestTransaction(unittest.TestCase):
         t = bb.Transaction(splits=self.valid_splits, txn_date='3/18/2018')
         self.assertEqual(t.txn_date, date(2018, 3, 18))
 
+    def test_split(self):
+        t = bb.Transaction(splits=[{'account': self.checking, 'amount': '-1.5', 'status': 'c'}, {'account': self.savings, 'amount': '1.5'}], txn_date='2018-03-18')
+        split = t.splits[0]
+        self.assertTrue(isinstance(split, bb.Split))
+        self.assertFalse(hasattr(split, '__dict__'))
+        self.assertIs(t.get_split(self.checking), split)
+        self.assertIs(t.get_split(get_test_account(id_=2, name='Savings')), t.splits[1])
+        with self.assertRaises(KeyError):
+            t.get_split(get_test_account(id_=3, name='Other'))
+        #the first split is used for an account with more than one split
+        t2 = bb.Transaction(splits=[{'account': self.checking, 'amount': '-1'}, {'account': self.checking, 'amount': '-2'}, {'account': self.savings, 'amount': '3'}], txn_date='2018-03-18')
+        self.assertIs(t2.get_split(self.checking), t2.splits[0])
+        #a copy has its own splits, without validating them again
+        with patch('bricbooks.handle_txn_splits') as handle_txn_splits:
+            t2_copy = t2.copy()
+        handle_txn_splits.assert_not_called()
+        self.assertEqual(t2_copy.splits, t2.splits)
+        self.assertIsNot(t2_copy.splits[0], t2.splits[0])
+        self.assertIs(t2_copy.splits[0].account, self.checking)
+        #setting new splits replaces the old ones for get_split
+        t2.splits = bb.handle_txn_splits([{'account': self.checking, 'amount': '-4'}, {'account': self.savings, 'amount': '4'}])
+        self.assertEqual(t2.get_split(self.checking).amount, -4)
+        #attribute & dict-style access
+        self.assertEqual(split.amount, Fraction('-1.5'))
+        self.assertEqual(split['amount'], Fraction('-1.5'))
+        self.assertEqual(split.get('status'), 'C')
+        self.assertEqual(split.get('payee', ''), '')
+        self.assertEqual(split.get('splits'), None)
+        self.assertTrue('status' in split)
+        self.assertFalse('payee' in split)
+        with self.assertRaises(KeyError):
+            split['payee']
+        self.assertEqual(dict(split), {'account': self.checking, 'amount': Fraction('-1.5'), 'quantity': Fraction('-1.5'), 'status': 'C'})
+        self.assertEqual(split, {'account': self.checking, 'amount': Fraction('-1.5'), 'quantity': Fraction('-1.5'), 'status': 'C'})
+        self.assertEqual(split.pop('status'), 'C')
+        self.assertEqual(len(split), 3)
+        self.assertEqual(t.get_status(self.checking), '')
+        split['description'] = 'something'
+        self.assertEqual(split.description, 'something')
+        with self.assertRaises(bb.InvalidTransactionError):
+            split['other'] = 1
+
     def test_init(self):
         payee = bb.Payee('payee 1')
         splits = [{'account': self.checking, 'amount': '100', 'status': 'c'},
@@ -587,7 +683,8 @@ class TestBudget(unittest.TestCase):
             )
 
 
-TABLES = ['commodity_types', 'commodities', 'institutions', 'account_types', 'accounts', 'budgets', 'budget_values', 'payees', 'scheduled_transaction_frequencies', 'scheduled_transactions', 'scheduled_transaction_splits', 'transaction_actions', 'transactions', 'transaction_splits', 'misc', 'bookmarked_accounts', 'preferences']
+TABLES = ['commodity_types', 'commodities', 'institutions', 'account_types', 'accounts', 'budgets', 'budget_values', 'payees', 'scheduled_transaction_frequencies', 'scheduled_transactions', 'scheduled_transaction_splits', 'transaction_actions', 'transactions', 'transaction_splits', 'misc', 'bookmarked_accounts', 'preferences', 'account_balances']
+INDEXES = ['transaction_split_txn_id_index', 'transaction_split_account_txn_index', 'transaction_date_index', 'account_parent_id_index']
 
 
 class TestSQLiteStorage(unittest.TestCase):
@@ -646,7 +743,7 @@ class TestSQLiteStorage(unittest.TestCase):
             storage._db_connection.close()
             self.assertEqual(tables, TABLES)
 
-    def test_migrate_v1_to_v2(self):
+    def test_migrate_from_v1(self):
         with tempfile.TemporaryDirectory() as tmp:
             file_name = os.path.join(tmp, 'test.sqlite3')
 
@@ -666,15 +763,50 @@ class TestSQLiteStorage(unittest.TestCase):
             # Initialize SQLiteStorage
             storage = bb.SQLiteStorage(file_name)
 
-            # Verify that it migrated to v2
+            # Verify that it migrated through all the versions
             result = storage._db_connection.execute('SELECT value FROM misc WHERE key = ?', ('schema_version',)).fetchone()
-            self.assertEqual(result[0], 2)
+            self.assertEqual(result[0], bb.SQLiteStorage.SCHEMA_VERSION)
 
             tables = storage._tables()
             self.assertEqual(tables, TABLES)
+            indexes = [r[0] for r in storage._db_connection.execute('SELECT name FROM sqlite_master WHERE type="index" AND sql IS NOT NULL').fetchall()]
+            self.assertEqual(sorted(indexes), sorted(INDEXES))
 
             storage._db_connection.close()
 
+    def test_migrate_populates_account_balances(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'test.sqlite3')
+            storage = bb.SQLiteStorage(file_name)
+            checking = get_test_account()
+            storage.save_account(checking)
+            savings = get_test_account(name='Savings')
+            storage.save_account(savings)
+            storage.save_txn(bb.Transaction(txn_date=date(2017, 1, 25), splits=[{'account': checking, 'amount': '101'}, {'account': savings, 'amount': '-101'}]))
+            #set the DB back to version 3
+            storage._db_connection.execute('DROP TABLE account_balances')
+            storage._db_connection.execute("UPDATE misc SET value = 3 WHERE key = 'schema_version'")
+            storage._db_connection.close()
+
+            storage = bb.SQLiteStorage(file_name)
+            self.assertEqual(storage.get_account_balances()[checking.id].total, 101)
+            self.assertEqual(storage.get_account_balances()[savings.id].total, -101)
+            storage._db_connection.close()
+
+    def test_query_plans_use_indexes(self):
+        c = self.storage._db_connection
+        queries = [
+            ('SELECT transaction_id FROM transaction_splits WHERE account_id = ?', (1,), 'COVERING INDEX transaction_split_account_txn_index'),
+            ('SELECT transaction_splits.value_numerator, transaction_splits.value_denominator FROM transaction_splits INNER JOIN transactions ON transaction_splits.transaction_id = transactions.id WHERE transaction_splits.account_id = ? AND transactions.date > ? AND transactions.date < ?',
+                (1, '2018-01-01', '2018-12-31'), 'INDEX transaction_split_account_txn_index'),
+            ('SELECT id FROM transactions WHERE date > ? AND date < ?', ('2018-01-01', '2018-12-31'), 'COVERING INDEX transaction_date_index'),
+            ('SELECT id FROM accounts WHERE closed = ? AND parent_id = ? ORDER BY number, name', (0, 1), 'INDEX account_parent_id_index'),
+            ('SELECT id, name, notes FROM payees WHERE name = ?', ('name',), 'INDEX sqlite_autoindex_payees_1'),
+        ]
+        for query, params, index in queries:
+            plan = ' '.join(r[3] for r in c.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall())
+            self.assertIn(index, plan, msg=query)
+
     def test_commodity_sqlite_checks(self):
         c = self.storage._db_connection.cursor()
         with self.assertRaises(sqlite3.IntegrityError) as cm:
@@ -1482,6 +1614,64 @@ class TestSQLiteStorage(unittest.TestCase):
                 [(1, txn_id, checking.id, -101, 1, -101, 1, '', '', '', None),
                  (2, txn_id, another_acct.id, 101, 1, 101, 1, '', '', '', None)])
 
+    def test_save_txns(self):
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.storage.save_account(savings)
+        existing_payee = bb.Payee('Existing')
+        self.storage.save_payee(existing_payee)
+        existing_txn = bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': '-5'}, {'account': savings, 'amount': '5'}])
+        self.storage.save_txn(existing_txn)
+        existing_txn.description = 'updated'
+        txns = [existing_txn]
+        for i in range(1, 4):
+            txns.append(bb.Transaction(txn_date=date(2017, 2, i), description=f'txn {i}', entry_date=date(2017, 3, 1),
+                splits=[{'account': checking, 'amount': -i, 'status': 'C'}, {'account': savings, 'amount': i, 'payee': 'New Payee'}]))
+        txns.append(bb.Transaction(txn_date=date(2017, 2, 4), alternate_id='alt',
+            splits=[{'account': checking, 'amount': '-1.5'}, {'account': savings, 'amount': '1.5', 'payee': bb.Payee('Existing')}]))
+        statements = []
+        self.storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        ids = self.storage.save_txns(txns)
+        self.storage._db_connection.set_trace_callback(None)
+        self.assertEqual(ids, [existing_txn.id, 2, 3, 4, 5])
+        self.assertEqual([t.id for t in txns], ids)
+        self.assertEqual(len([s for s in statements if s == 'COMMIT']), 1)
+        self.assertEqual(txns[1].splits[1]['payee'].id, txns[2].splits[1]['payee'].id)
+        self.assertEqual(txns[4].splits[1]['payee'].id, existing_payee.id)
+        self.assertEqual(len(self.storage.get_payees()), 2)
+        db_txns = self.storage.get_transactions(checking.id)
+        self.assertEqual([t.id for t in db_txns], ids)
+        self.assertEqual(db_txns[0].description, 'updated')
+        self.assertEqual(db_txns[1].description, 'txn 1')
+        self.assertEqual(db_txns[1].entry_date, date(2017, 3, 1))
+        self.assertEqual(db_txns[1].splits[0]['status'], 'C')
+        self.assertEqual(db_txns[3].splits[1]['payee'].name, 'New Payee')
+        self.assertEqual(db_txns[4].alternate_id, 'alt')
+        self.assertEqual(db_txns[4].entry_date, date.today())
+        self.assertEqual(db_txns[4].splits[0]['amount'], Fraction(-3, 2))
+
+    def test_save_txns_rollback(self):
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.storage.save_account(savings)
+        good_txn = bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': '-5'}, {'account': savings, 'amount': '5', 'payee': 'Payee'}])
+        bad_txn = bb.Transaction(txn_date=date(2017, 1, 2), splits=[{'account': checking, 'amount': '-5'}, {'account': get_test_account(id_=50, name='Nonexistent'), 'amount': '5'}])
+        with self.assertRaises(bb.SQLiteStorageError):
+            self.storage.save_txns([good_txn, bad_txn])
+        self.assertEqual(good_txn.id, None)
+        self.assertEqual(good_txn.splits[1]['payee'].id, None)
+        c = self.storage._db_connection.cursor()
+        self.assertEqual(c.execute('SELECT * FROM transactions').fetchall(), [])
+        self.assertEqual(c.execute('SELECT * FROM transaction_splits').fetchall(), [])
+        self.assertEqual(c.execute('SELECT * FROM payees').fetchall(), [])
+        unbalanced_txn = bb.Transaction(txn_date=date(2017, 1, 2), splits=[{'account': checking, 'amount': '-5'}, {'account': savings, 'amount': '5'}])
+        unbalanced_txn.splits[1]['amount'] = Fraction(4)
+        with self.assertRaises(bb.InvalidTransactionError):
+            self.storage.save_txns([good_txn, unbalanced_txn])
+        self.assertEqual(c.execute('SELECT * FROM transactions').fetchall(), [])
+
     def test_get_txn(self):
         checking = get_test_account()
         self.storage.save_account(checking)
@@ -1501,6 +1691,103 @@ class TestSQLiteStorage(unittest.TestCase):
         self.assertEqual(txn.splits[0], {'account': checking, 'amount': -100, 'quantity': -100, 'type': '1a', 'action': ''})
         self.assertEqual(txn.splits[1], {'account': fund, 'amount': 100, 'quantity': 100, 'type': '', 'action': 'share-buy'})
 
+    def test_get_transactions(self):
+        food = get_test_account(type_=bb.AccountType.EXPENSE, name='Food')
+        self.storage.save_account(food)
+        restaurants = get_test_account(type_=bb.AccountType.EXPENSE, name='Restaurants', parent=food)
+        self.storage.save_account(restaurants)
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        payee = bb.Payee('Some restaurant')
+        self.storage.save_payee(payee)
+        for i in range(1, 11):
+            txn = bb.Transaction(txn_date=date(2017, 1, 11-i), description=f'txn {i}',
+                    splits=[{'account': checking, 'amount': -i, 'status': 'C'}, {'account': restaurants, 'amount': i, 'payee': payee}])
+            self.storage.save_txn(txn)
+        statements = []
+        self.storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        txns = self.storage.get_transactions(account_id=checking.id)
+        self.storage._db_connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 4)
+        self.assertEqual([t.txn_date for t in txns], [date(2017, 1, d) for d in range(1, 11)])
+        self.assertEqual(txns[0].description, 'txn 10')
+        self.assertEqual(txns[0].splits[0], {'account': checking, 'amount': -10, 'quantity': -10, 'type': '', 'action': '', 'status': 'C'})
+        self.assertEqual(txns[0].splits[1]['account'], restaurants)
+        self.assertEqual(txns[0].splits[1]['account'].parent, food)
+        self.assertEqual(txns[0].splits[1]['account'].commodity.code, 'USD')
+        self.assertEqual(txns[0].splits[1]['payee'].name, 'Some restaurant')
+        self.assertEqual(self.storage.get_transactions(account_id=food.id), [])
+
+    def test_get_transactions_filters(self):
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        food = get_test_account(type_=bb.AccountType.EXPENSE, name='Food')
+        self.storage.save_account(food)
+        savings = get_test_account(name='Savings')
+        self.storage.save_account(savings)
+        txn1 = bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': -5, 'status': 'C'}, {'account': food, 'amount': 5, 'payee': 'Crème Brûlée Café'}])
+        txn2 = bb.Transaction(txn_date=date(2017, 2, 1), description='ÉCLAIRS', splits=[{'account': checking, 'amount': -5}, {'account': food, 'amount': 5}])
+        txn3 = bb.Transaction(txn_date=date(2017, 3, 1), splits=[{'account': checking, 'amount': -5, 'status': 'R'}, {'account': savings, 'amount': 5}])
+        self.storage.save_txns([txn1, txn2, txn3])
+        def txn_ids(**kwargs):
+            return [t.id for t in self.storage.get_transactions(account_id=checking.id, **kwargs)]
+        self.assertEqual(txn_ids(), [txn1.id, txn2.id, txn3.id])
+        self.assertEqual(txn_ids(filter_account_id=food.id), [txn1.id, txn2.id])
+        self.assertEqual(txn_ids(status='R'), [txn3.id])
+        self.assertEqual(txn_ids(query='BRÛLÉE'), [txn1.id])
+        self.assertEqual(txn_ids(query='éclair'), [txn2.id])
+        self.assertEqual(txn_ids(query='nothing'), [])
+        self.assertEqual(txn_ids(start_date=date(2017, 2, 1)), [txn2.id, txn3.id])
+        self.assertEqual(txn_ids(end_date=date(2017, 2, 1)), [txn1.id, txn2.id])
+        self.assertEqual(txn_ids(start_date=date(2017, 1, 15), end_date=date(2017, 2, 15), filter_account_id=food.id), [txn2.id])
+
+    def test_identity_map_cache(self):
+        food = get_test_account(type_=bb.AccountType.EXPENSE, name='Food')
+        self.storage.save_account(food)
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        payee = bb.Payee('Some restaurant')
+        self.storage.save_payee(payee)
+        for i in range(1, 4):
+            txn = bb.Transaction(txn_date=date(2017, 1, i), splits=[{'account': checking, 'amount': -i}, {'account': food, 'amount': i, 'payee': payee}])
+            self.storage.save_txn(txn)
+        txns = self.storage.get_transactions(account_id=checking.id)
+        self.assertIs(txns[0].splits[1]['account'], txns[2].splits[1]['account'])
+        self.assertIs(txns[0].splits[1]['payee'], txns[2].splits[1]['payee'])
+        self.assertEqual(self.storage.cache_info()['accounts']['size'], 2)
+        statements = []
+        self.storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        txns2 = self.storage.get_transactions(account_id=checking.id)
+        self.storage._db_connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 2) #only the txns and splits queries - accounts & payees are cached
+        self.assertIs(txns2[0].splits[0]['account'], txns[0].splits[0]['account'])
+        self.assertIs(self.storage.get_account(checking.id), txns[0].splits[0]['account'])
+        self.assertIs(self.storage.get_account(name='Food'), txns[0].splits[1]['account'])
+        info = self.storage.cache_info()
+        self.assertEqual(info['accounts']['hits'], 4)
+        self.assertEqual(info['payees']['hits'], 1)
+        #saving an account invalidates the cached accounts
+        food.name = 'Groceries'
+        self.storage.save_account(food)
+        self.assertEqual(self.storage.cache_info()['accounts']['size'], 0)
+        self.assertEqual(self.storage.get_account(food.id).name, 'Groceries')
+        #saving a payee invalidates it
+        payee.notes = 'some notes'
+        self.storage.save_payee(payee)
+        self.assertEqual(self.storage.get_payee(payee.id).notes, 'some notes')
+        #saving a commodity invalidates commodities & accounts
+        self.storage.get_account(checking.id)
+        self.storage.save_commodity(bb.Commodity(type_=bb.CommodityType.CURRENCY, code='EUR', name='Euro'))
+        self.assertEqual(self.storage.cache_info()['commodities']['size'], 0)
+        self.assertEqual(self.storage.cache_info()['accounts']['size'], 0)
+        #deleting an account invalidates the cached accounts
+        other = get_test_account(name='Other')
+        self.storage.save_account(other)
+        self.storage.get_account(other.id)
+        self.storage.delete_account(other.id)
+        with self.assertRaises(Exception):
+            self.storage.get_account(other.id)
+
     def test_delete_txn_from_db(self):
         checking = get_test_account()
         self.storage.save_account(checking)
@@ -1522,6 +1809,44 @@ class TestSQLiteStorage(unittest.TestCase):
         self.assertEqual(len(txn_splits_records), 2)
         self.assertEqual([r[0] for r in txn_splits_records], [txn2.id, txn2.id])
 
+    def test_account_balances(self):
+        checking = get_test_account()
+        self.storage.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.storage.save_account(savings)
+        fund = get_test_account(type_=bb.AccountType.SECURITY, name='Fund')
+        self.storage.save_account(fund)
+        txn1 = bb.Transaction(txn_date=date(2017, 1, 25),
+                splits=[{'account': checking, 'amount': '101', 'status': 'R'}, {'account': savings, 'amount': '-101'}])
+        self.storage.save_txn(txn1)
+        txn2 = bb.Transaction(txn_date=date(2017, 1, 28),
+                splits=[{'account': checking, 'amount': '-46.23', 'status': 'C'}, {'account': fund, 'amount': '46.23', 'quantity': '1/3'}])
+        txn3 = bb.Transaction(txn_date=date(2017, 1, 20),
+                splits=[{'account': checking, 'amount': '-1'}, {'account': savings, 'amount': '1'}])
+        self.storage.save_txns([txn2, txn3])
+        balances = self.storage.get_account_balances()
+        self.assertEqual(balances[checking.id], bb.AccountBalances(total=Fraction('53.77'), cleared=Fraction('54.77'), reconciled=Fraction(101), last_txn_date=date(2017, 1, 28)))
+        self.assertEqual(balances[savings.id], bb.AccountBalances(total=Fraction(-100), cleared=Fraction(0), reconciled=Fraction(0), last_txn_date=date(2017, 1, 25)))
+        self.assertEqual(balances[fund.id].total, Fraction(1, 3))
+        #editing a txn moves its splits between accounts
+        txn2 = bb.Transaction(id_=txn2.id, txn_date=date(2017, 1, 10),
+                splits=[{'account': checking, 'amount': '-46.23'}, {'account': savings, 'amount': '46.23'}])
+        self.storage.save_txn(txn2)
+        balances = self.storage.get_account_balances()
+        self.assertEqual(balances[checking.id], bb.AccountBalances(total=Fraction('53.77'), cleared=Fraction(101), reconciled=Fraction(101), last_txn_date=date(2017, 1, 25)))
+        self.assertEqual(balances[savings.id].total, Fraction('-53.77'))
+        self.assertEqual(balances[fund.id], bb.AccountBalances(total=Fraction(0), cleared=Fraction(0), reconciled=Fraction(0), last_txn_date=None))
+        self.storage.delete_txn(txn1.id)
+        balances = self.storage.get_account_balances([checking.id])
+        self.assertEqual(balances, {checking.id: bb.AccountBalances(total=Fraction('-47.23'), cleared=Fraction(0), reconciled=Fraction(0), last_txn_date=date(2017, 1, 20))})
+        #recover from drift
+        self.storage._db_connection.execute('UPDATE account_balances SET total_numerator = 5, total_denominator = 1')
+        self.storage.rebuild_balances()
+        self.assertEqual(self.storage.get_account_balances(), {
+            checking.id: bb.AccountBalances(total=Fraction('-47.23'), cleared=Fraction(0), reconciled=Fraction(0), last_txn_date=date(2017, 1, 20)),
+            savings.id: bb.AccountBalances(total=Fraction('47.23'), cleared=Fraction(0), reconciled=Fraction(0), last_txn_date=date(2017, 1, 20)),
+        })
+
     def test_save_budget(self):
         housing = get_test_account(type_=bb.AccountType.EXPENSE, name='Housing')
         self.storage.save_account(housing)
@@ -1719,9 +2044,30 @@ class TestSQLiteStorage(unittest.TestCase):
         self.storage.save_budget(b)
         b2 = bb.Budget(year=2019)
         self.storage.save_budget(b2)
+        for name in ['Housing', 'Food', 'Transportation']:
+            self.storage.save_account(get_test_account(type_=bb.AccountType.EXPENSE, name=name))
+        statements = []
+        self.storage._db_connection.set_trace_callback(lambda s: statements.append(s))
         budgets = self.storage.get_budgets()
+        self.storage._db_connection.set_trace_callback(None)
         self.assertEqual(budgets[0].start_date, date(2019, 1, 1))
         self.assertEqual(budgets[1].start_date, date(2018, 1, 1))
+        #budgets & accounts, and then 3 queries for each budget, no matter how many accounts there are
+        self.assertEqual(len(statements), 8)
+
+    def test_get_budget_summaries(self):
+        b = bb.Budget(year=2018)
+        self.storage.save_budget(b)
+        b.name = '2018 budget'
+        self.storage.save_budget(b)
+        self.storage.save_budget(bb.Budget(year=2019))
+        statements = []
+        self.storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        budgets = self.storage.get_budget_summaries()
+        self.storage._db_connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([b.display() for b in budgets], ['2: 2019-01-01 - 2019-12-31', '1: 2018 budget (2018-01-01 - 2018-12-31)'])
+        self.assertEqual(budgets[0].get_budget_data(), {})
 
     def test_get_budget_reports(self):
         housing = get_test_account(type_=bb.AccountType.EXPENSE, name='Housing')
@@ -2004,6 +2350,62 @@ class TestSQLiteStorage(unittest.TestCase):
 
         self.assertEqual(result[0], '%m-%d-%Y')
 
+    def test_connection_profile(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            storage = bb.SQLiteStorage(file_name)
+            self.assertEqual(storage.get_connection_profile(), 'wal')
+            self.assertEqual(storage.get_pragmas(), {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'cache_size': -32000, 'mmap_size': 256 * 2**20})
+            storage.set_connection_profile('rollback')
+            storage.close()
+            #the profile is saved in the file, & applied the next time it's opened
+            storage = bb.SQLiteStorage(file_name)
+            self.assertEqual(storage.get_connection_profile(), 'rollback')
+            self.assertEqual(storage.get_pragmas(), {'journal_mode': 'delete', 'synchronous': 2, 'busy_timeout': 5000, 'cache_size': -2000, 'mmap_size': 0})
+            with self.assertRaises(bb.SQLiteStorageError) as cm:
+                storage.set_connection_profile('fast')
+            self.assertEqual(str(cm.exception), 'invalid connection profile: fast')
+            #a bad stored profile falls back to the default
+            storage.save_preference(bb.SQLiteStorage.CONNECTION_PROFILE_PREFERENCE, 'fast')
+            storage.close()
+            with patch('bricbooks.log') as log_mock:
+                storage = bb.SQLiteStorage(file_name)
+            log_mock.assert_called_once_with('WARNING: invalid connection profile "fast" - using "wal"')
+            self.assertEqual(storage.get_pragmas()['journal_mode'], 'wal')
+            storage.close()
+            #the busy timeout is already set while the DB is set up (or migrated)
+            setup_busy_timeouts = []
+            setup_db = bb.SQLiteStorage._setup_db
+            def _setup_db(storage):
+                setup_busy_timeouts.append(storage._db_connection.execute('PRAGMA busy_timeout').fetchone()[0])
+                setup_db(storage)
+            with patch.object(bb.SQLiteStorage, '_setup_db', _setup_db):
+                bb.SQLiteStorage(os.path.join(tmp, 'new.sqlite3')).close()
+            self.assertEqual(setup_busy_timeouts, [5000])
+
+    def test_read_only(self):
+        with self.assertRaises(bb.SQLiteStorageError) as cm:
+            bb.SQLiteStorage(':memory:', read_only=True)
+        self.assertEqual(str(cm.exception), "can't open :memory: read-only")
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            with self.assertRaises(sqlite3.OperationalError):
+                bb.SQLiteStorage(file_name, read_only=True)
+            self.assertFalse(os.path.exists(file_name))
+            storage = bb.SQLiteStorage(file_name)
+            storage.save_account(get_test_account())
+            read_only_storage = bb.SQLiteStorage(file_name, read_only=True)
+            self.assertEqual(read_only_storage.get_accounts()[0].name, CHECKING)
+            self.assertEqual(read_only_storage.get_pragmas()['journal_mode'], 'wal')
+            with self.assertRaises(bb.SQLiteStorageError) as cm:
+                read_only_storage.save_account(get_test_account(name='Savings'))
+            self.assertEqual(str(cm.exception), 'attempt to write a readonly database')
+            read_only_storage.close()
+            #immutable ignores the WAL file, so it's only for files that aren't open anywhere else
+            storage.close()
+            immutable_storage = bb.SQLiteStorage(file_name, read_only=True, immutable=True)
+            self.assertEqual(immutable_storage.get_accounts()[0].name, CHECKING)
+            immutable_storage.close()
 
 def create_test_accounts(engine):
     accounts = {
@@ -2075,6 +2477,32 @@ class TestEngine(unittest.TestCase):
         self.assertEqual(accounts[4].name, 'Retirement 401k')
         self.assertEqual(accounts[5].name, 'Stock A')
 
+    def test_get_accounts_types(self):
+        create_test_accounts(self.engine)
+        savings = self.engine.get_account(name='Savings')
+        savings.closed = True
+        self.engine.save_account(savings)
+        food = self.engine.get_account(name='Food')
+        self.engine.save_account(account=get_test_account(type_=bb.AccountType.EXPENSE, name='Groceries', parent=food))
+        self.engine._storage._accounts.clear()
+        statements = []
+        self.engine._storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        accounts = self.engine.get_accounts(types=[bb.AccountType.EXPENSE, bb.AccountType.ASSET])
+        self.engine._storage._db_connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 1)
+        self.assertEqual([(a.type, a.name, a.child_level) for a in accounts], [
+            (bb.AccountType.EXPENSE, 'Food', 0),
+            (bb.AccountType.EXPENSE, 'Groceries', 1),
+            (bb.AccountType.EXPENSE, 'Housing', 0),
+            (bb.AccountType.EXPENSE, 'Mortgage Interest', 1),
+            (bb.AccountType.ASSET, 'Bank Accounts', 0),
+            (bb.AccountType.ASSET, 'Checking', 1), #Savings is closed, so it & its child aren't included
+            (bb.AccountType.ASSET, 'Retirement 401k', 0),
+            (bb.AccountType.SECURITY, 'Stock A', 1),
+        ])
+        self.assertIs(accounts[1].parent, accounts[0])
+        self.assertIs(accounts[7].parent, accounts[6])
+
     def test_bookmarked_accounts(self):
         create_test_accounts(self.engine)
         accounts = self.engine.get_accounts()
@@ -2170,12 +2598,281 @@ class TestEngine(unittest.TestCase):
         txns = self.engine.get_transactions(account=checking, query='some payee')
         self.assertEqual(len(txns), 1)
         self.assertEqual(txns[0].splits[1]['payee'].name, 'Some payee')
+        txns = self.engine.get_transactions(account=checking, query='DESCRIPT')
+        self.assertEqual(len(txns), 1)
+        self.assertEqual(txns[0].description, 'description')
+        self.assertEqual(self.engine.get_transactions(account=savings, query='some payee'), [])
+        #get txns in a date range
+        txns = self.engine.get_transactions(account=checking, start_date=date(2017, 1, 15), end_date=date(2018, 2, 3))
+        self.assertEqual([t.txn_date for t in txns], [date(2017, 1, 15), date(2018, 2, 3)])
+        self.assertFalse(hasattr(txns[0], 'balance'))
+        txns = self.engine.get_transactions(account=checking, start_date=date(2018, 1, 1))
+        self.assertEqual(len(txns), 2)
+        txns = self.engine.get_transactions(account=checking, end_date=date(2017, 12, 31), filter_account=food, status=bb.Transaction.CLEARED)
+        self.assertEqual(len(txns), 1)
         #security ledger
         txns = self.engine.get_transactions(account=stock)
         self.assertEqual(len(txns), 2)
         self.assertEqual(txns[0].balance, Fraction('5.23'))
         self.assertEqual(txns[1].balance, Fraction('11.94'))
 
+    def test_get_transactions_page(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        savings = get_test_account(name='Savings')
+        self.engine.save_account(account=savings)
+        txns = []
+        for i in range(1, 8):
+            #two txns per date, and saved out of date order
+            txn_date = date(2017, 1, 10 - (i+1) // 2)
+            txns.append(bb.Transaction(txn_date=txn_date, splits=[{'account': checking, 'amount': i}, {'account': savings, 'amount': -i}]))
+        self.engine.save_transactions(txns)
+        all_txns = list(reversed(self.engine.get_transactions(account=checking)))
+        page, more_txns = self.engine.get_transactions_page(checking, limit=3)
+        self.assertTrue(more_txns)
+        self.assertEqual([t.id for t in page], [t.id for t in all_txns[:3]])
+        self.assertEqual([t.balance for t in page], [t.balance for t in all_txns[:3]])
+        page, more_txns = self.engine.get_transactions_page(checking, limit=3, before=(page[-1].txn_date, page[-1].id))
+        self.assertTrue(more_txns)
+        self.assertEqual([t.id for t in page], [t.id for t in all_txns[3:6]])
+        self.assertEqual([t.balance for t in page], [t.balance for t in all_txns[3:6]])
+        page, more_txns = self.engine.get_transactions_page(checking, limit=3, before=(page[-1].txn_date, page[-1].id))
+        self.assertFalse(more_txns)
+        self.assertEqual([t.id for t in page], [all_txns[6].id])
+        self.assertEqual(page[0].balance, all_txns[6].balance)
+        self.assertEqual(self.engine.get_transactions_page(savings, limit=10, before=(date(2000, 1, 1), 1)), ([], False))
+        #only aggregate queries are used for the balance before the page
+        statements = []
+        self.engine._storage._db_connection.set_trace_callback(lambda s: statements.append(s))
+        self.engine.get_transactions_page(checking, limit=2, before=(all_txns[1].txn_date, all_txns[1].id))
+        self.engine._storage._db_connection.set_trace_callback(None)
+        self.assertEqual(len(statements), 4)
+
+    def test_get_balance(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        fund = get_test_account(type_=bb.AccountType.SECURITY, name='Fund')
+        self.engine.save_account(account=fund)
+        self.engine.save_transactions([
+            bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': '-10.5', 'status': 'C'}, {'account': fund, 'amount': '10.5', 'quantity': '1.3'}]),
+            bb.Transaction(txn_date=date(2017, 1, 2), splits=[{'account': checking, 'amount': '-0.25', 'status': 'R'}, {'account': fund, 'amount': '0.25', 'quantity': '0.001'}]),
+            bb.Transaction(txn_date=date(2017, 1, 3), splits=[{'account': checking, 'amount': '-3'}, {'account': fund, 'amount': '3', 'quantity': '1'}]),
+        ])
+        storage = self.engine._storage
+        self.assertEqual(storage.get_balance(checking.id), Fraction('-13.75'))
+        self.assertEqual(storage.get_balance(checking.id, end_date=date(2017, 1, 2)), Fraction('-10.75'))
+        self.assertEqual(storage.get_balance(checking.id, statuses=['R']), Fraction('-0.25'))
+        self.assertEqual(storage.get_balance(checking.id, before=(date(2017, 1, 2), 2)), Fraction('-10.5'))
+        self.assertEqual(storage.get_balance(fund.id, balance_field='quantity'), Fraction('2.301'))
+
+    def test_get_running_balances(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        fund = get_test_account(type_=bb.AccountType.SECURITY, name='Fund')
+        self.engine.save_account(account=fund)
+        self.engine.save_transactions([
+            bb.Transaction(txn_date=date(2017, 1, 3), splits=[{'account': checking, 'amount': '-3'}, {'account': fund, 'amount': '3', 'quantity': '1/3'}]),
+            bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': '-10.5', 'status': 'C'}, {'account': fund, 'amount': '10.5', 'quantity': '1.3'}]),
+            bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': '-0.25', 'status': 'R'}, {'account': fund, 'amount': '0.25', 'quantity': '2/7'}]),
+        ])
+        storage = self.engine._storage
+        self.assertEqual(storage.get_running_balances(checking.id), {
+            2: (Fraction('-10.5'), Fraction('-10.5')),
+            3: (Fraction('-10.75'), Fraction('-10.75')),
+            1: (Fraction('-13.75'), Fraction('-10.75')),
+        })
+        expected_quantities = {2: Fraction('1.3'), 3: Fraction('1.3') + Fraction(2, 7), 1: Fraction('1.3') + Fraction(2, 7) + Fraction(1, 3)}
+        self.assertEqual({k: v[0] for k, v in storage.get_running_balances(fund.id, balance_field='quantity').items()}, expected_quantities)
+        #too big a common denominator to sum in SQL - falls back to summing in python
+        with patch.object(bb.SQLiteStorage, 'MAX_COMMON_DENOMINATOR', 10):
+            self.assertEqual({k: v[0] for k, v in storage.get_running_balances(fund.id, balance_field='quantity').items()}, expected_quantities)
+        self.assertEqual([(t.id, t.balance) for t in self.engine.get_transactions(account=checking)],
+                [(2, Fraction('-10.5')), (3, Fraction('-10.75')), (1, Fraction('-13.75'))])
+        self.assertEqual([t.balance for t in self.engine.get_transactions(account=fund)], list(expected_quantities.values()))
+        #a big numerator overflows when it's scaled to the common denominator - falls back to summing in python
+        savings = get_test_account(name='Savings')
+        self.engine.save_account(account=savings)
+        big_amount = 9 * 10**18
+        self.engine.save_transactions([
+            bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': -big_amount}, {'account': savings, 'amount': big_amount}]),
+            bb.Transaction(txn_date=date(2017, 1, 2), splits=[{'account': checking, 'amount': big_amount}, {'account': savings, 'amount': -big_amount}]),
+            bb.Transaction(txn_date=date(2017, 1, 3), splits=[{'account': checking, 'amount': '-0.1'}, {'account': savings, 'amount': '0.1'}]),
+        ])
+        self.assertEqual(list(storage.get_running_balances(savings.id).values()),
+                [(big_amount, 0), (0, 0), (Fraction('0.1'), 0)])
+
+    def test_get_budget_monthly_matrix(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        housing = get_test_account(type_=bb.AccountType.EXPENSE, name='Housing')
+        self.engine.save_account(account=housing)
+        food = get_test_account(type_=bb.AccountType.EXPENSE, name='Food')
+        self.engine.save_account(account=food)
+        wages = get_test_account(type_=bb.AccountType.INCOME, name='Wages')
+        self.engine.save_account(account=wages)
+        budget = bb.Budget(start_date=date(2018, 1, 16), end_date=date(2018, 3, 31), account_budget_info={
+            housing: {'amount': 75},
+            wages: {'amount': 150},
+        })
+        self.engine.save_budget(budget)
+        self.engine.save_transactions([
+            bb.Transaction(txn_date=date(2018, 1, 16), splits=[{'account': checking, 'amount': -10}, {'account': housing, 'amount': 10}]),
+            bb.Transaction(txn_date=date(2018, 1, 31), splits=[{'account': checking, 'amount': '-2.5'}, {'account': housing, 'amount': '2.5'}]),
+            bb.Transaction(txn_date=date(2018, 3, 2), splits=[{'account': checking, 'amount': 1}, {'account': housing, 'amount': -1}]),
+            bb.Transaction(txn_date=date(2018, 2, 1), splits=[{'account': checking, 'amount': 50}, {'account': wages, 'amount': -50}]),
+            bb.Transaction(txn_date=date(2018, 4, 1), splits=[{'account': checking, 'amount': -20}, {'account': food, 'amount': 20}]),
+            bb.Transaction(txn_date=date(2018, 3, 31), splits=[{'account': checking, 'amount': -7}, {'account': food, 'amount': 7}]),
+        ])
+        budget = self.engine.get_budget(budget.id)
+        matrix = self.engine.get_budget_monthly_matrix(budget)
+        self.assertEqual(matrix['months'], ['2018-01', '2018-02', '2018-03'])
+        self.assertEqual([r['account'] for r in matrix['expense']], [food, housing])
+        housing_row = matrix['expense'][1]
+        #75 days in the budget period: 16 in Jan, 28 in Feb, 31 in Mar
+        self.assertEqual(housing_row['budget'], {'2018-01': 16, '2018-02': 28, '2018-03': 31})
+        #txns on the budget's start & end dates aren't counted, same as in the budget report
+        self.assertEqual(housing_row['actual'], {'2018-01': Fraction('2.5'), '2018-02': 0, '2018-03': -1})
+        self.assertEqual(matrix['expense'][0]['actual'], {'2018-01': 0, '2018-02': 0, '2018-03': 0})
+        self.assertEqual(matrix['income'][0]['account'], wages)
+        self.assertEqual(matrix['income'][0]['budget'], {'2018-01': 32, '2018-02': 56, '2018-03': 62})
+        self.assertEqual(matrix['income'][0]['actual'], {'2018-01': 0, '2018-02': 50, '2018-03': 0})
+        #the matrix totals match the budget's income & spending
+        for row in matrix['expense']:
+            info = budget._income_spending_info[row['account']]
+            self.assertEqual(sum(row['actual'].values()), info['spent'] - info['income'])
+        for row in matrix['income']:
+            info = budget._income_spending_info[row['account']]
+            self.assertEqual(sum(row['actual'].values()), info['income'] - info['spent'])
+
+    def test_transaction_cache(self):
+        engine = bb.Engine(':memory:', txn_cache_size=2)
+        checking = get_test_account()
+        engine.save_account(account=checking)
+        savings = get_test_account(name='Savings')
+        engine.save_account(account=savings)
+        txns = [bb.Transaction(txn_date=date(2017, 1, i), splits=[{'account': checking, 'amount': -i}, {'account': savings, 'amount': i}]) for i in range(1, 4)]
+        ids = engine.save_transactions(txns)
+        txn1 = engine.get_transaction(ids[0])
+        self.assertEqual(engine.get_transaction(ids[0]).splits, txn1.splits)
+        self.assertEqual(engine.cache_info()['transactions'], {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'max_size': 2})
+        engine.get_transaction(ids[1])
+        engine.get_transaction(ids[0]) #txn 1 is now the most recently used, so txn 2 is evicted
+        engine.get_transaction(ids[2])
+        self.assertEqual(engine.cache_info()['transactions'], {'hits': 2, 'misses': 3, 'evictions': 1, 'size': 2, 'max_size': 2})
+        #changes to a txn don't show up in the cache unless the txn is saved
+        txn1.update_reconciled_state(checking)
+        self.assertEqual(txn1.get_status(checking), bb.Transaction.CLEARED)
+        self.assertEqual(engine.get_transaction(ids[0]).get_status(checking), '')
+        #saving & deleting txns invalidates them
+        edited_txn = bb.Transaction(id_=ids[0], txn_date=date(2017, 2, 1), splits=[{'account': checking, 'amount': -5}, {'account': savings, 'amount': 5}])
+        engine.save_transaction(edited_txn)
+        self.assertEqual(engine.get_transaction(ids[0]).txn_date, date(2017, 2, 1))
+        engine.delete_transaction(ids[2])
+        with self.assertRaises(bb.InvalidTransactionError):
+            engine.get_transaction(ids[2])
+        #so does editing an account
+        savings.name = 'New Savings'
+        engine.save_account(account=savings)
+        self.assertEqual(engine.cache_info()['transactions']['size'], 0)
+        self.assertEqual(engine.get_transaction(ids[0]).splits[1]['account'].name, 'New Savings')
+        engine._storage._db_connection.close()
+
+    def test_backup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            engine = bb.Engine(file_name)
+            checking = get_test_account()
+            engine.save_account(account=checking)
+            savings = get_test_account(name='Savings')
+            engine.save_account(account=savings)
+            txns = [bb.Transaction(txn_date=date(2017, 1, 1), description='a' * 1000, splits=[{'account': checking, 'amount': -i}, {'account': savings, 'amount': i}]) for i in range(1, 101)]
+            engine.save_transactions(txns)
+            progress = []
+            backup_file_name = os.path.join(tmp, 'backup.sqlite3')
+            engine.backup(backup_file_name, pages_per_step=10, progress=lambda copied, total: progress.append((copied, total)))
+            engine.close()
+            self.assertTrue(len(progress) > 1)
+            self.assertEqual(progress[-1][0], progress[-1][1])
+            backup_engine = bb.Engine(backup_file_name)
+            self.assertEqual(len(backup_engine.get_transactions(account=checking)), 100)
+            backup_engine.close()
+
+    def test_backup_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            engine = bb.Engine(file_name)
+            engine.save_account(account=get_test_account())
+            engine.close()
+            backup_dir = os.path.join(tmp, 'backups')
+            os.mkdir(backup_dir)
+            for timestamp in ['20200101000000', '20200102000000', '20200103000000']:
+                shutil.copy(file_name, os.path.join(backup_dir, f'data-{timestamp}.sqlite3'))
+            other_file = os.path.join(backup_dir, 'data-other.sqlite3')
+            shutil.copy(file_name, other_file)
+            backup_path = bb.backup_file(file_name, backup_dir, keep=2)
+            self.assertEqual(sorted(os.listdir(backup_dir)), ['data-20200103000000.sqlite3', backup_path.name, 'data-other.sqlite3'])
+            backup_engine = bb.Engine(str(backup_path))
+            self.assertEqual(backup_engine.get_accounts()[0].name, CHECKING)
+            backup_engine.close()
+            with self.assertRaises(ValueError):
+                bb.backup_file(file_name, backup_dir, keep=0)
+            self.assertEqual(len(os.listdir(backup_dir)), 3)
+            time.sleep(1) #the backup file names have the time to the second
+            backup_path = bb.backup_file(file_name, backup_dir, keep=1)
+            self.assertEqual(sorted(os.listdir(backup_dir)), [backup_path.name, 'data-other.sqlite3'])
+
+    def test_has_external_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            engine = bb.Engine(file_name)
+            other_engine = bb.Engine(file_name)
+            checking = get_test_account()
+            engine.save_account(account=checking)
+            savings = get_test_account(name='Savings')
+            engine.save_account(account=savings)
+            txn = bb.Transaction(txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': -1}, {'account': savings, 'amount': 1}])
+            engine.save_transaction(txn)
+            #the engine's own changes don't count
+            self.assertFalse(engine.has_external_changes())
+            self.assertEqual(engine.get_transaction(txn.id).splits[0]['amount'], -1)
+            self.assertTrue(other_engine.has_external_changes())
+            self.assertFalse(other_engine.has_external_changes())
+            #another connection edits the txn & an account
+            edited_txn = bb.Transaction(id_=txn.id, txn_date=date(2017, 1, 1), splits=[{'account': checking, 'amount': -5}, {'account': savings, 'amount': 5}])
+            other_engine.save_transaction(edited_txn)
+            other_savings = other_engine.get_account(id_=savings.id)
+            other_savings.name = 'New Savings'
+            other_engine.save_account(account=other_savings)
+            #the engine's cached data is stale until it checks for changes
+            self.assertEqual(engine.get_transaction(txn.id).splits[0]['amount'], -1)
+            self.assertTrue(engine.has_external_changes())
+            self.assertEqual(engine.cache_info()['transactions']['size'], 0)
+            self.assertEqual(engine.cache_info()['accounts']['size'], 0)
+            self.assertFalse(engine.has_external_changes())
+            txn = engine.get_transaction(txn.id)
+            self.assertEqual(txn.splits[0]['amount'], -5)
+            self.assertEqual(txn.splits[1]['account'].name, 'New Savings')
+            engine._storage._db_connection.close()
+            other_engine._storage._db_connection.close()
+
+    def test_save_transactions(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        savings = get_test_account(name='Savings')
+        self.engine.save_account(account=savings)
+        txns = [bb.Transaction(txn_date=date(2017, 1, i), splits=[{'account': checking, 'amount': -i}, {'account': savings, 'amount': i}]) for i in range(1, 6)]
+        ids = self.engine.save_transactions(txns)
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        ledger_txns = self.engine.get_transactions(account=checking)
+        self.assertEqual([t.id for t in ledger_txns], ids)
+        self.assertEqual(ledger_txns[-1].balance, -15)
+        #update an existing txn with a new payee
+        txns[0].splits[1]['payee'] = bb.Payee('New Payee')
+        self.engine.save_transactions([txns[0]])
+        self.assertEqual(txns[0].splits[1]['payee'].id, 1)
+        txn = self.engine._storage.get_txn(txns[0].id)
+        self.assertEqual(txn.splits[1]['payee'].name, 'New Payee')
+
     def test_get_current_balances_for_display(self):
         create_test_accounts(self.engine)
         checking = self.engine.get_account(name='Checking')
@@ -2211,6 +2908,22 @@ class TestEngine(unittest.TestCase):
         expected_stock_balances = bb.LedgerBalances(current='12.75', current_cleared='5.25')
         self.assertEqual(stock_balances, expected_stock_balances)
 
+    def test_get_current_account_balances(self):
+        create_test_accounts(self.engine)
+        checking = self.engine.get_account(name='Checking')
+        savings = self.engine.get_account(name='Savings')
+        stock = self.engine.get_account(name='Stock A')
+        self.engine.save_transactions([
+                bb.Transaction(splits=[{'account': checking, 'amount': -50}, {'account': stock, 'amount': 50, 'quantity': Fraction('5.25')}], txn_date=date(2017, 1, 15)),
+                bb.Transaction(splits=[{'account': checking, 'amount': -10}, {'account': savings, 'amount': 10}], txn_date=date(2017, 1, 16)),
+                #future txns aren't in the current balances
+                bb.Transaction(splits=[{'account': checking, 'amount': -50}, {'account': stock, 'amount': 50, 'quantity': Fraction(3)}], txn_date=date.today() + timedelta(days=1)),
+            ])
+        balances = self.engine.get_current_account_balances()
+        self.assertEqual(balances[checking.id], -60)
+        self.assertEqual(balances[savings.id], 10)
+        self.assertEqual(balances[stock.id], Fraction('5.25'))
+
     def test_get_scheduled_transactions_due(self):
         create_test_accounts(self.engine)
         checking = self.engine.get_account(name='Checking')
@@ -2300,6 +3013,94 @@ class TestEngine(unittest.TestCase):
         self.assertEqual(report['expense']['accounts'][housing], {'total': 500, 2017: 225, 2018: 150, 2019: 125})
         self.assertEqual(report['expense']['accounts'][food], {'total': 26, 2019: 26})
 
+    def test_report_connection(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = bb.Engine(os.path.join(tmp, 'data.sqlite3'))
+            checking = get_test_account()
+            engine.save_account(account=checking)
+            food = get_test_account(type_=bb.AccountType.EXPENSE, name='Food')
+            engine.save_account(account=food)
+            engine.save_transaction(bb.Transaction(splits=[{'account': checking, 'amount': -26}, {'account': food, 'amount': 26}], txn_date=date(2019, 1, 22)))
+            report = engine.get_income_expense_report()
+            self.assertEqual(report['expense']['accounts'][food], {'total': 26, 2019: 26})
+            #the report uses its own read-only connection
+            self.assertTrue(engine._report_storage.read_only)
+            self.assertIsNot(engine._report_storage, engine._storage)
+            #and picks up changes saved on the main connection
+            food.name = 'Groceries'
+            engine.save_account(account=food)
+            engine.save_transaction(bb.Transaction(splits=[{'account': checking, 'amount': -4}, {'account': food, 'amount': 4}], txn_date=date(2019, 2, 1)))
+            report = engine.get_income_expense_report()
+            account, totals = list(report['expense']['accounts'].items())[0]
+            self.assertEqual(account.name, 'Groceries')
+            self.assertEqual(totals, {'total': 30, 2019: 30})
+            engine.close()
+
+    def test_get_ledger(self):
+        checking = get_test_account()
+        self.engine.save_account(account=checking)
+        savings = get_test_account(name='Savings')
+        self.engine.save_account(account=savings)
+        txns = [bb.Transaction(txn_date=date(2017, 1, i), splits=[{'account': checking, 'amount': -i}, {'account': savings, 'amount': i}]) for i in range(1, 6)]
+        self.engine.save_transactions(txns)
+        self.engine.save_scheduled_transaction(bb.ScheduledTransaction(name='rent', frequency=bb.ScheduledTransactionFrequency.MONTHLY,
+                next_due_date=date(2017, 2, 1), splits=[{'account': checking, 'amount': -100}, {'account': savings, 'amount': 100}]))
+        ledger = self.engine.get_ledger(checking)
+        self.assertEqual([t.id for t in ledger.txns], [5, 4, 3, 2, 1])
+        self.assertEqual(ledger.txns[0].balance, -15)
+        self.assertEqual([st.name for st in ledger.scheduled_txns], ['rent'])
+        self.assertEqual(ledger.balances, bb.LedgerBalances(current='-15.00', current_cleared='0.00'))
+        ledger = self.engine.get_ledger(checking, limit=2)
+        self.assertEqual([t.id for t in ledger.txns], [5, 4])
+        self.assertEqual(ledger.txns[0].balance, -15)
+        self.assertEqual(self.engine.get_balance(checking, before=(date(2017, 1, 4), 4)), -6)
+        self.assertEqual(self.engine.get_balance(savings), 15)
+        #filtered txns don't have the scheduled txns or balances
+        ledger = self.engine.get_ledger(checking, start_date=date(2017, 1, 2), end_date=date(2017, 1, 3), limit=2)
+        self.assertEqual([t.id for t in ledger.txns], [3, 2])
+        self.assertEqual(ledger.scheduled_txns, [])
+        self.assertIsNone(ledger.balances)
+
+    def test_engine_executor(self):
+        with self.assertRaises(bb.SQLiteStorageError):
+            bb.EngineExecutor(':memory:')
+        with tempfile.TemporaryDirectory() as tmp:
+            executor = bb.EngineExecutor(os.path.join(tmp, 'data.sqlite3'), num_readers=2)
+            checking = get_test_account()
+            savings = get_test_account(name='Savings')
+            #writes are run in order, on the writer thread
+            futures = [executor.submit('save_account', account=checking), executor.submit('save_account', account=savings)]
+            futures.append(executor.submit('save_transactions',
+                [bb.Transaction(txn_date=date(2017, 1, i), splits=[{'account': checking, 'amount': -i}, {'account': savings, 'amount': i}]) for i in range(1, 6)]))
+            self.assertEqual(futures[-1].result(), [1, 2, 3, 4, 5])
+            self.assertEqual([a.name for a in executor.submit('get_accounts').result()], [CHECKING, 'Savings'])
+            #reads run on the reader threads
+            futures = [executor.submit('get_transactions', account=checking) for _ in range(10)]
+            self.assertEqual([len(f.result()) for f in futures], [5] * 10)
+            self.assertEqual(futures[0].result()[-1].balance, -15)
+            #readers pick up the writer's changes
+            self.assertEqual(executor.submit('get_account', id_=savings.id).result().name, 'Savings')
+            savings.name = 'New Savings'
+            executor.submit('save_account', account=savings).result()
+            self.assertEqual(executor.submit('get_account', id_=savings.id).result().name, 'New Savings')
+            #errors are raised from the future
+            with self.assertRaises(bb.InvalidTransactionError):
+                executor.submit('get_transaction', 10).result()
+            executor.shutdown()
+            with self.assertRaises(RuntimeError):
+                executor.submit('get_accounts')
+            #readers only - another engine does the writes
+            engine = bb.Engine(os.path.join(tmp, 'data.sqlite3'))
+            executor = bb.EngineExecutor(os.path.join(tmp, 'data.sqlite3'), writer=False)
+            try:
+                with self.assertRaises(RuntimeError):
+                    executor.submit('save_account', account=checking)
+                engine.save_account(account=get_test_account(name='Other'))
+                self.assertEqual(len(executor.submit('get_accounts').result()), 3)
+            finally:
+                executor.shutdown()
+                engine.close()
+
     def test_get_date_display_format(self):
         date_format = self.engine.get_date_display_format()
 
@@ -2326,6 +3127,30 @@ class TestCLI(unittest.TestCase):
         self.cli.run()
         self.assertTrue('| Checking account' in self.memory_buffer.getvalue())
 
+    def test_rebuild_balances(self):
+        checking = get_test_account()
+        self.cli._engine._storage.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.cli._engine._storage.save_account(savings)
+        self.cli._engine.save_transaction(bb.Transaction(txn_date=date(2017, 1, 25), splits=[{'account': checking, 'amount': '10'}, {'account': savings, 'amount': '-10'}]))
+        self.cli._engine._storage._db_connection.execute('DELETE FROM account_balances')
+        self.cli._rebuild_balances()
+        self.assertEqual(self.memory_buffer.getvalue(), 'Rebuilt account balances\n')
+        self.assertEqual(self.cli._engine.get_account_balances()[checking.id].total, 10)
+
+    @patch('builtins.input')
+    def test_read_only(self, input_mock):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            engine = bb.Engine(file_name)
+            engine.save_account(account=get_test_account(name='Checking account'))
+            engine.close()
+            cli = bb.CLI(file_name, print_file=self.memory_buffer, read_only=True)
+            self.assertTrue(cli._engine.read_only)
+            input_mock.side_effect = ['a', 'q']
+            cli.run()
+            self.assertTrue('| Checking account' in self.memory_buffer.getvalue())
+
     def test_list_accounts(self):
         checking = get_test_account(name='Checking account with long name cut off')
         self.cli._engine._storage.save_account(checking)
@@ -2415,6 +3240,25 @@ class TestCLI(unittest.TestCase):
         self.assertTrue(txn1_output in printed_output)
         self.assertFalse(txn2_output in printed_output)
 
+    @patch('builtins.input')
+    def test_list_account_txns_filter_dates(self, input_mock):
+        input_mock.return_value = '1 start:2017-01-02 end:2017-01-02'
+        checking = get_test_account()
+        self.cli._engine.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.cli._engine.save_account(savings)
+        for day in [1, 2, 3]:
+            txn = bb.Transaction(splits=[{'account': checking, 'amount': 5}, {'account': savings, 'amount': -5}], txn_date=date(2017, 1, day))
+            self.cli._engine.save_transaction(txn)
+        self.cli._list_account_txns()
+        printed_output = self.memory_buffer.getvalue()
+        self.assertFalse('2017-01-01' in printed_output)
+        self.assertTrue(' 2    | 2017-01-02 ' in printed_output)
+        self.assertFalse('2017-01-03' in printed_output)
+        input_mock.return_value = '1 start:2020-13-01'
+        self.cli._list_account_txns()
+        self.assertTrue('Invalid start date: "2020-13-01"' in self.memory_buffer.getvalue())
+
     @patch('builtins.input')
     def test_list_account_txns_filter_account(self, input_mock):
         self.maxDiff = None
@@ -2453,6 +3297,22 @@ class TestCLI(unittest.TestCase):
         printed_output = self.memory_buffer.getvalue()
         self.assertTrue('(o) older' in printed_output)
 
+    @patch('builtins.input')
+    def test_list_account_txns_paged_older_newer(self, input_mock):
+        input_mock.side_effect = ['1', 'o', 'n', 'o', 'o']
+        checking = get_test_account()
+        self.cli._engine.save_account(checking)
+        savings = get_test_account(name='Savings')
+        self.cli._engine.save_account(savings)
+        for day in [1, 2, 3]:
+            txn = bb.Transaction(splits=[{'account': checking, 'amount': day}, {'account': savings, 'amount': -day}], txn_date=date(2017, 1, day))
+            self.cli._engine.save_transaction(txn)
+        self.cli._list_account_txns(num_txns_in_page=1)
+        printed_output = self.memory_buffer.getvalue()
+        lines = [l for l in printed_output.split('\n') if '| 2017-01-' in l]
+        self.assertEqual([l.split('|')[1].strip() for l in lines], ['2017-01-03', '2017-01-02', '2017-01-03', '2017-01-02', '2017-01-01'])
+        self.assertEqual([l.split('|')[-1].strip() for l in lines], ['6.00', '3.00', '6.00', '3.00', '1.00'])
+
     def test_pager(self):
         self.assertEqual(bb.pager([1, 2, 3], num_txns_in_page=1, page=1), ([1], True))
         self.assertEqual(bb.pager([1, 2, 3], num_txns_in_page=1, page=3), ([3], False))
@@ -2794,6 +3654,8 @@ class TestCLI(unittest.TestCase):
         self.cli._display_budget_report()
         buffer_value = self.memory_buffer.getvalue()
         self.assertTrue('2018-01-01 - 2018-12-31' in buffer_value)
+        self.assertTrue('Monthly (actual / budget):' in buffer_value)
+        self.assertTrue(' Housing              |         0.00 / 1.27 |' in buffer_value)
 
     @patch('builtins.input')
     def test_create_budget(self, input_mock):
@@ -2923,8 +3785,39 @@ class TestImport(unittest.TestCase):
         self.assertEqual(mortgage.other_data, mortgage_data)
         scheduled_txns = engine.get_scheduled_transactions()
         self.assertEqual(len(scheduled_txns), 1)
+        securities = [c for c in engine._storage.get_commodities() if c.type == bb.CommodityType.SECURITY]
+        self.assertEqual(len(securities), 3)
+        self.assertNotIn('US Dollar', [s.name for s in securities])
         engine._storage._db_connection.close()
 
+    def test_kmymoney_batches(self):
+        engine = bb.Engine(':memory:')
+        with open('import_test.kmy', 'rb') as f:
+            bb.import_kmymoney(kmy_file=f, engine=engine, batch_size=2)
+        checking = engine.get_account(name='Checking')
+        txns = engine.get_transactions(account=checking)
+        self.assertEqual(len(txns), 4)
+        self.assertEqual(txns[1].splits[1]['payee'].name, 'A restaurant')
+        balances = engine.get_current_balances_for_display(account=checking)
+        self.assertEqual(balances, bb.LedgerBalances(current='742.78', current_cleared='842.78'))
+        engine._storage._db_connection.close()
+
+    def test_kmymoney_streaming(self):
+        sections = []
+        with open('import_test.kmy', 'rb') as f:
+            txn_els = []
+            for el in bb._iter_kmymoney_file(f, tags=['TRANSACTION'], sections=sections):
+                self.assertEqual(len(el.find('SPLITS').findall('SPLIT')), 2)
+                txn_els.append(el)
+        #only the TRANSACTIONs in the TRANSACTIONS section (not the ones in SCHEDULED_TX elements)
+        self.assertEqual(len(txn_els), 6)
+        #everything has been cleared after being handled
+        for el in txn_els:
+            self.assertEqual(len(el), 0)
+            self.assertEqual(el.attrib, {})
+        self.assertIn('TRANSACTIONS', sections)
+        self.assertIn('CURRENCIES', sections)
+
 
 if __name__ == '__main__':
     import sys
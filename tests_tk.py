@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 from datetime import date
 from fractions import Fraction
+import os
+import tempfile
 import tkinter
 import unittest
 from unittest.mock import patch
@@ -103,6 +105,52 @@ class TestTkGUIAccounts(AbstractTkTest, unittest.TestCase):
         self.assertEqual(account.name, new_name)
         self.assertEqual(account.parent, savings)
 
+    def test_external_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            gui = bb.GUI_TK(file_name)
+            other_engine = bb.Engine(file_name)
+            other_engine.save_account(account=get_test_account())
+            self.assertEqual(gui.accounts_display.assets_tree.get_children(), ())
+            gui._check_external_changes()
+            child_items = gui.accounts_display.assets_tree.get_children()
+            self.assertEqual(gui.accounts_display.assets_tree.item(child_items[0])['values'][0], CHECKING)
+            gui.close()
+            other_engine.close()
+
+    def test_read_only(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            engine = bb.Engine(file_name)
+            engine.save_account(account=get_test_account())
+            engine.close()
+            gui = bb.GUI_TK(file_name, read_only=True)
+            self.assertTrue(gui.root.title().endswith('(read-only)'))
+            self.assertEqual(str(gui.accounts_display.add_button['state']), 'disabled')
+            #clicking an account doesn't open the edit form
+            gui.accounts_display.assets_tree.event_generate('<Button-1>', x=1, y=25)
+            self.assertFalse(hasattr(gui.accounts_display, 'edit_account_form'))
+            gui.ledger_button.invoke()
+            self.assertEqual(str(gui.ledger_display.add_button['state']), 'disabled')
+            self.assertEqual(str(gui.ledger_display.bookmark_button['state']), 'disabled')
+            gui.close()
+
+    def test_backup(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_name = os.path.join(tmp, 'data.sqlite3')
+            gui = bb.GUI_TK(file_name)
+            gui._engine.save_account(account=get_test_account())
+            backup_file_name = os.path.join(tmp, 'backup.sqlite3')
+            gui._start_backup(backup_file_name)
+            self.assertEqual(str(gui.backup_button['state']), 'disabled')
+            gui._backup_thread.join()
+            gui._check_backup()
+            self.assertEqual(str(gui.backup_button['state']), 'normal')
+            backup_engine = bb.Engine(backup_file_name)
+            self.assertEqual(backup_engine.get_accounts()[0].name, CHECKING)
+            backup_engine.close()
+            gui.close()
+
     @patch('bricbooks.handle_error')
     def test_account_exception(self, mock_method):
         gui = bb.GUI_TK(':memory:')
@@ -140,6 +188,114 @@ class TestTkGUILedger(AbstractTkTest, unittest.TestCase):
         self.assertEqual(gui.ledger_display._account.name, 'Fund')
         self.assertEqual(gui.ledger_display.balance_var.get(), 'Current Balance: 2.34')
 
+    def test_ledger_paged(self):
+        gui = bb.GUI_TK(':memory:')
+        checking = get_test_account()
+        savings = get_test_account(name='Savings')
+        gui._engine.save_account(account=checking)
+        gui._engine.save_account(account=savings)
+        num_txns = bb.LedgerDisplay.NUM_TXNS_IN_PAGE + 5
+        txns = [bb.Transaction(splits=[{'account': checking, 'amount': 1}, {'account': savings, 'amount': -1}], txn_date=date(2017, 1, 1)) for _ in range(num_txns)]
+        gui._engine.save_transactions(txns)
+        gui.ledger_button.invoke()
+        txns_view = gui.ledger_display.txns_view
+        self.assertEqual(txns_view.num_rows, bb.LedgerDisplay.NUM_TXNS_IN_PAGE)
+        child_ids = gui.ledger_display.txns_tree.get_children()
+        self.assertEqual(len(child_ids), txns_view.visible_rows)
+        self.assertEqual(child_ids[0], str(num_txns))
+        self.assertEqual(gui.ledger_display.balance_var.get(), f'Current Balance: {num_txns}.00')
+        gui.ledger_display.show_all_button.invoke()
+        txns_view = gui.ledger_display.txns_view
+        self.assertEqual(txns_view.num_rows, num_txns)
+        self.assertEqual(len(gui.ledger_display.txns_tree.get_children()), txns_view.visible_rows)
+
+    def test_ledger_scroll(self):
+        gui = bb.GUI_TK(':memory:')
+        checking = get_test_account()
+        savings = get_test_account(name='Savings')
+        gui._engine.save_account(account=checking)
+        gui._engine.save_account(account=savings)
+        txns = [bb.Transaction(splits=[{'account': checking, 'amount': i}, {'account': savings, 'amount': -i}], txn_date=date(2017, 1, 1)) for i in range(1, 101)]
+        gui._engine.save_transactions(txns)
+        gui.ledger_button.invoke()
+        txns_view = gui.ledger_display.txns_view
+        visible_rows = txns_view.visible_rows
+        #only the rows that are showing are in the Treeview
+        txns_view.yview('scroll', 1, 'pages')
+        child_ids = gui.ledger_display.txns_tree.get_children()
+        self.assertEqual(len(child_ids), visible_rows)
+        self.assertEqual(child_ids[0], str(100 - visible_rows))
+        self.assertEqual(gui.ledger_display.txns_tree.set(child_ids[0], 'deposit'), f'{100 - visible_rows}.00')
+        txns_view.yview('moveto', 1.0)
+        child_ids = gui.ledger_display.txns_tree.get_children()
+        self.assertEqual(child_ids[-1], '1')
+        txns_view.yview('scroll', -2, 'units')
+        self.assertEqual(gui.ledger_display.txns_tree.get_children()[-1], '3')
+        #the selection stays on a row that's still showing after a refresh
+        txns_tree = gui.ledger_display.txns_tree
+        txns_view.scroll_to(0)
+        txns_tree.focus('99')
+        txns_tree.selection_set('99')
+        txns_view.refresh()
+        self.assertEqual(txns_tree.selection(), ('99',))
+        self.assertEqual(txns_tree.focus(), '99')
+        #the arrow & page keys scroll the focused row into view
+        txns_view._move_focus(-1)
+        self.assertEqual(txns_tree.focus(), '100')
+        txns_view._move_focus(-1)
+        self.assertEqual(txns_tree.focus(), '100')
+        last_iid = txns_tree.get_children()[-1]
+        txns_tree.focus(last_iid)
+        txns_view._move_focus(1)
+        self.assertEqual(txns_view.offset, 1)
+        self.assertEqual(txns_tree.focus(), str(int(last_iid) - 1))
+        self.assertEqual(txns_tree.selection(), (str(int(last_iid) - 1),))
+        txns_view._page_down(None)
+        self.assertEqual(txns_view.offset, visible_rows + 1)
+        self.assertEqual(txns_tree.get_children()[-1], txns_tree.focus())
+        txns_view._page_up(None)
+        self.assertEqual(txns_view.offset, visible_rows)
+        self.assertEqual(txns_tree.get_children()[0], txns_tree.focus())
+        txns_view._page_up(None)
+        self.assertEqual(txns_view.offset, 0)
+        self.assertEqual(txns_tree.focus(), '100')
+
+    def test_ledger_background_load(self):
+        def wait_for_rows(num_rows):
+            #wait for the load itself - then the next after() callback that checks it shows the rows
+            ledger_display = gui.ledger_display
+            load_future = ledger_display._load_future
+            if load_future:
+                load_future.result(timeout=60)
+            while ledger_display.loading:
+                gui.root.update()
+            self.assertEqual(ledger_display.txns_view.num_rows, num_rows)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            gui = bb.GUI_TK(os.path.join(tmp, 'data.sqlite3'))
+            checking = get_test_account()
+            savings = get_test_account(name='Savings')
+            gui._engine.save_account(account=checking)
+            gui._engine.save_account(account=savings)
+            num_txns = bb.LedgerDisplay.NUM_TXNS_IN_PAGE * 2 + 5
+            txns = [bb.Transaction(splits=[{'account': checking, 'amount': 1}, {'account': savings, 'amount': -1}], txn_date=date(2017, 1, 1)) for _ in range(num_txns)]
+            gui._engine.save_transactions(txns)
+            gui.ledger_button.invoke()
+            self.assertTrue(gui.ledger_display.loading)
+            wait_for_rows(bb.LedgerDisplay.NUM_TXNS_IN_PAGE)
+            self.assertEqual(gui.ledger_display.balance_var.get(), f'Current Balance: {num_txns}.00')
+            gui.ledger_display.show_all_button.invoke()
+            wait_for_rows(num_txns)
+            self.assertEqual(gui.ledger_display.txns_tree.get_children()[0], str(num_txns))
+            #switching accounts while a load is running drops the old load
+            gui.ledger_display.show_all_button.invoke()
+            gui.ledger_display.account_select_combo.set_current_index(1)
+            gui.ledger_display._update_account(None)
+            wait_for_rows(bb.LedgerDisplay.NUM_TXNS_IN_PAGE)
+            self.assertEqual(gui.ledger_display.balance_var.get(), f'Current Balance: -{num_txns}.00')
+            self.assertFalse(gui.ledger_display.loading)
+            gui.close()
+
     def test_ledger_new_transaction(self):
         gui = bb.GUI_TK(':memory:')
         checking = get_test_account()
@@ -346,6 +502,60 @@ class TestTkGUILedger(AbstractTkTest, unittest.TestCase):
         self.assertEqual(txns[0].splits[1]['account'], fund)
         self.assertEqual(txns[0].splits[1]['quantity'], Fraction('3.67'))
 
+    def test_ledger_incremental_update(self):
+        gui = bb.GUI_TK(':memory:')
+        checking = get_test_account()
+        savings = get_test_account(name='Savings')
+        gui._engine.save_account(account=checking)
+        gui._engine.save_account(account=savings)
+        txns = [bb.Transaction(splits=[{'account': checking, 'amount': i}, {'account': savings, 'amount': -i}], txn_date=date(2017, 1, i)) for i in range(1, 5)]
+        gui._engine.save_transactions(txns)
+        gui.ledger_button.invoke()
+        ledger_display = gui.ledger_display
+
+        def rows():
+            return [(iid, ledger_display.txns_tree.set(iid, 'balance')) for iid in ledger_display.txns_tree.get_children()]
+
+        self.assertEqual(rows(), [('4', '10.00'), ('3', '6.00'), ('2', '3.00'), ('1', '1.00')])
+        with patch.object(gui._engine, 'get_ledger') as get_ledger:
+            #move txn 3 before txn 2
+            ledger_display._save(bb.Transaction(id_=3, splits=[{'account': checking, 'amount': 3}, {'account': savings, 'amount': -3}], txn_date=date(2017, 1, 1)))
+            self.assertEqual(rows(), [('4', '10.00'), ('2', '6.00'), ('3', '4.00'), ('1', '1.00')])
+            ledger_display._save(bb.Transaction(splits=[{'account': checking, 'amount': 20}, {'account': savings, 'amount': -20}], txn_date=date(2017, 1, 3)))
+            self.assertEqual(rows(), [('4', '30.00'), ('5', '26.00'), ('2', '6.00'), ('3', '4.00'), ('1', '1.00')])
+            ledger_display._delete(transaction_id=1)
+            self.assertEqual(rows(), [('4', '29.00'), ('5', '25.00'), ('2', '5.00'), ('3', '3.00')])
+            get_ledger.assert_not_called()
+        self.assertEqual(ledger_display.balance_var.get(), 'Current Balance: 29.00')
+        #the rows match a full reload
+        ledger_display.refresh()
+        self.assertEqual(rows(), [('4', '29.00'), ('5', '25.00'), ('2', '5.00'), ('3', '3.00')])
+
+    def test_ledger_incremental_update_paged(self):
+        gui = bb.GUI_TK(':memory:')
+        checking = get_test_account()
+        savings = get_test_account(name='Savings')
+        gui._engine.save_account(account=checking)
+        gui._engine.save_account(account=savings)
+        txns = [bb.Transaction(splits=[{'account': checking, 'amount': i}, {'account': savings, 'amount': -i}], txn_date=date(2017, 1, i)) for i in range(1, 6)]
+        gui._engine.save_transactions(txns)
+        with patch.object(bb.LedgerDisplay, 'NUM_TXNS_IN_PAGE', 3):
+            gui.ledger_button.invoke()
+            ledger_display = gui.ledger_display
+
+            def rows():
+                return [(iid, ledger_display.txns_tree.set(iid, 'balance')) for iid in ledger_display.txns_tree.get_children()]
+
+            self.assertEqual(rows(), [('5', '15.00'), ('4', '10.00'), ('3', '6.00')])
+            with patch.object(gui._engine, 'get_ledger') as get_ledger:
+                #the next older txn moves up onto the page
+                ledger_display._delete(transaction_id=4)
+                self.assertEqual(rows(), [('5', '11.00'), ('3', '6.00'), ('2', '3.00')])
+                #move txn 5 to an older page
+                ledger_display._save(bb.Transaction(id_=5, splits=[{'account': checking, 'amount': 5}, {'account': savings, 'amount': -5}], txn_date=date(2017, 1, 1)))
+                self.assertEqual(rows(), [('3', '11.00'), ('2', '8.00'), ('5', '6.00')])
+                get_ledger.assert_not_called()
+
     def test_ledger_filter(self):
         gui = bb.GUI_TK(':memory:')
         checking = get_test_account()
@@ -366,6 +576,15 @@ class TestTkGUILedger(AbstractTkTest, unittest.TestCase):
         self.assertEqual(child_item['values'][0], '2017-01-03')
         self.assertEqual(gui.ledger_display.balance_var.get(), '')
 
+    @patch('bricbooks.show_error')
+    def test_ledger_filter_invalid_date(self, mock_method):
+        gui = bb.GUI_TK(':memory:')
+        gui._engine.save_account(account=get_test_account())
+        gui.ledger_button.invoke()
+        gui.ledger_display.filter_var.set('start:2017-13-01')
+        gui.ledger_display.filter_button.invoke()
+        mock_method.assert_called_once_with(msg='invalid start date "2017-13-01"')
+
     def test_ledger_enter_next_scheduled_transaction(self):
         gui = bb.GUI_TK(':memory:')
         checking = get_test_account()
@@ -611,6 +830,15 @@ class TestTkGUIBudget(AbstractTkTest, unittest.TestCase):
         self.assertEqual(budget.end_date, date(2020, 6, 30))
         self.assertEqual(budget.get_budget_data()[food]['amount'], 20)
 
+        gui.budget_display.monthly_button.invoke()
+        self.assertEqual(gui.budget_display.monthly_button['text'], 'Totals')
+        self.assertEqual(gui.budget_display.tree['columns'], ('account', '2020-01', '2020-02', '2020-03', '2020-04', '2020-05', '2020-06'))
+        child_items = gui.budget_display.tree.get_children()
+        self.assertEqual(gui.budget_display.tree.item(child_items[0])['values'][0], 'Food')
+        gui.budget_display.monthly_button.invoke()
+        self.assertEqual(gui.budget_display.tree['columns'][0], 'account')
+        self.assertEqual(len(gui.budget_display.tree['columns']), 9)
+
 
 if __name__ == '__main__':
     import sys